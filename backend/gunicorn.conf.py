@@ -0,0 +1,29 @@
+"""
+Gunicorn configuration for the MIDI Engine API.
+
+Run with: gunicorn -c gunicorn.conf.py server_stub:app
+"""
+
+import multiprocessing
+import os
+
+# Import server_stub and midi_engine from backend/ wherever gunicorn is started
+chdir = os.path.dirname(os.path.abspath(__file__))
+
+bind = os.getenv('MIDI_API_BIND', '0.0.0.0:5001')
+
+# MIDI generation is CPU-bound pure Python, so scale with processes, not threads
+worker_class = 'sync'
+workers = int(os.getenv('MIDI_API_WORKERS', multiprocessing.cpu_count()))
+
+# Import midi_engine once in the master so workers share its pages after fork
+preload_app = True
+
+# Keep worker heartbeat files in memory to avoid disk stalls
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def post_worker_init(worker):
+    """Warm the MIDI engine in each worker before it accepts requests."""
+    import server_stub
+    server_stub.warm_up()
@@ -14,9 +14,9 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from midi_engine.api import create_ambient_midi, create_ambient_midi_with_info
 from midi_engine.writer import (
-    encode_vlq, make_header, make_track, write_midi,
+    encode_vlq, make_header, make_track, write_midi, iter_midi, write_midi_to,
     meta_tempo, meta_time_signature, meta_key_signature, meta_end_of_track,
-    note_on, note_off, program_change
+    note_on, note_off, program_change, TrackWriter
 )
 from midi_engine.theory import (
     get_scale_notes, build_chord, voice_leading_chord, soft_curve,
@@ -25,6 +25,11 @@ from midi_engine.theory import (
 from midi_engine.patterns import generate_melody, generate_pad_progression
 from midi_engine.render import remove_overlapping_notes, validate_events
 
+try:
+    import server_stub
+except ImportError:  # Optional: the HTTP tests need Flask
+    server_stub = None
+
 
 class TestMIDIWriter(unittest.TestCase):
     """Test the zero-dependency MIDI writer."""
@@ -37,6 +42,7 @@ class TestMIDIWriter(unittest.TestCase):
         self.assertEqual(encode_vlq(255), b'\x81\x7F')
         self.assertEqual(encode_vlq(16383), b'\xFF\x7F')
         self.assertEqual(encode_vlq(16384), b'\x81\x80\x00')
+        self.assertEqual(encode_vlq(0x0FFFFFFF), b'\xFF\xFF\xFF\x7F')
     
     def test_header_chunk(self):
         """Test MIDI header chunk creation."""
@@ -55,6 +61,19 @@ class TestMIDIWriter(unittest.TestCase):
         self.assertEqual(track[4:8], b'\x00\x00\x00\x04')  # Length = 4
         self.assertEqual(track[8:], events)  # Event data
     
+    def test_streamed_midi_matches_joined(self):
+        """Test that fragment streaming produces the same file as write_midi."""
+        import io
+        tracks = [b'\x00\xFF\x2F\x00', b'\x00\x90\x3C\x40\x60\x80\x3C\x40\x00\xFF\x2F\x00']
+        expected = make_header(1, 2, 480) + b''.join(make_track(t) for t in tracks)
+        
+        self.assertEqual(write_midi(tracks, 480), expected)
+        self.assertEqual(b''.join(iter_midi(tracks, 480)), expected)
+        
+        buffer = io.BytesIO()
+        write_midi_to(buffer, tracks, 480)
+        self.assertEqual(buffer.getvalue(), expected)
+    
     def test_meta_events(self):
         """Test meta event generation."""
         # Tempo: 120 BPM = 500000 microseconds per quarter
@@ -69,6 +88,10 @@ class TestMIDIWriter(unittest.TestCase):
         key_sig = meta_key_signature("C", "minor", 0)
         self.assertIn(b'\xFF\x59\x02', key_sig)  # Key sig meta event
         
+        # Key signature: Eb major (3 flats), with a non-zero delta
+        self.assertEqual(meta_key_signature("Eb", "major", 0), b'\x00\xFF\x59\x02\xFD\x00')
+        self.assertEqual(meta_key_signature("Eb", "major", 128), b'\x81\x00\xFF\x59\x02\xFD\x00')
+        
         # End of track
         eot = meta_end_of_track(0)
         self.assertEqual(eot, b'\x00\xFF\x2F\x00')
@@ -89,6 +112,26 @@ class TestMIDIWriter(unittest.TestCase):
         prog_change = program_change(0, 0, 0)
         self.assertIn(b'\xC0', prog_change)  # Program change channel 0
 
+    
+    def test_track_writer_reuse(self):
+        """Test that a reused TrackWriter produces identical, correct tracks."""
+        writer = TrackWriter(initial_size=8)
+        events = [
+            {'start': 0, 'end': 480, 'note': 60, 'vel_on': 80},
+            {'start': 480, 'end': 960, 'note': 64, 'vel_on': 70, 'vel_off': 0},
+        ]
+        expected = (
+            b'\x00\x90\x3C\x50'      # note on C4 at tick 0
+            b'\x00\xC0\x05'          # program change after note-ons at tick 0
+            b'\x83\x60\x80\x3C\x40'  # note off C4 at tick 480 (before note on)
+            b'\x00\x90\x40\x46'      # note on E4 at tick 480
+            b'\x83\x60\x80\x40\x00'  # note off E4 at tick 960
+            b'\x00\xFF\x2F\x00'      # end of track
+        )
+        self.assertEqual(writer.build(events, 0, 5), expected)
+        self.assertEqual(writer.build(events, 0, 5), expected)
+        self.assertEqual(writer.build([], 0), b'\x00\xFF\x2F\x00')
+
 
 class TestMusicTheory(unittest.TestCase):
     """Test music theory helpers."""
@@ -381,6 +424,27 @@ class TestMIDIFormat(unittest.TestCase):
         self.assertGreater(info['pad_stats']['total_events'], 0)
 
 
+@unittest.skipIf(server_stub is None, "Flask is not installed")
+class TestServerBatch(unittest.TestCase):
+    """Test parameter validation on the batch endpoint."""
+    
+    def setUp(self):
+        self.client = server_stub.app.test_client()
+    
+    def test_batch_rejects_fractional_and_boolean_ints(self):
+        """JSON floats that are not integral and booleans must not be truncated by int()."""
+        for config in ({"seed": 1.7}, {"bars": 8.9}, {"bars": True}, {"density": False}):
+            response = self.client.post("/api/midi/ambient/batch", json=[config])
+            self.assertEqual(response.status_code, 400, config)
+            self.assertIn("Item 0:", response.get_json()["error"])
+    
+    def test_batch_accepts_integral_floats(self):
+        """Whole-number floats are still accepted for integer parameters."""
+        response = self.client.post("/api/midi/ambient/batch", json=[{"seed": 3.0, "bars": 1}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/zip")
+
+
 def run_tests():
     """Run all tests and return results."""
     loader = unittest.TestLoader()
@@ -393,7 +457,8 @@ def run_tests():
         TestPatternGeneration,
         TestEventProcessing,
         TestAPIIntegration,
-        TestMIDIFormat
+        TestMIDIFormat,
+        TestServerBatch
     ]
     
     for test_class in test_classes:
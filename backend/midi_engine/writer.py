@@ -6,48 +6,75 @@ VLQ encoding, meta events, and channel events.
 """
 
 import struct
-from typing import List
+import threading
+from typing import BinaryIO, Iterator, List
+
+
+# Single-byte VLQ encodings for 0-127, the common case for delta-times
+_VLQ_SINGLE = tuple(bytes([value]) for value in range(128))
 
 
 def encode_vlq(value: int) -> bytes:
     """Encode a value as Variable Length Quantity (VLQ) for MIDI delta-time."""
-    if value == 0:
-        return bytes([0x00])
+    if 0 <= value < 128:
+        return _VLQ_SINGLE[value]
+    if value < 0:
+        raise ValueError(f"VLQ value must be non-negative, got {value}")
     
-    result = []
+    # Build least-significant group first, then reverse once
+    result = bytearray([value & 0x7F])
+    value >>= 7
     while value > 0:
-        byte = value & 0x7F
+        result.append((value & 0x7F) | 0x80)
         value >>= 7
-        if result:  # Not the first byte
-            byte |= 0x80
-        result.insert(0, byte)
+    result.reverse()
     
     return bytes(result)
 
 
+_U32 = struct.Struct('>I')
+_HEADER_FIELDS = struct.Struct('>HHH')
+
+
 def make_header(format_type: int = 1, ntrks: int = 3, division: int = 480) -> bytes:
     """Create MIDI header chunk (MThd)."""
-    return b'MThd' + struct.pack('>I', 6) + struct.pack('>HHH', format_type, ntrks, division)
+    return b'MThd' + _U32.pack(6) + _HEADER_FIELDS.pack(format_type, ntrks, division)
 
 
 def make_track(events: bytes) -> bytes:
     """Wrap track events in MTrk chunk with length."""
-    return b'MTrk' + struct.pack('>I', len(events)) + events
+    return b'MTrk' + _U32.pack(len(events)) + events
+
+
+def iter_midi(tracks: List[bytes], ppq: int = 480) -> Iterator[bytes]:
+    """
+    Yield a complete MIDI file as a sequence of byte fragments.
+    
+    Fragments (header, chunk headers, track bodies) are yielded without being
+    concatenated, so they can be passed straight to file.writelines() or a
+    streaming response.
+    """
+    yield make_header(format_type=1, ntrks=len(tracks), division=ppq)
+    for track in tracks:
+        yield b'MTrk' + _U32.pack(len(track))
+        yield track
+
+
+def write_midi_to(f: BinaryIO, tracks: List[bytes], ppq: int = 480) -> None:
+    """Write a complete MIDI file to a binary file-like object."""
+    f.writelines(iter_midi(tracks, ppq))
 
 
 def write_midi(tracks: List[bytes], ppq: int = 480) -> bytes:
     """Write complete MIDI file with header and tracks."""
-    midi_data = make_header(format_type=1, ntrks=len(tracks), division=ppq)
-    for track in tracks:
-        midi_data += make_track(track)
-    return midi_data
+    return b''.join(iter_midi(tracks, ppq))
 
 
 # Meta Events
 def meta_tempo(bpm: int, delta_time: int = 0) -> bytes:
     """Create tempo meta event (0xFF 0x51)."""
     microseconds_per_quarter = int(60_000_000 / bpm)
-    return encode_vlq(delta_time) + b'\xFF\x51\x03' + struct.pack('>I', microseconds_per_quarter)[1:]
+    return encode_vlq(delta_time) + b'\xFF\x51\x03' + _U32.pack(microseconds_per_quarter)[1:]
 
 
 def meta_time_signature(numerator: int = 4, denominator: int = 4, 
@@ -64,22 +91,36 @@ def meta_time_signature(numerator: int = 4, denominator: int = 4,
             bytes([numerator, denom_power, metronome_ticks, thirty_seconds]))
 
 
-def meta_key_signature(key: str = "C", mode: str = "minor", delta_time: int = 0) -> bytes:
-    """Create key signature meta event (0xFF 0x59)."""
-    # Key signature mapping: sharps positive, flats negative
-    key_map = {
-        'C': 0, 'G': 1, 'D': 2, 'A': 3, 'E': 4, 'B': 5, 'F#': 6, 'C#': 7,
-        'F': -1, 'Bb': -2, 'Eb': -3, 'Ab': -4, 'Db': -5, 'Gb': -6, 'Cb': -7
-    }
-    
-    sharps_flats = key_map.get(key, 0)
+# Key signature mapping: sharps positive, flats negative
+_KEY_SHARPS_FLATS = {
+    'C': 0, 'G': 1, 'D': 2, 'A': 3, 'E': 4, 'B': 5, 'F#': 6, 'C#': 7,
+    'F': -1, 'Bb': -2, 'Eb': -3, 'Ab': -4, 'Db': -5, 'Gb': -6, 'Cb': -7
+}
+
+
+def _key_signature_body(key: str, mode: str) -> bytes:
+    """Build the key signature event body (without delta-time)."""
+    sharps_flats = _KEY_SHARPS_FLATS.get(key, 0)
     mode_byte = 0 if mode == "major" else 1
     
     # Convert to signed byte
-    if sharps_flats < 0:
-        sharps_flats = (256 + sharps_flats) % 256
-    
-    return encode_vlq(delta_time) + b'\xFF\x59\x02' + bytes([sharps_flats, mode_byte])
+    return b'\xFF\x59\x02' + bytes([sharps_flats & 0xFF, mode_byte])
+
+
+# Precomputed key signature bodies for every known key/mode pair
+_KEY_SIGNATURE_BODIES = {
+    (key, mode): _key_signature_body(key, mode)
+    for key in _KEY_SHARPS_FLATS
+    for mode in ("major", "minor")
+}
+
+
+def meta_key_signature(key: str = "C", mode: str = "minor", delta_time: int = 0) -> bytes:
+    """Create key signature meta event (0xFF 0x59)."""
+    body = _KEY_SIGNATURE_BODIES.get((key, mode))
+    if body is None:
+        body = _key_signature_body(key, mode)
+    return encode_vlq(delta_time) + body
 
 
 def meta_end_of_track(delta_time: int = 0) -> bytes:
@@ -123,57 +164,108 @@ def build_conductor_track(bpm: int, ppq: int, key: str = "C", mode: str = "minor
     return events
 
 
-def build_note_track(events: List[dict], channel: int, program: int = None) -> bytes:
+# Sort priority at the same tick: note_off before note_on before program change
+_PRIORITY_NOTE_OFF = 0
+_PRIORITY_NOTE_ON = 1
+_PRIORITY_PROGRAM = 2
+
+# Worst case bytes per event: 4-byte VLQ delta + 3-byte channel message
+_MAX_EVENT_SIZE = 7
+_END_OF_TRACK = b'\x00\xFF\x2F\x00'
+
+
+class TrackWriter:
     """
-    Build a MIDI track from note events.
+    Reusable note track encoder.
     
-    events: List of dicts with keys: start, end, note, vel_on, vel_off (in ticks)
-    channel: MIDI channel (0-15)
-    program: GM program number (0-127), None to skip program change
+    Owns a growable output buffer that is kept between builds, so repeated
+    track rendering (e.g. a long-running server) does not allocate a fresh
+    bytes object per event. Not thread-safe; use get_track_writer() to get
+    a per-thread instance.
     """
-    track_events = []
-    
-    # Add program change if specified
-    if program is not None:
-        track_events.append((0, 'program', program))
-    
-    # Convert note events to MIDI events
-    for event in events:
-        start_tick = event['start']
-        end_tick = event['end']
-        note = event['note']
-        vel_on = event.get('vel_on', 64)
-        vel_off = event.get('vel_off', 64)
-        
-        track_events.append((start_tick, 'note_on', channel, note, vel_on))
-        track_events.append((end_tick, 'note_off', channel, note, vel_off))
-    
-    # Sort by tick, then by event type priority (note_off before note_on at same tick)
-    def event_priority(event):
-        tick, event_type = event[0], event[1]
-        priority = {'note_off': 0, 'note_on': 1, 'program': 2}
-        return (tick, priority.get(event_type, 3))
     
-    track_events.sort(key=event_priority)
+    def __init__(self, initial_size: int = 4096):
+        self._buf = bytearray(initial_size)
     
-    # Generate MIDI bytes
-    track_bytes = b''
-    current_tick = 0
+    def _reserve(self, size: int) -> None:
+        """Grow the buffer (by doubling) so it holds at least size bytes."""
+        capacity = len(self._buf)
+        if capacity >= size:
+            return
+        while capacity < size:
+            capacity *= 2
+        self._buf.extend(bytes(capacity - len(self._buf)))
     
-    for event in track_events:
-        tick = event[0]
-        delta = tick - current_tick
+    def build(self, events: List[dict], channel: int, program: int = None) -> bytes:
+        """Encode note events into track bytes (see build_note_track)."""
+        # Sort key packs (tick, priority) into one int; sort is stable
+        track_events = []
+        if program is not None:
+            track_events.append((_PRIORITY_PROGRAM, 0xC0 | channel, program, None))
         
-        if event[1] == 'program':
-            track_bytes += program_change(channel, event[2], delta)
-        elif event[1] == 'note_on':
-            track_bytes += note_on(event[2], event[3], event[4], delta)
-        elif event[1] == 'note_off':
-            track_bytes += note_off(event[2], event[3], event[4], delta)
+        note_on_status = 0x90 | channel
+        note_off_status = 0x80 | channel
+        for event in events:
+            note = event['note']
+            track_events.append((event['start'] * 4 + _PRIORITY_NOTE_ON,
+                                 note_on_status, note, event.get('vel_on', 64)))
+            track_events.append((event['end'] * 4 + _PRIORITY_NOTE_OFF,
+                                 note_off_status, note, event.get('vel_off', 64)))
         
-        current_tick = tick
-    
-    # Add end of track
-    track_bytes += meta_end_of_track(0)
+        track_events.sort(key=lambda e: e[0])
+        
+        self._reserve(len(track_events) * _MAX_EVENT_SIZE + len(_END_OF_TRACK))
+        buf = self._buf
+        pos = 0
+        current_tick = 0
+        
+        for sort_key, status, data1, data2 in track_events:
+            tick = sort_key >> 2
+            delta = tick - current_tick
+            
+            if delta < 128:
+                buf[pos] = delta
+                pos += 1
+            else:
+                vlq = encode_vlq(delta)
+                buf[pos:pos + len(vlq)] = vlq
+                pos += len(vlq)
+            
+            buf[pos] = status
+            buf[pos + 1] = data1
+            pos += 2
+            if data2 is not None:
+                buf[pos] = data2
+                pos += 1
+            
+            current_tick = tick
+        
+        # Add end of track
+        buf[pos:pos + len(_END_OF_TRACK)] = _END_OF_TRACK
+        pos += len(_END_OF_TRACK)
+        
+        with memoryview(buf)[:pos] as view:
+            return bytes(view)
+
+
+_thread_local = threading.local()
+
+
+def get_track_writer() -> TrackWriter:
+    """Return the TrackWriter owned by the calling thread."""
+    writer = getattr(_thread_local, 'track_writer', None)
+    if writer is None:
+        writer = TrackWriter()
+        _thread_local.track_writer = writer
+    return writer
+
+
+def build_note_track(events: List[dict], channel: int, program: int = None) -> bytes:
+    """
+    Build a MIDI track from note events.
     
-    return track_bytes
+    events: List of dicts with keys: start, end, note, vel_on, vel_off (in ticks)
+    channel: MIDI channel (0-15)
+    program: GM program number (0-127), None to skip program change
+    """
+    return get_track_writer().build(events, channel, program)
@@ -1,15 +1,437 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import array
+import copy
 import json
+import hashlib
 import os
 import re
+import struct
+import sys
 import time
+import threading
 import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from typing import Dict, List, Optional, Tuple, Any
-from music21 import stream, note, duration, tempo, key, meter, pitch
+from music21 import stream, note, chord, duration, tempo, key, meter, pitch
 import mido
 
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the stdlib json module
+    orjson = None
+
+try:
+    import httpx
+except ImportError:  # Optional: only needed for OPENAI_HTTP2
+    httpx = None
+
 logger = logging.getLogger(__name__)
 
+# Ticks per quarter note for files written directly with mido
+TICKS_PER_BEAT = 480
+
+# Maximum OpenAI requests in flight when generating several melodies at once
+OPENAI_MAX_CONCURRENCY = 4
+
+OPENAI_API_BASE = 'https://api.openai.com/v1'
+
+# Batch statuses after which polling stops
+OPENAI_BATCH_TERMINAL_STATUSES = frozenset(['completed', 'failed', 'expired', 'cancelled'])
+
+# Set OPENAI_HTTP2=1 (with httpx[http2] installed) to multiplex OpenAI calls over HTTP/2
+OPENAI_HTTP2 = os.getenv('OPENAI_HTTP2', '').lower() in ('1', 'true', 'yes')
+
+# Stream melody completions so generation can stop once enough bars have arrived
+OPENAI_STREAM = os.getenv('OPENAI_STREAM', 'true').lower() in ('1', 'true', 'yes')
+
+# Abort a streamed melody if this many characters arrive without a single note
+STREAM_MALFORMED_CHAR_LIMIT = 1000
+
+# Directory for cached melody completions and parsed notes; caching is off unless LLM_CACHE_DIR is set.
+# Entries never expire and the directory is not size-limited, so clear it when prompts change.
+LLM_CACHE_DIR = os.getenv('LLM_CACHE_DIR', '')
+
+# Parsed-note cache file layout: magic + note count, then one fixed-size record per note
+# (name, midi_pitch, velocity, bar, duration, beat, timing_offset)
+_NOTES_CACHE_MAGIC = b'MGN1'
+_NOTES_CACHE_HEADER = struct.Struct('<4sI')
+_NOTES_CACHE_RECORD = struct.Struct('<4sBBHddd')
+
+# Set MIDI_WRITER=music21 to render through the legacy music21 Stream path
+USE_MUSIC21_WRITER = os.getenv('MIDI_WRITER', 'mido').lower() == 'music21'
+
+# GPT melody tokens, scanned in one pass over the response:
+#   Bar 3:          - bar marker, resets the bar/beat position
+#   C4(quarter,80)  - standard format, optional whitespace inside the parentheses
+#   C4 quarter 80   - space separated
+#   C4-quarter-80   - dash separated
+# Note separators are limited to spaces/tabs so a note never spans lines.
+_GPT_MELODY_TOKEN_RE = re.compile(
+    r'Bar\s*(?P<bar_number>\d+)'
+    r'|(?P<paren_note>[A-G][#b]?\d+)[ \t]*\([ \t]*(?P<paren_duration>[^,)\n]+?)[ \t]*,[ \t]*(?P<paren_velocity>\d+)[ \t]*\)'
+    r'|(?P<note>[A-G][#b]?\d+)(?:[ \t]+|-)(?P<duration>[a-zA-Z][a-zA-Z-]*[a-zA-Z])(?:[ \t]+|-)(?P<velocity>\d+)',
+    re.IGNORECASE
+)
+
+# Valid note name: letter, optional accidental, octave
+_NOTE_NAME_RE = re.compile(r'^([A-G][#b]?)(\d+)$')
+
+# Semitone offsets of natural note letters from C
+_NATURAL_PITCH_CLASSES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+
+# All chromatic notes
+_CHROMATIC = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+_KEY_INDEX = {note_name: idx for idx, note_name in enumerate(_CHROMATIC)}
+
+# Interned octave-qualified names ("C#4") for every chromatic note in octaves 0-10
+_NOTE_NAME_TABLE = {
+    (note_name, octave): sys.intern(f"{note_name}{octave}")
+    for note_name in _CHROMATIC
+    for octave in range(11)
+}
+
+# Scale patterns (semitone intervals)
+_SCALE_INTERVALS = {
+    'major': (0, 2, 4, 5, 7, 9, 11),  # Major scale
+    'minor': (0, 2, 3, 5, 7, 8, 10)   # Natural minor scale
+}
+
+# Mood flags: one bit per energy/valence/danceability threshold that picks a progression or rhythm
+_MOOD_HIGH_ENERGY = 1       # energy > 0.7
+_MOOD_HAPPY = 2             # valence > 0.6
+_MOOD_SAD = 4               # valence < 0.4
+_MOOD_VERY_DANCEABLE = 8    # danceability > 0.7
+_MOOD_DANCEABLE = 16        # danceability > 0.6
+_MOOD_FLAG_COMBINATIONS = 32
+
+# Keys without a valid mido key_signature spelling, mapped to their enharmonic
+_MIDO_KEY_ENHARMONICS = {
+    'major': {'D#': 'Eb', 'G#': 'Ab', 'A#': 'Bb'},
+    'minor': {'Db': 'C#', 'Gb': 'F#'}
+}
+
+
+def _scale_mode(mode_name: str) -> str:
+    """Normalize a mode name to a _SCALE_INTERVALS key (anything but major is minor)"""
+    return 'major' if mode_name.lower() == 'major' else 'minor'
+
+
+def _octave_note_name(note_name: str, octave: int) -> str:
+    """Note name with octave, shared from _NOTE_NAME_TABLE when possible"""
+    name = _NOTE_NAME_TABLE.get((note_name, octave))
+    return name if name is not None else f"{note_name}{octave}"
+
+
+# Chromatic scale rotated to start on each note, indexed by _KEY_INDEX
+_ROTATED_CHROMATIC = tuple(
+    tuple(_CHROMATIC[(start_idx + semitone) % 12] for semitone in range(12))
+    for start_idx in range(12)
+)
+
+
+def _mood_flags(energy: float, valence: float, danceability: float) -> int:
+    """Pack the mood thresholds into a _MOOD_* bitmask"""
+    return (
+        (energy > 0.7) * _MOOD_HIGH_ENERGY
+        | (valence > 0.6) * _MOOD_HAPPY
+        | (valence < 0.4) * _MOOD_SAD
+        | (danceability > 0.7) * _MOOD_VERY_DANCEABLE
+        | (danceability > 0.6) * _MOOD_DANCEABLE
+    )
+
+
+def _progression_for_mood(mode_name: str, mood_flags: int) -> Tuple[int, ...]:
+    """Chord progression as 1-indexed scale degrees for a mode and mood"""
+    if mode_name == 'major':
+        # Major key diatonic chord progressions
+        if mood_flags & _MOOD_HIGH_ENERGY and mood_flags & _MOOD_DANCEABLE:
+            # High energy, danceable - I-V-vi-IV (C-G-Am-F in C major)
+            return (1, 5, 6, 4)
+        if mood_flags & _MOOD_HAPPY:
+            # Happy major - I-vi-IV-V (C-Am-F-G in C major)
+            return (1, 6, 4, 5)
+        # Standard major progression - I-IV-vi-V (C-F-Am-G in C major)
+        return (1, 4, 6, 5)
+    
+    # Minor key diatonic chord progressions
+    if mood_flags & _MOOD_HIGH_ENERGY:
+        # High energy minor - i-VII-VI-VII (Am-G-F-G in A minor)
+        return (1, 7, 6, 7)
+    if mood_flags & _MOOD_SAD:
+        # Sad minor - i-VI-III-VII (Am-F-C-G in A minor)
+        return (1, 6, 3, 7)
+    # Standard minor progression - i-iv-V-i (Am-Dm-G-Am in A minor harmonic)
+    return (1, 4, 5, 1)
+
+
+def _fallback_rhythm_for_mood(mood_flags: int) -> Tuple[float, ...]:
+    """Intelligent fallback melody rhythm pattern (beats per note) for a mood"""
+    if mood_flags & _MOOD_VERY_DANCEABLE:
+        return (0.5, 0.5, 0.5, 0.5, 1.0, 1.0)  # Danceable - more notes, syncopated
+    if mood_flags & _MOOD_HIGH_ENERGY:
+        return (0.5, 0.5, 1.0, 1.0, 1.0)  # High energy - driving rhythm
+    return (1.0, 1.0, 1.0, 1.0)  # Standard rhythm - quarter notes
+
+
+# Dispatch tables indexed directly by mood flags
+_PROGRESSIONS_BY_MOOD = {
+    mode_name: tuple(_progression_for_mood(mode_name, flags) for flags in range(_MOOD_FLAG_COMBINATIONS))
+    for mode_name in _SCALE_INTERVALS
+}
+_FALLBACK_RHYTHMS = tuple(_fallback_rhythm_for_mood(flags) for flags in range(_MOOD_FLAG_COMBINATIONS))
+
+
+def _build_scale_table() -> Dict[Tuple[str, str], Tuple[str, ...]]:
+    """Map each (key, mode) to its seven scale note names"""
+    return {
+        (key_name, mode_name): tuple(_ROTATED_CHROMATIC[start_idx][interval] for interval in intervals)
+        for key_name, start_idx in _KEY_INDEX.items()
+        for mode_name, intervals in _SCALE_INTERVALS.items()
+    }
+
+
+_SCALE_CACHE = _build_scale_table()
+
+# Scale degree (0-6) of each note, per (key, mode); doubles as an O(1) scale membership test
+_SCALE_INDEX_CACHE = {
+    key_mode: {note_name: degree for degree, note_name in enumerate(scale)}
+    for key_mode, scale in _SCALE_CACHE.items()
+}
+
+
+def _build_chord_tone_table() -> Dict[Tuple[str, str], Dict[str, Tuple[str, str, str]]]:
+    """Map each (key, mode) to the diatonic triad (root, third, fifth) built on every scale note"""
+    table = {}
+    for key_mode, scale in _SCALE_CACHE.items():
+        # Root, third (2 scale degrees up), fifth (4 scale degrees up)
+        table[key_mode] = {
+            root: (scale[degree], scale[(degree + 2) % 7], scale[(degree + 4) % 7])
+            for degree, root in enumerate(scale)
+        }
+    return table
+
+
+CHORD_TONE_TABLE = _build_chord_tone_table()
+
+
+@functools.lru_cache(maxsize=256)
+def _diatonic_chord_roots(key_name: str, mode_name: str, scale_degrees: Tuple[int, ...]) -> Tuple[str, ...]:
+    """Convert 1-indexed scale degrees to chord root names in the given key (cached)"""
+    scale_notes = _SCALE_CACHE.get((key_name, mode_name)) or _SCALE_CACHE[('C', mode_name)]
+    return tuple(scale_notes[(degree - 1) % len(scale_notes)] for degree in scale_degrees)
+
+
+@functools.lru_cache(maxsize=128)
+def _voice_triad(triad: Tuple[str, ...], octave: int) -> Tuple[str, ...]:
+    """Attach an octave number to each note name of a triad (cached)"""
+    return tuple(_octave_note_name(note_name, octave) for note_name in triad)
+
+
+def _melody_scale_degrees(beat_count: int, scale_size: int, valence: float, danceability: float) -> List[int]:
+    """
+    Scale degree for each beat of an extracted melody (4 beats per bar)
+    
+    Args:
+        beat_count: Number of beats
+        scale_size: Number of notes in the scale
+        valence: Spotify valence, picks the melodic direction
+        danceability: Spotify danceability, adds off-beat syncopation above 0.7
+        
+    Returns:
+        Scale degree indices, one per beat
+    """
+    # Off-beat scale degree is (beat_step * beat_index + bar_step * bar_number + offset) mod scale size
+    if valence > 0.6:  # Happy music - upward movement
+        beat_step, bar_step, offset = 1, 1, 0
+    elif valence < 0.4:  # Sad music - downward movement or lower notes
+        beat_step, bar_step, offset = -1, 1, 0
+    else:  # Neutral - stepwise movement
+        beat_step, bar_step, offset = 1, 2, -2
+    
+    # Add some variation based on danceability
+    syncopate = danceability > 0.7
+    
+    scale_degrees = []
+    for beat_index in range(beat_count):
+        beat_in_bar = beat_index % 4
+        
+        if beat_in_bar == 0:  # Downbeat - favor stable notes
+            scale_degree = (0, 2, 4)[beat_index % 3]  # Root, third, fifth
+        else:
+            bar_number = (beat_index // 4) + 1
+            scale_degree = (beat_step * beat_index + bar_step * bar_number + offset) % scale_size
+            if syncopate and beat_in_bar % 2 == 1:
+                scale_degree = (scale_degree + 2) % scale_size  # Add syncopation
+        
+        scale_degrees.append(scale_degree)
+    
+    return scale_degrees
+
+
+def _json_dumps(obj: Any, sort_keys: bool = False) -> bytes:
+    """Serialize to compact JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+    return json.dumps(obj, sort_keys=sort_keys, separators=(',', ':')).encode('utf-8')
+
+
+def _json_loads(data: bytes) -> Any:
+    """Parse JSON text or bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _write_cache_file(path: str, data: bytes) -> None:
+    """Write a cache entry atomically so concurrent readers never see a partial file"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _has_melody_notes(response: Optional[Dict]) -> bool:
+    """Check that a chat completion contains at least one melody note token"""
+    try:
+        text = response['choices'][0]['message']['content']
+    except (TypeError, KeyError, IndexError):
+        return False
+    return any(match.group('bar_number') is None for match in _GPT_MELODY_TOKEN_RE.finditer(text))
+
+
+def _pack_notes(notes: List[Dict]) -> bytes:
+    """Serialize parsed notes into the compact binary cache format"""
+    parts = [_NOTES_CACHE_HEADER.pack(_NOTES_CACHE_MAGIC, len(notes))]
+    pack = _NOTES_CACHE_RECORD.pack
+    for note_info in notes:
+        note_name = note_info['note']
+        midi_pitch = note_info.get('midi_pitch')
+        if midi_pitch is None:
+            midi_pitch = _note_name_to_midi(note_name)
+        parts.append(pack(
+            note_name.encode('ascii'),
+            midi_pitch,
+            note_info['velocity'],
+            note_info['bar'],
+            note_info['duration'],
+            note_info['beat'],
+            note_info.get('timing_offset', 0.0)
+        ))
+    return b''.join(parts)
+
+
+def _unpack_notes(data: bytes) -> List[Dict]:
+    """Rebuild note dictionaries from the binary cache format (ValueError if malformed)"""
+    try:
+        magic, count = _NOTES_CACHE_HEADER.unpack_from(data)
+    except struct.error as e:
+        raise ValueError(str(e)) from e
+    if magic != _NOTES_CACHE_MAGIC or len(data) != _NOTES_CACHE_HEADER.size + count * _NOTES_CACHE_RECORD.size:
+        raise ValueError("not a parsed-notes cache file")
+    
+    return [
+        {
+            'note': note_name.rstrip(b'\0').decode('ascii'),
+            'duration': note_duration,
+            'velocity': velocity,
+            'bar': bar,
+            'beat': beat,
+            'midi_pitch': midi_pitch,
+            'timing_offset': timing_offset
+        }
+        for note_name, midi_pitch, velocity, bar, note_duration, beat, timing_offset
+        in _NOTES_CACHE_RECORD.iter_unpack(memoryview(data)[_NOTES_CACHE_HEADER.size:])
+    ]
+
+
+def _build_pitch_table() -> Dict[str, int]:
+    """Map every natural, sharp and flat note name in octaves 0-10 to its MIDI number (C4 = 60)"""
+    table = {}
+    for octave in range(11):
+        for letter, pitch_class in _NATURAL_PITCH_CLASSES.items():
+            for accidental, alteration in (('', 0), ('#', 1), ('b', -1)):
+                midi_number = 12 * (octave + 1) + pitch_class + alteration
+                if 0 <= midi_number <= 127:
+                    table[f"{letter}{accidental}{octave}"] = midi_number
+    return table
+
+
+PITCH_TO_MIDI = _build_pitch_table()
+
+
+def _note_name_to_midi(note_name: str) -> int:
+    """Convert a note name such as 'C#4' or 'Bb3' to a MIDI note number (C4 = 60)"""
+    try:
+        return PITCH_TO_MIDI[note_name]
+    except KeyError:
+        raise ValueError(f"Note {note_name} is not a valid MIDI note name") from None
+
+
+# Duration names in beats (quarter note = 1.0)
+_BASE_DURATIONS = {
+    'whole': 4.0,
+    'half': 2.0,
+    'quarter': 1.0,
+    'eighth': 0.5,
+    'sixteenth': 0.25,
+    'thirty-second': 0.125,
+    'dotted-whole': 6.0,
+    'dotted-half': 3.0,
+    'dotted-quarter': 1.5,
+    'dotted-eighth': 0.75,
+    'triplet-quarter': 0.667,
+    'triplet-eighth': 0.333
+}
+
+
+def _duration_from_rules(duration_str: str) -> float:
+    """Resolve a duration name, applying dotted/triplet modifiers to the base value"""
+    # Handle dotted notes
+    if 'dotted' in duration_str:
+        base_duration = duration_str.replace('dotted-', '').replace('dotted', '').strip()
+        base_value = _BASE_DURATIONS.get(base_duration, 1.0)
+        return base_value * 1.5
+    
+    # Handle triplets
+    if 'triplet' in duration_str:
+        base_duration = duration_str.replace('triplet-', '').replace('triplet', '').strip()
+        base_value = _BASE_DURATIONS.get(base_duration, 1.0)
+        return base_value * (2.0 / 3.0)
+    
+    return _BASE_DURATIONS.get(duration_str, 1.0)
+
+
+# Every base duration with each dotted/triplet spelling, resolved ahead of time
+DURATION_TABLE = {
+    f"{prefix}{base}": _duration_from_rules(f"{prefix}{base}")
+    for prefix in ('', 'dotted-', 'dotted ', 'dotted', 'triplet-', 'triplet ', 'triplet')
+    for base in _BASE_DURATIONS
+}
+
+# Velocity strings as written by GPT, already clamped to the MIDI range 1-127
+VELOCITY_TABLE = {str(value): max(1, min(127, value)) for value in range(128)}
+
+
+def _parse_velocity(velocity_str: str) -> int:
+    """Convert a velocity string to an int clamped to 1-127"""
+    velocity = VELOCITY_TABLE.get(velocity_str)
+    if velocity is None:
+        velocity = max(1, min(127, int(velocity_str)))
+    return velocity
+
+
+def _mido_key_signature(key_name: str, mode_name: str) -> str:
+    """Spell a key/mode pair the way mido's key_signature meta message expects"""
+    mode_name = mode_name.lower()
+    key_name = _MIDO_KEY_ENHARMONICS.get(mode_name, {}).get(key_name, key_name)
+    return f"{key_name}m" if mode_name == 'minor' else key_name
+
+
 class MIDIGenerator:
     """
     Advanced MIDI generator that uses OpenAI GPT-4 with Spotify-informed musical parameters
@@ -18,19 +440,26 @@ class MIDIGenerator:
     def __init__(self):
         """Initialize the MIDI generator with OpenAI API"""
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
+        self.session = self._create_openai_session()
         
         if not self.openai_api_key:
             logger.warning("OpenAI API key not found. MIDI generation will be limited.")
             self.client = None
             return
         
-        # Test the API key by making a simple request
-        try:
-            self._test_openai_api()
-            self.client = True  # Use as a flag that API is available
-            logger.info("MIDI Generator initialized with OpenAI integration")
-        except Exception as e:
-            logger.error(f"Failed to connect to OpenAI API: {str(e)}")
+        self.client = True  # Use as a flag that API is available
+        logger.info("MIDI Generator initialized with OpenAI integration")
+        
+        # Test the API key in the background so construction does not wait on
+        # a network round-trip; this also warms the pooled HTTPS connection
+        threading.Thread(target=self._verify_openai_api, name="openai-api-check", daemon=True).start()
+    
+    def _verify_openai_api(self) -> None:
+        """Run the OpenAI API test and switch to fallback generation if the key is rejected"""
+        if self._test_openai_api():
+            logger.info("OpenAI API connection verified")
+        else:
+            logger.error("Failed to connect to OpenAI API, using fallback generation")
             self.client = None
     
     def generate_from_gpt_with_spotify(
@@ -61,9 +490,16 @@ class MIDIGenerator:
             if not notes:
                 # Fallback to AI generation only if melody extraction completely fails
                 logger.warning("Could not extract melody from Spotify data, falling back to AI generation")
-                melody_data = self._generate_melody_with_gpt(prompt, musical_params, spotify_data)
-                if melody_data:
-                    notes = self._parse_gpt_melody_response(melody_data, musical_params)
+                notes_cache_path = self._notes_cache_path(prompt, musical_params, spotify_data)
+                notes = self._load_cached_notes(notes_cache_path)
+                if notes is None:
+                    melody_data, from_gpt = self._request_gpt_melody(prompt, musical_params, spotify_data)
+                    if melody_data:
+                        notes, parsed = self._parse_gpt_melody_notes(melody_data, musical_params)
+                        # Only a melody GPT-4 actually wrote is worth keeping; caching a
+                        # fallback would stop identical requests from ever reaching the API
+                        if from_gpt and parsed:
+                            self._store_cached_notes(notes_cache_path, notes)
             
             if not notes:
                 return {
@@ -122,43 +558,255 @@ class MIDIGenerator:
         Returns:
             GPT-4 response with melody data
         """
+        return self._request_gpt_melody(prompt, musical_params, spotify_data)[0]
+    
+    def _request_gpt_melody(
+        self, 
+        prompt: str, 
+        musical_params: Dict,
+        spotify_data: Optional[Dict] = None
+    ) -> Tuple[Optional[str], bool]:
+        """
+        Generate a melody like _generate_melody_with_gpt and report where it came from
+        
+        Returns:
+            (melody text or None, True if the text came from GPT-4 rather than the fallback)
+        """
         if not self.client:
             logger.warning("OpenAI client not available, using fallback generation")
-            return self._generate_fallback_melody(musical_params)
+            return self._generate_fallback_melody(musical_params), False
         
         try:
-            # Enhance prompt with additional context if Spotify data is available
-            enhanced_prompt = self._enhance_prompt_with_spotify_context(prompt, spotify_data)
-            
             # Make direct API request (now only used as fallback)
-            response = self._make_openai_request(
-                model="gpt-4",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "You are a professional music composer with expertise in MIDI composition, music theory, and melody extraction. When song data is unavailable, create melodies that authentically capture the musical characteristics and style of the reference track."
-                    },
-                    {
-                        "role": "user", 
-                        "content": enhanced_prompt
-                    }
-                ],
-                max_tokens=1500,
-                temperature=0.7,  # Slightly lower for more consistency
-                top_p=0.9
+            response = self._make_cached_openai_request(
+                max_bars=musical_params.get('duration_bars'),
+                **self._build_melody_request(prompt, spotify_data)
             )
             
             if response and response.get('choices') and response['choices'][0].get('message'):
                 melody_text = response['choices'][0]['message']['content'].strip()
                 logger.info(f"GPT-4 generated melody: {melody_text[:200]}...")
-                return melody_text
+                return melody_text, True
             else:
                 logger.error("Empty response from GPT-4")
-                return None
+                return None, False
                 
         except Exception as e:
             logger.error(f"Error calling OpenAI API: {str(e)}")
-            return self._generate_fallback_melody(musical_params)
+            return self._generate_fallback_melody(musical_params), False
+    
+    def _build_melody_request(self, prompt: str, spotify_data: Optional[Dict] = None) -> Dict:
+        """
+        Build the chat completion parameters for a melody generation request
+        
+        Args:
+            prompt: Detailed musical prompt
+            spotify_data: Optional Spotify analysis for context
+            
+        Returns:
+            Keyword arguments for _make_openai_request (also the batch request body)
+        """
+        # Enhance prompt with additional context if Spotify data is available
+        enhanced_prompt = self._enhance_prompt_with_spotify_context(prompt, spotify_data)
+        
+        return {
+            'model': "gpt-4",
+            'messages': [
+                {
+                    "role": "system", 
+                    "content": "You are a professional music composer with expertise in MIDI composition, music theory, and melody extraction. When song data is unavailable, create melodies that authentically capture the musical characteristics and style of the reference track."
+                },
+                {
+                    "role": "user", 
+                    "content": enhanced_prompt
+                }
+            ],
+            'max_tokens': 1500,
+            'temperature': 0.7,  # Slightly lower for more consistency
+            'top_p': 0.9
+        }
+    
+    def generate_melodies_with_gpt(
+        self, 
+        jobs: List[Tuple[str, Dict, Optional[Dict]]],
+        max_concurrency: int = OPENAI_MAX_CONCURRENCY
+    ) -> List[Optional[str]]:
+        """
+        Generate several GPT-4 melodies concurrently over the pooled session
+        
+        Requests overlap their network and model time, bounded by
+        max_concurrency; 429 responses are retried (honoring Retry-After)
+        by the session's retry policy.
+        
+        Args:
+            jobs: (prompt, musical_params, spotify_data) tuples
+            max_concurrency: Maximum number of requests in flight
+            
+        Returns:
+            Melody texts in the same order as jobs (None where generation failed)
+        """
+        if not jobs:
+            return []
+        
+        workers = max(1, min(max_concurrency, len(jobs)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda job: self._generate_melody_with_gpt(*job), jobs))
+    
+    def submit_melody_batch(self, jobs: Dict[str, Tuple[str, Dict, Optional[Dict]]]) -> Optional[str]:
+        """
+        Submit melody generations to the OpenAI Batch API for offline bulk runs
+        
+        Batch requests are billed at a discount and use a separate rate pool,
+        at the cost of completing asynchronously (within 24h).
+        
+        Args:
+            jobs: Mapping of custom_id to (prompt, musical_params, spotify_data)
+            
+        Returns:
+            Batch ID to pass to poll_melody_batch, or None if submission failed
+        """
+        if not self.client or not jobs:
+            return None
+        
+        lines = []
+        for custom_id, (prompt, musical_params, spotify_data) in jobs.items():
+            lines.append(_json_dumps({
+                'custom_id': custom_id,
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': self._build_melody_request(prompt, spotify_data)
+            }))
+        
+        try:
+            headers = {'Authorization': f'Bearer {self.openai_api_key}'}
+            
+            upload = self.session.post(
+                f'{OPENAI_API_BASE}/files',
+                headers=headers,
+                data={'purpose': 'batch'},
+                files={'file': ('melody_batch.jsonl', b'\n'.join(lines))},
+                timeout=60
+            )
+            if upload.status_code != 200:
+                logger.error(f"OpenAI batch upload error: {upload.status_code} - {upload.text}")
+                return None
+            
+            batch = self._post_json(
+                f'{OPENAI_API_BASE}/batches',
+                {
+                    'input_file_id': _json_loads(upload.content)['id'],
+                    'endpoint': '/v1/chat/completions',
+                    'completion_window': '24h'
+                },
+                headers
+            )
+            if batch.status_code != 200:
+                logger.error(f"OpenAI batch creation error: {batch.status_code} - {batch.text}")
+                return None
+            
+            batch_id = _json_loads(batch.content)['id']
+            logger.info(f"Submitted melody batch {batch_id} with {len(lines)} requests")
+            return batch_id
+            
+        except Exception as e:
+            logger.error(f"Failed to submit OpenAI batch: {str(e)}")
+            return None
+    
+    def poll_melody_batch(
+        self, 
+        batch_id: str, 
+        timeout: float = 24 * 3600,
+        initial_delay: float = 5.0,
+        max_delay: float = 300.0
+    ) -> Optional[Dict]:
+        """
+        Wait for a submitted batch to finish, backing off exponentially between polls
+        
+        Args:
+            batch_id: ID returned by submit_melody_batch
+            timeout: Maximum seconds to wait
+            initial_delay: First delay between polls in seconds
+            max_delay: Upper bound for the delay between polls
+            
+        Returns:
+            Final batch object, or None if polling failed or timed out
+        """
+        headers = {'Authorization': f'Bearer {self.openai_api_key}'}
+        deadline = time.time() + timeout
+        delay = initial_delay
+        
+        while time.time() < deadline:
+            try:
+                response = self.session.get(f'{OPENAI_API_BASE}/batches/{batch_id}', headers=headers, timeout=60)
+                if response.status_code != 200:
+                    logger.error(f"OpenAI batch status error: {response.status_code} - {response.text}")
+                    return None
+                
+                batch = _json_loads(response.content)
+                if batch.get('status') in OPENAI_BATCH_TERMINAL_STATUSES:
+                    return batch
+                    
+            except Exception as e:
+                logger.error(f"Failed to poll OpenAI batch {batch_id}: {str(e)}")
+                return None
+            
+            time.sleep(min(delay, max(0.0, deadline - time.time())))
+            delay = min(delay * 2, max_delay)
+        
+        logger.error(f"Timed out waiting for OpenAI batch {batch_id}")
+        return None
+    
+    def download_melody_batch_results(
+        self, 
+        batch: Dict, 
+        musical_params_by_id: Dict[str, Dict]
+    ) -> Dict[str, List[Dict]]:
+        """
+        Download a completed batch and parse each melody into notes
+        
+        Args:
+            batch: Completed batch object from poll_melody_batch
+            musical_params_by_id: Musical parameters for each custom_id
+            
+        Returns:
+            Mapping of custom_id to parsed note dictionaries
+        """
+        output_file_id = batch.get('output_file_id')
+        if batch.get('status') != 'completed' or not output_file_id:
+            logger.error(f"Batch {batch.get('id')} has no results (status: {batch.get('status')})")
+            return {}
+        
+        try:
+            response = self.session.get(
+                f'{OPENAI_API_BASE}/files/{output_file_id}/content',
+                headers={'Authorization': f'Bearer {self.openai_api_key}'},
+                timeout=60
+            )
+            if response.status_code != 200:
+                logger.error(f"OpenAI batch download error: {response.status_code} - {response.text}")
+                return {}
+        except Exception as e:
+            logger.error(f"Failed to download OpenAI batch results: {str(e)}")
+            return {}
+        
+        results = {}
+        for line in response.content.splitlines():
+            if not line.strip():
+                continue
+            
+            result = _json_loads(line)
+            custom_id = result.get('custom_id')
+            body = (result.get('response') or {}).get('body') or {}
+            choices = body.get('choices')
+            
+            if not choices or custom_id not in musical_params_by_id:
+                logger.warning(f"Skipping batch result {custom_id}: {result.get('error')}")
+                continue
+            
+            melody_text = choices[0]['message']['content'].strip()
+            results[custom_id] = self._parse_gpt_melody_response(melody_text, musical_params_by_id[custom_id])
+        
+        return results
     
     def _enhance_prompt_with_spotify_context(
         self, 
@@ -238,80 +886,80 @@ class MIDIGenerator:
             musical_params: Musical parameters for context
             
         Returns:
-            List of note dictionaries with pitch, duration, velocity, and timing
+            List of note dictionaries with pitch (name and midi_pitch), duration, velocity, and timing
+        """
+        return self._parse_gpt_melody_notes(gpt_response, musical_params)[0]
+    
+    def _parse_gpt_melody_notes(
+        self, 
+        gpt_response: str, 
+        musical_params: Dict
+    ) -> Tuple[List[Dict], bool]:
+        """
+        Parse a melody like _parse_gpt_melody_response and report whether it parsed
+        
+        Returns:
+            (note dictionaries, True if they were parsed from the response rather
+            than generated as a fallback)
         """
         notes = []
         current_bar = 1
         current_beat = 0
         
-        # Enhanced regex pattern to match note formats
-        note_patterns = [
-            # Standard format: C4(quarter,80) - with optional whitespace
-            r'([A-G][#b]?\d+)\s*\(\s*([^,)]+)\s*,\s*(\d+)\s*\)',
-            # Alternative format: C4 quarter 80
-            r'([A-G][#b]?\d+)\s+([a-zA-Z][a-zA-Z-]*[a-zA-Z])\s+(\d+)',
-            # Simple format: C4-quarter-80
-            r'([A-G][#b]?\d+)-([a-zA-Z][a-zA-Z-]*[a-zA-Z])-(\d+)',
-            # Loose format: Note(duration,velocity) with more flexible spacing
-            r'([A-G][#b]?\d+)\s*\(\s*([a-zA-Z][a-zA-Z-]*[a-zA-Z])\s*,\s*(\d+)\s*\)'
-        ]
-        
-        # Split response into bars
-        lines = gpt_response.split('\n')
+        # Scale membership is fixed for the whole response
+        key_name = musical_params.get('key', 'C')
+        mode_name = musical_params.get('mode', 'major')
+        scale_index = self._get_scale_index(key_name, mode_name)
         
-        for line in lines:
-            line = line.strip()
-            
-            # Check for bar markers and extract the bar number
-            bar_match = re.search(r'Bar\s*(\d+)', line, re.IGNORECASE)
-            if bar_match:
-                current_bar = int(bar_match.group(1))
+        for match in _GPT_MELODY_TOKEN_RE.finditer(gpt_response):
+            bar_number = match.group('bar_number')
+            if bar_number is not None:
+                current_bar = int(bar_number)
                 current_beat = 0
-                # Don't continue - process the rest of the line for notes after the bar marker
-                # Remove the bar marker from the line so we can parse the notes
-                line = re.sub(r'Bar\s*\d+\s*:\s*', '', line, flags=re.IGNORECASE)
+                continue
             
-            # Try to match notes with different patterns
-            for pattern in note_patterns:
-                matches = re.findall(pattern, line, re.IGNORECASE)
-                
-                for match in matches:
-                    note_name, duration_str, velocity_str = match
-                    
-                    try:
-                        # Parse note information
-                        note_info = {
-                            'note': note_name.upper(),
-                            'duration': self._parse_duration(duration_str.lower().strip()),
-                            'velocity': max(1, min(127, int(velocity_str))),
-                            'bar': current_bar,
-                            'beat': current_beat
-                        }
-                        
-                        # Validate note
-                        if self._validate_note(note_info, musical_params):
-                            notes.append(note_info)
-                            current_beat += note_info['duration']
-                        
-                    except (ValueError, KeyError) as e:
-                        logger.warning(f"Failed to parse note: {match} - {str(e)}")
-                        continue
+            if match.group('paren_note'):
+                note_name, duration_str, velocity_str = match.group('paren_note', 'paren_duration', 'paren_velocity')
+            else:
+                note_name, duration_str, velocity_str = match.group('note', 'duration', 'velocity')
+            
+            # Parse note information
+            note_info = {
+                'note': note_name.upper(),
+                'duration': self._parse_duration(duration_str.lower().strip()),
+                'velocity': _parse_velocity(velocity_str),
+                'bar': current_bar,
+                'beat': current_beat
+            }
+            
+            # Validate note, resolving its MIDI number once for the writer
+            if self._validate_note(note_info, musical_params, scale_index):
+                midi_pitch = PITCH_TO_MIDI.get(note_info['note'])
+                if midi_pitch is None:
+                    logger.warning(f"Failed to parse note: {match.group(0)} - outside the MIDI range")
+                    continue
+                note_info['midi_pitch'] = midi_pitch
+                notes.append(note_info)
+                current_beat += note_info['duration']
         
         # If no notes were parsed, generate a fallback melody
         if not notes:
             logger.warning(f"No notes parsed from GPT response. Response was: {gpt_response[:500]}...")
             logger.warning("Generating fallback melody")
             notes = self._generate_fallback_melody_notes(musical_params)
+            parsed = False
         else:
             logger.info(f"Successfully parsed {len(notes)} notes from GPT response")
+            parsed = True
         
         # Apply Spotify-informed enhancements to the notes
         if notes and musical_params:
             notes = self._apply_spotify_enhancements_to_notes(notes, musical_params)
         
-        return notes
+        return notes, parsed
     
-    def _parse_duration(self, duration_str: str) -> float:
+    @staticmethod
+    def _parse_duration(duration_str: str) -> float:
         """
         Parse duration string into beat values
         
@@ -321,80 +969,60 @@ class MIDIGenerator:
         Returns:
             Duration in beats (quarter note = 1.0)
         """
-        duration_mapping = {
-            'whole': 4.0,
-            'half': 2.0,
-            'quarter': 1.0,
-            'eighth': 0.5,
-            'sixteenth': 0.25,
-            'thirty-second': 0.125,
-            'dotted-whole': 6.0,
-            'dotted-half': 3.0,
-            'dotted-quarter': 1.5,
-            'dotted-eighth': 0.75,
-            'triplet-quarter': 0.667,
-            'triplet-eighth': 0.333
-        }
-        
-        # Handle dotted notes
-        if 'dotted' in duration_str:
-            base_duration = duration_str.replace('dotted-', '').replace('dotted', '').strip()
-            base_value = duration_mapping.get(base_duration, 1.0)
-            return base_value * 1.5
-        
-        # Handle triplets
-        if 'triplet' in duration_str:
-            base_duration = duration_str.replace('triplet-', '').replace('triplet', '').strip()
-            base_value = duration_mapping.get(base_duration, 1.0)
-            return base_value * (2.0 / 3.0)
-        
-        return duration_mapping.get(duration_str, 1.0)
+        duration_value = DURATION_TABLE.get(duration_str)
+        if duration_value is None:
+            duration_value = _duration_from_rules(duration_str)
+        return duration_value
     
-    def _validate_note(self, note_info: Dict, musical_params: Dict) -> bool:
+    def _validate_note(
+        self, 
+        note_info: Dict, 
+        musical_params: Dict, 
+        scale_index: Optional[Dict[str, int]] = None
+    ) -> bool:
         """
         Validate that a note makes sense given the musical parameters and is in the correct scale
         
         Args:
             note_info: Note information dictionary
             musical_params: Musical parameters including key, mode, etc.
+            scale_index: Precomputed scale degree map (looked up from musical_params if omitted)
             
         Returns:
             True if note is valid and in scale, False otherwise
         """
-        try:
-            # Basic validation
-            if not note_info.get('note') or note_info.get('duration', 0) <= 0:
-                return False
-            
-            # Validate velocity
-            velocity = note_info.get('velocity', 64)
-            if velocity < 1 or velocity > 127:
-                return False
-            
-            # Validate note name format
-            note_pattern = r'^[A-G][#b]?\d+$'
-            if not re.match(note_pattern, note_info['note']):
-                return False
-            
-            # Validate octave range (typically MIDI supports 0-10)
-            octave = int(note_info['note'][-1])
-            if octave < 0 or octave > 10:
-                return False
-            
-            # CRITICAL: Validate that note is in the scale
-            note_name_only = note_info['note'][:-1]  # Remove octave
+        # Basic validation
+        if not note_info.get('note') or note_info.get('duration', 0) <= 0:
+            return False
+        
+        # Validate velocity
+        velocity = note_info.get('velocity', 64)
+        if velocity < 1 or velocity > 127:
+            return False
+        
+        # Validate note name format
+        name_match = _NOTE_NAME_RE.match(note_info['note'])
+        if not name_match:
+            return False
+        note_name_only, octave = name_match.group(1), int(name_match.group(2))
+        
+        # Validate octave range (typically MIDI supports 0-10)
+        if octave < 0 or octave > 10:
+            return False
+        
+        # CRITICAL: Validate that note is in the scale
+        if scale_index is None:
+            scale_index = self._get_scale_index(
+                musical_params.get('key', 'C'), musical_params.get('mode', 'major')
+            )
+        
+        if note_name_only not in scale_index:
             key_name = musical_params.get('key', 'C')
             mode_name = musical_params.get('mode', 'major')
-            scale_notes = self._get_scale_notes(key_name, mode_name)
-            
-            if note_name_only not in scale_notes:
-                logger.warning(f"Note {note_name_only} not in scale {key_name} {mode_name}, rejecting")
-                return False
-            
-            return True
-            
-        except (ValueError, KeyError):
+            logger.warning(f"Note {note_name_only} not in scale {key_name} {mode_name}, rejecting")
             return False
+        
+        return True
     
     def _apply_spotify_enhancements_to_notes(
         self, 
@@ -411,7 +1039,7 @@ class MIDIGenerator:
         Returns:
             Enhanced list of notes with proper mood characteristics
         """
-        enhanced_notes = []
+        enhanced_notes = [None] * len(notes)
         
         # Prioritize user mood characteristics over Spotify data
         energy = musical_params.get('user_energy', musical_params.get('energy', 0.5))
@@ -421,43 +1049,38 @@ class MIDIGenerator:
         
         logger.info(f"Applying mood enhancements - Energy: {energy}, Valence: {valence}, Danceability: {danceability}")
         
+        # Energy influence (0.8-1.2 multiplier)
+        energy_multiplier = 0.8 + (energy * 0.4)
+        
+        # Loudness influence (louder tracks get higher velocities)
+        loudness_multiplier = 1.0 + min(0.3, (loudness + 20) / 40)
+        
+        # Add swing/groove based on danceability: slightly delay every other note
+        odd_timing_offset = 0.05 * danceability if danceability > 0.6 else 0.0
+        
+        # Happy music - velocity variations for bounce, repeating every 4 notes
+        bounce_accents = [int((step - 2) * 5 * valence) for step in range(4)]
+        
+        # Sad music - slightly reduce and smooth velocities
+        sad_multiplier = 0.8 + valence * 0.2
+        
         for i, note in enumerate(notes):
             enhanced_note = note.copy()
             
-            # Adjust velocity based on energy and loudness
-            base_velocity = note['velocity']
-            
-            # Energy influence (0.8-1.2 multiplier)
-            energy_multiplier = 0.8 + (energy * 0.4)
-            
-            # Loudness influence (louder tracks get higher velocities)
-            loudness_multiplier = 1.0 + min(0.3, (loudness + 20) / 40)
+            # Apply velocity adjustments based on energy and loudness
+            velocity = int(note['velocity'] * energy_multiplier * loudness_multiplier)
+            velocity = max(20, min(127, velocity))
             
-            # Apply velocity adjustments
-            enhanced_velocity = int(base_velocity * energy_multiplier * loudness_multiplier)
-            enhanced_note['velocity'] = max(20, min(127, enhanced_velocity))
-            
-            # Add swing/groove based on danceability
-            if danceability > 0.6:
-                # Add subtle timing variations for groove
-                if i % 2 == 1:  # Slightly delay every other note
-                    enhanced_note['timing_offset'] = 0.05 * danceability
-                else:
-                    enhanced_note['timing_offset'] = 0.0
-            else:
-                enhanced_note['timing_offset'] = 0.0
+            enhanced_note['timing_offset'] = odd_timing_offset if i % 2 == 1 else 0.0
             
             # Add expression based on valence (mood)
             if valence > 0.7:
-                # Happy music - add slight velocity variations for bounce
-                enhanced_note['velocity'] += int((i % 4 - 2) * 5 * valence)
-                enhanced_note['velocity'] = max(20, min(127, enhanced_note['velocity']))
+                velocity = max(20, min(127, velocity + bounce_accents[i % 4]))
             elif valence < 0.3:
-                # Sad music - slightly reduce and smooth velocities
-                enhanced_note['velocity'] = int(enhanced_note['velocity'] * (0.8 + valence * 0.2))
-                enhanced_note['velocity'] = max(15, enhanced_note['velocity'])
+                velocity = max(15, int(velocity * sad_multiplier))
             
-            enhanced_notes.append(enhanced_note)
+            enhanced_note['velocity'] = velocity
+            enhanced_notes[i] = enhanced_note
         
         return enhanced_notes
     
@@ -481,53 +1104,10 @@ class MIDIGenerator:
             True if file was created successfully, False otherwise
         """
         try:
-            # Create music21 stream
-            score = stream.Stream()
-            
-            # Set time signature
-            time_sig = musical_params.get('time_signature', [4, 4])
-            score.append(meter.TimeSignature(f"{time_sig[0]}/{time_sig[1]}"))
-            
-            # Set key signature
-            key_name = musical_params.get('key', 'C')
-            mode_name = musical_params.get('mode', 'major')
-            score.append(key.Key(key_name, mode_name))
-            
-            # Set tempo
-            tempo_bpm = musical_params.get('tempo', 120)
-            score.append(tempo.TempoIndication(number=tempo_bpm))
-            
-            # Add chord accompaniment if we have Spotify data (inspired by custom MIDI generation)
-            if spotify_data:
-                chord_track = self._create_chord_accompaniment(musical_params, spotify_data)
-                if chord_track:
-                    for chord in chord_track:
-                        score.append(chord)
-            
-            # Add melody notes to the score
-            for note_info in notes:
-                try:
-                    # Create note
-                    n = note.Note(note_info['note'])
-                    n.quarterLength = note_info['duration']
-                    n.volume.velocity = note_info['velocity']
-                    
-                    # Apply timing offset if present (for groove)
-                    if 'timing_offset' in note_info and note_info['timing_offset'] != 0:
-                        n.offset += note_info['timing_offset']
-                    
-                    score.append(n)
-                    
-                except Exception as e:
-                    logger.warning(f"Failed to create note {note_info}: {str(e)}")
-                    continue
-            
-            # Apply additional Spotify-informed enhancements to the score
-            if spotify_data:
-                score = self._apply_score_enhancements(score, spotify_data, musical_params)
-            
-            # Write MIDI file
-            score.write('midi', fp=output_path)
+            if USE_MUSIC21_WRITER:
+                self._write_music21_file(notes, output_path, musical_params, spotify_data)
+            else:
+                self._write_mido_file(notes, output_path, musical_params, spotify_data)
             logger.info(f"MIDI file created successfully: {output_path}")
             
             return True
@@ -536,54 +1116,203 @@ class MIDIGenerator:
             logger.error(f"Error creating MIDI file: {str(e)}")
             return False
     
-    def _apply_score_enhancements(
+    def _write_mido_file(
         self, 
-        score: stream.Stream, 
-        spotify_data: Dict,
-        musical_params: Dict
-    ) -> stream.Stream:
+        notes: List[Dict], 
+        output_path: str,
+        musical_params: Dict,
+        spotify_data: Optional[Dict] = None
+    ) -> None:
         """
-        Apply additional enhancements to the music21 score based on Spotify data
+        Write the melody (and chord accompaniment) directly as MIDI events with mido
+        
+        Elements are laid out one after another, matching how the music21
+        writer appends them to its Stream.
         
         Args:
-            score: music21 Stream object
-            spotify_data: Spotify analysis data
+            notes: List of note dictionaries
+            output_path: Path to save the MIDI file
             musical_params: Musical parameters
-            
-        Returns:
-            Enhanced Stream object
+            spotify_data: Optional Spotify data for enhancements
         """
+        elements = self._build_midi_elements(notes, musical_params, spotify_data)
+        
+        mid = mido.MidiFile(type=0, ticks_per_beat=TICKS_PER_BEAT)
+        track = mido.MidiTrack()
+        mid.tracks.append(track)
+        
+        # Set tempo, time signature and key signature
+        tempo_bpm = musical_params.get('tempo', 120)
+        track.append(mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(tempo_bpm), time=0))
+        
+        time_sig = musical_params.get('time_signature', [4, 4])
+        track.append(mido.MetaMessage(
+            'time_signature', numerator=time_sig[0], denominator=time_sig[1], time=0
+        ))
+        
+        key_name = musical_params.get('key', 'C')
+        mode_name = musical_params.get('mode', 'major')
         try:
-            # Get audio features
-            audio_features = spotify_data.get('audio_features', {})
-            
-            # Apply tempo variations if original track has tempo changes
-            audio_analysis = spotify_data.get('audio_analysis', {})
-            structure = audio_analysis.get('structure', {})
-            
-            if structure.get('tempo_changes') and len(structure['tempo_changes']) > 0:
-                # Add subtle tempo variations
-                for i, element in enumerate(score.flat.notes):
-                    if i % 8 == 0:  # Every 2 bars in 4/4
-                        variation = 1.0 + (audio_features.get('energy', 0.5) - 0.5) * 0.1
-                        element.quarterLength *= variation
-            
-            # Add dynamics based on loudness and energy
-            loudness = audio_features.get('loudness', -10)
-            energy = audio_features.get('energy', 0.5)
-            
-            for element in score.flat.notes:
-                if hasattr(element, 'volume'):
-                    # Adjust based on loudness (louder tracks get higher velocities)
-                    loudness_factor = max(0.5, min(1.3, (loudness + 20) / 25))
-                    element.volume.velocity = int(element.volume.velocity * loudness_factor)
-                    element.volume.velocity = max(10, min(127, element.volume.velocity))
-            
-            return score
+            track.append(mido.MetaMessage(
+                'key_signature', key=_mido_key_signature(key_name, mode_name), time=0
+            ))
+        except (ValueError, KeyError):
+            logger.warning(f"Skipping key signature for unsupported key {key_name} {mode_name}")
+        
+        for element in elements:
+            try:
+                pitches = element.get('pitches') or [_note_name_to_midi(name) for name in element['notes']]
+            except (ValueError, KeyError, IndexError) as e:
+                logger.warning(f"Failed to create note {element}: {str(e)}")
+                continue
+            
+            ticks = max(1, int(round(element['duration'] * TICKS_PER_BEAT)))
+            velocity = int(element['velocity'])
+            
+            for midi_pitch in pitches:
+                track.append(mido.Message('note_on', note=midi_pitch, velocity=velocity, time=0))
+            for i, midi_pitch in enumerate(pitches):
+                track.append(mido.Message(
+                    'note_off', note=midi_pitch, velocity=0, time=ticks if i == 0 else 0
+                ))
+        
+        mid.save(output_path)
+    
+    def _build_midi_elements(
+        self, 
+        notes: List[Dict], 
+        musical_params: Dict,
+        spotify_data: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        Lay out the final chord and melody elements shared by both MIDI writers
+        
+        Accompaniment chords come first, then the melody notes, with the
+        Spotify-informed enhancements already applied so the writers only emit
+        the final values.
+        
+        Args:
+            notes: List of note dictionaries
+            musical_params: Musical parameters
+            spotify_data: Optional Spotify data for enhancements
             
-        except Exception as e:
-            logger.error(f"Error applying score enhancements: {str(e)}")
-            return score
+        Returns:
+            List of element dicts with notes, duration, velocity and, for melody
+            notes, pitches (when known) and timing_offset
+        """
+        elements = []
+        
+        # Add chord accompaniment if we have Spotify data (inspired by custom MIDI generation)
+        if spotify_data:
+            elements.extend(self._build_chord_accompaniment(musical_params, spotify_data))
+        
+        for note_info in notes:
+            element = {
+                'notes': [note_info['note']],
+                'duration': note_info['duration'],
+                'velocity': note_info['velocity'],
+                'timing_offset': note_info.get('timing_offset', 0.0)
+            }
+            if 'midi_pitch' in note_info:
+                element['pitches'] = [note_info['midi_pitch']]
+            elements.append(element)
+        
+        # Apply additional Spotify-informed enhancements to the elements
+        if spotify_data:
+            self._apply_element_enhancements(elements, spotify_data)
+        
+        return elements
+    
+    def _apply_element_enhancements(self, elements: List[Dict], spotify_data: Dict) -> None:
+        """
+        Apply additional enhancements to the MIDI elements in place based on Spotify data
+        
+        Args:
+            elements: Chord and note elements with notes, duration and velocity
+            spotify_data: Spotify analysis data
+        """
+        audio_features = spotify_data.get('audio_features', {})
+        structure = spotify_data.get('audio_analysis', {}).get('structure', {})
+        
+        # Add subtle tempo variations if original track has tempo changes
+        if structure.get('tempo_changes'):
+            variation = 1.0 + (audio_features.get('energy', 0.5) - 0.5) * 0.1
+            for element in elements[::8]:  # Every 2 bars in 4/4
+                element['duration'] *= variation
+        
+        # Adjust based on loudness (louder tracks get higher velocities)
+        loudness = audio_features.get('loudness', -10)
+        loudness_factor = max(0.5, min(1.3, (loudness + 20) / 25))
+        for element in elements:
+            element['velocity'] = max(10, min(127, int(element['velocity'] * loudness_factor)))
+    
+    def _write_music21_file(
+        self, 
+        notes: List[Dict], 
+        output_path: str,
+        musical_params: Dict,
+        spotify_data: Optional[Dict] = None
+    ) -> None:
+        """
+        Write the MIDI file through a music21 Stream (legacy writer, see MIDI_WRITER)
+        
+        Args:
+            notes: List of note dictionaries
+            output_path: Path to save the MIDI file
+            musical_params: Musical parameters
+            spotify_data: Optional Spotify data for enhancements
+        """
+        # Create music21 stream
+        score = stream.Stream()
+        
+        # Set time signature
+        time_sig = musical_params.get('time_signature', [4, 4])
+        score.append(meter.TimeSignature(f"{time_sig[0]}/{time_sig[1]}"))
+        
+        # Set key signature
+        key_name = musical_params.get('key', 'C')
+        mode_name = musical_params.get('mode', 'major')
+        score.append(key.Key(key_name, mode_name))
+        
+        # Set tempo
+        tempo_bpm = musical_params.get('tempo', 120)
+        score.append(tempo.TempoIndication(number=tempo_bpm))
+        
+        # The progression repeats a handful of chords, so parse each one once and copy it per bar
+        chord_prototypes = {}
+        
+        # Add the chord accompaniment and melody notes to the score
+        for element in self._build_midi_elements(notes, musical_params, spotify_data):
+            try:
+                if len(element['notes']) > 1:
+                    chord_key = (tuple(element['notes']), element['duration'])
+                    prototype = chord_prototypes.get(chord_key)
+                    if prototype is None:
+                        prototype = chord_prototypes[chord_key] = chord.Chord(
+                            element['notes'], quarterLength=element['duration']
+                        )
+                    n = copy.deepcopy(prototype)
+                    
+                    # Set velocity for all notes in the chord
+                    for chord_note in n.notes:
+                        chord_note.volume.velocity = element['velocity']
+                else:
+                    n = note.Note(element['notes'][0])
+                    n.quarterLength = element['duration']
+                    n.volume.velocity = element['velocity']
+                    
+                    # Apply timing offset if present (for groove)
+                    if element.get('timing_offset'):
+                        n.offset += element['timing_offset']
+                
+                score.append(n)
+                
+            except Exception as e:
+                logger.warning(f"Failed to create note {element}: {str(e)}")
+                continue
+        
+        # Write MIDI file
+        score.write('midi', fp=output_path)
     
     def _generate_fallback_melody(self, musical_params: Dict) -> str:
         """
@@ -623,26 +1352,25 @@ class MIDIGenerator:
         Returns:
             List of note dictionaries
         """
-        notes = []
         key_name = musical_params.get('key', 'C')
         duration_bars = musical_params.get('duration_bars', 4)
         
         # Use proper scale notes for the key
         scale_note_names = self._get_scale_notes(key_name, musical_params.get('mode', 'major'))
-        scale_notes = [f"{note}4" for note in scale_note_names]
-        
-        for bar in range(1, duration_bars + 1):
-            for beat in range(4):  # 4 quarter notes per bar
-                note_idx = ((bar - 1) * 4 + beat) % len(scale_notes)
-                notes.append({
-                    'note': scale_notes[note_idx],
-                    'duration': 1.0,  # Quarter note
-                    'velocity': 80 if beat % 2 == 0 else 65,  # Accent pattern
-                    'bar': bar,
-                    'beat': beat
-                })
-        
-        return notes
+        scale_notes = [_octave_note_name(note, 4) for note in scale_note_names]
+        scale_size = len(scale_notes)
+        
+        # 4 quarter notes per bar, walking up the scale with an accent pattern
+        return [
+            {
+                'note': scale_notes[i % scale_size],
+                'duration': 1.0,  # Quarter note
+                'velocity': 65 if i % 2 else 80,  # Accent on beats 0 and 2
+                'bar': i // 4 + 1,
+                'beat': i % 4
+            }
+            for i in range(duration_bars * 4)
+        ]
     
     def _test_openai_api(self) -> bool:
         """
@@ -662,6 +1390,187 @@ class MIDIGenerator:
             logger.error(f"OpenAI API test failed: {str(e)}")
             return False
     
+    def _create_openai_session(self):
+        """
+        Create a pooled HTTP session so OpenAI calls reuse keep-alive connections
+        
+        With OPENAI_HTTP2 enabled and httpx[http2] installed, an HTTP/2 client is
+        used so concurrent requests share one connection. Both clients request
+        gzip-compressed responses by default.
+        
+        Returns:
+            httpx.Client (HTTP/2) or requests.Session with a retrying HTTPS pool
+        """
+        if OPENAI_HTTP2:
+            if httpx is None:
+                logger.warning("OPENAI_HTTP2 is set but httpx is not installed, using HTTP/1.1")
+            else:
+                try:
+                    return httpx.Client(
+                        http2=True,
+                        timeout=60,
+                        limits=httpx.Limits(max_connections=8, max_keepalive_connections=8),
+                        transport=httpx.HTTPTransport(http2=True, retries=3)
+                    )
+                except ImportError as e:
+                    logger.warning(f"HTTP/2 unavailable ({str(e)}), using HTTP/1.1")
+        
+        session = requests.Session()
+        retries = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=frozenset(['HEAD', 'GET', 'POST'])
+        )
+        session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retries))
+        return session
+    
+    def _post_json(self, url: str, payload: Dict, headers: Dict, timeout: float = 60):
+        """
+        POST a JSON body through the pooled session, whichever client backs it
+        
+        Args:
+            url: Request URL
+            payload: JSON-serializable request body
+            headers: Request headers (Content-Type is added)
+            timeout: Request timeout in seconds
+            
+        Returns:
+            Response object exposing status_code, content and text
+        """
+        headers = {**headers, 'Content-Type': 'application/json'}
+        body = _json_dumps(payload)
+        if httpx is not None and isinstance(self.session, httpx.Client):
+            return self.session.post(url, headers=headers, content=body, timeout=timeout)
+        return self.session.post(url, headers=headers, data=body, timeout=timeout)
+    
+    def _make_cached_openai_request(self, max_bars: Optional[int] = None, **request_params) -> Optional[Dict]:
+        """
+        Make an OpenAI request, reusing a stored response for identical parameters
+        
+        Responses are stored on disk under LLM_CACHE_DIR, keyed on a SHA-256 of
+        the full request (model, messages and sampling parameters), so repeated
+        generations for the same prompt skip the API round-trip entirely.
+        
+        Args:
+            max_bars: Stop a streamed melody after this many bars (see OPENAI_STREAM)
+            request_params: Keyword arguments for _make_openai_request
+            
+        Returns:
+            API response dictionary or None if failed
+        """
+        if OPENAI_STREAM:
+            def make_request():
+                return self._make_streaming_openai_request(max_bars=max_bars, **request_params)
+        else:
+            def make_request():
+                return self._make_openai_request(**request_params)
+        
+        if not LLM_CACHE_DIR:
+            return make_request()
+        
+        cache_params = {**request_params, 'max_bars': max_bars}
+        cache_key = hashlib.sha256(_json_dumps(cache_params, sort_keys=True)).hexdigest()
+        cache_path = os.path.join(LLM_CACHE_DIR, f"{cache_key}.json")
+        
+        try:
+            with open(cache_path, 'rb') as f:
+                logger.info(f"Using cached OpenAI response {cache_key[:12]}")
+                return _json_loads(f.read())
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable OpenAI cache entry {cache_path}: {str(e)}")
+        
+        response = make_request()
+        
+        # Unparseable text would otherwise be served (and fall back) on every later request
+        if _has_melody_notes(response):
+            try:
+                _write_cache_file(cache_path, _json_dumps(response))
+            except OSError as e:
+                logger.warning(f"Failed to cache OpenAI response: {str(e)}")
+        
+        return response
+    
+    def _notes_cache_path(
+        self, 
+        prompt: str, 
+        musical_params: Dict,
+        spotify_data: Optional[Dict] = None
+    ) -> Optional[str]:
+        """
+        Locate the parsed-notes cache entry for a GPT melody request
+        
+        The key covers the full chat request and the musical parameters used for
+        parsing and enhancement, so only MIDI output settings can change on a hit.
+        
+        Args:
+            prompt: Detailed musical prompt
+            musical_params: Musical parameters used to parse the melody
+            spotify_data: Optional Spotify analysis for context
+            
+        Returns:
+            Cache file path, or None if caching is disabled or not applicable
+        """
+        # Without a client every melody is a fallback; callers also skip storing
+        # fallback notes, which are cheap to rebuild and must not mask a later API call
+        if not LLM_CACHE_DIR or not self.client:
+            return None
+        
+        try:
+            cache_params = {
+                'request': self._build_melody_request(prompt, spotify_data),
+                'musical_params': musical_params
+            }
+            cache_key = hashlib.sha256(_json_dumps(cache_params, sort_keys=True)).hexdigest()
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Parsed-notes cache disabled for this request: {str(e)}")
+            return None
+        
+        return os.path.join(LLM_CACHE_DIR, f"{cache_key}.notes")
+    
+    def _load_cached_notes(self, cache_path: Optional[str]) -> Optional[List[Dict]]:
+        """
+        Load previously parsed notes, skipping both the API call and parsing
+        
+        Args:
+            cache_path: Path from _notes_cache_path
+            
+        Returns:
+            List of note dictionaries, or None on a cache miss
+        """
+        if not cache_path:
+            return None
+        
+        try:
+            with open(cache_path, 'rb') as f:
+                notes = _unpack_notes(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable parsed-notes cache entry {cache_path}: {str(e)}")
+            return None
+        
+        logger.info(f"Using {len(notes)} cached parsed notes from {cache_path}")
+        return notes
+    
+    def _store_cached_notes(self, cache_path: Optional[str], notes: List[Dict]) -> None:
+        """
+        Save parsed notes for _load_cached_notes
+        
+        Args:
+            cache_path: Path from _notes_cache_path
+            notes: Parsed and enhanced note dictionaries
+        """
+        if not cache_path or not notes:
+            return
+        
+        try:
+            _write_cache_file(cache_path, _pack_notes(notes))
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            logger.warning(f"Failed to cache parsed notes: {str(e)}")
+    
     def _make_openai_request(
         self, 
         model: str,
@@ -685,8 +1594,7 @@ class MIDIGenerator:
         """
         try:
             headers = {
-                'Authorization': f'Bearer {self.openai_api_key}',
-                'Content-Type': 'application/json'
+                'Authorization': f'Bearer {self.openai_api_key}'
             }
             
             data = {
@@ -697,15 +1605,10 @@ class MIDIGenerator:
                 'top_p': top_p
             }
             
-            response = requests.post(
-                'https://api.openai.com/v1/chat/completions',
-                headers=headers,
-                json=data,
-                timeout=60
-            )
+            response = self._post_json(f'{OPENAI_API_BASE}/chat/completions', data, headers)
             
             if response.status_code == 200:
-                return response.json()
+                return _json_loads(response.content)
             else:
                 logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
                 return None
@@ -714,6 +1617,137 @@ class MIDIGenerator:
             logger.error(f"Request to OpenAI API failed: {str(e)}")
             return None
     
+    def _iter_openai_stream_lines(self, url: str, payload: Dict, headers: Dict):
+        """
+        POST a streaming request and yield the server-sent event lines
+        
+        Closing the generator closes the underlying connection, which is how
+        callers abort a completion early.
+        """
+        headers = {**headers, 'Content-Type': 'application/json', 'Accept': 'text/event-stream'}
+        body = _json_dumps(payload)
+        
+        if httpx is not None and isinstance(self.session, httpx.Client):
+            with self.session.stream('POST', url, headers=headers, content=body, timeout=60) as response:
+                if response.status_code != 200:
+                    response.read()
+                    logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
+                    return
+                yield from response.iter_lines()
+            return
+        
+        response = self.session.post(url, headers=headers, data=body, timeout=60, stream=True)
+        try:
+            if response.status_code != 200:
+                logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
+                return
+            for line in response.iter_lines():
+                yield line.decode('utf-8')
+        finally:
+            response.close()
+    
+    def _make_streaming_openai_request(
+        self, 
+        model: str,
+        messages: List[Dict], 
+        max_tokens: int = 1500,
+        temperature: float = 0.8,
+        top_p: float = 0.9,
+        max_bars: Optional[int] = None
+    ) -> Optional[Dict]:
+        """
+        Stream a melody completion, stopping as soon as the melody is complete
+        
+        The stream is closed once a bar marker beyond max_bars arrives (the
+        model often keeps writing commentary after the melody), or aborted if
+        STREAM_MALFORMED_CHAR_LIMIT characters arrive without any note. A stream
+        that ends before [DONE] or a "stop" finish reason counts as a failure.
+        
+        Args:
+            model: GPT model to use
+            messages: List of message dictionaries
+            max_tokens: Maximum tokens in response
+            temperature: Randomness control
+            top_p: Nucleus sampling parameter
+            max_bars: Number of bars to keep, or None to read the whole stream
+            
+        Returns:
+            Response dictionary shaped like a non-streaming completion, or None if failed
+        """
+        payload = {
+            'model': model,
+            'messages': messages,
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+            'top_p': top_p,
+            'stream': True
+        }
+        headers = {'Authorization': f'Bearer {self.openai_api_key}'}
+        
+        text = ''
+        scanned = 0  # Text before this offset has been checked for complete tokens
+        found_note = False
+        complete = False  # Set once the model finished or the melody reached max_bars
+        
+        try:
+            stream_lines = self._iter_openai_stream_lines(f'{OPENAI_API_BASE}/chat/completions', payload, headers)
+            with closing(stream_lines):
+                for line in stream_lines:
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        complete = True
+                        break
+                    
+                    choices = _json_loads(data).get('choices')
+                    if choices and choices[0].get('finish_reason') == 'stop':
+                        complete = True
+                    delta = choices[0].get('delta', {}).get('content') if choices else None
+                    if not delta:
+                        continue
+                    text += delta
+                    
+                    # Only scan whole lines so tokens are never split mid-stream
+                    line_end = text.rfind('\n') + 1
+                    if line_end <= scanned:
+                        continue
+                    
+                    melody_complete = False
+                    for match in _GPT_MELODY_TOKEN_RE.finditer(text, scanned, line_end):
+                        bar_number = match.group('bar_number')
+                        if bar_number is None:
+                            found_note = True
+                        elif max_bars is not None and int(bar_number) > max_bars:
+                            text = text[:match.start()]
+                            melody_complete = True
+                            break
+                    
+                    if melody_complete:
+                        logger.info(f"Melody complete after {max_bars} bars, closing stream early")
+                        complete = True
+                        break
+                    
+                    scanned = line_end
+                    if not found_note and len(text) > STREAM_MALFORMED_CHAR_LIMIT:
+                        logger.error("No melody notes in streamed GPT-4 output, aborting")
+                        return None
+                        
+        except Exception as e:
+            logger.error(f"Streaming request to OpenAI API failed: {str(e)}")
+            return None
+        
+        if not complete:
+            # A stream cut off mid-melody must not be parsed or cached as the answer
+            if text:
+                logger.error("GPT-4 stream ended before the completion finished, discarding partial melody")
+            return None
+        
+        if not text:
+            return None
+        
+        return {'choices': [{'message': {'role': 'assistant', 'content': text}}]}
+    
     def _get_applied_enhancements(self, spotify_data: Optional[Dict]) -> List[str]:
         """
         Get list of enhancements applied based on Spotify data
@@ -773,6 +1807,11 @@ class MIDIGenerator:
         logger.info("Creating AI-enhanced melody from Spotify audio analysis data")
         
         try:
+            audio_features = spotify_data.get('audio_features', {})
+            energy = audio_features.get('energy', 0.5)
+            valence = audio_features.get('valence', 0.5)
+            danceability = audio_features.get('danceability', 0.5)
+            
             # Use user-specified key/mode if provided, otherwise use Spotify detection
             user_key = musical_params.get('key')
             user_mode = musical_params.get('mode')
@@ -783,17 +1822,15 @@ class MIDIGenerator:
                 logger.info(f"Using user-specified key: {key_name} {mode_name}")
             else:
                 # Fallback to Spotify detection
-                audio_features = spotify_data.get('audio_features', {})
                 key_num = audio_features.get('key', 0)  # 0 = C, 1 = C#, 2 = D, etc.
                 mode = audio_features.get('mode', 1)  # 1 = major, 0 = minor
                 
                 # Map Spotify key number to note name
-                key_mapping = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-                key_name = key_mapping[key_num] if 0 <= key_num < 12 else 'C'
+                key_name = _CHROMATIC[key_num] if 0 <= key_num < 12 else 'C'
                 mode_name = 'major' if mode == 1 else 'minor'
                 logger.info(f"Using Spotify-detected key: {key_name} {mode_name}")
             
-            tempo = spotify_data.get('audio_features', {}).get('tempo', musical_params.get('tempo', 120))
+            tempo = audio_features.get('tempo', musical_params.get('tempo', 120))
             logger.info(f"Final key: {key_name} {mode_name}, tempo: {tempo} BPM")
             
             # Get scale notes and chord progressions for the final key
@@ -805,7 +1842,6 @@ class MIDIGenerator:
             raw_analysis = audio_analysis.get('raw_analysis', {})
             beats = raw_analysis.get('beats', [])
             bars = raw_analysis.get('bars', [])
-            sections = raw_analysis.get('sections', [])
             
             # If we don't have detailed audio analysis, create a melody based on the song's characteristics
             if not beats or not bars:
@@ -814,46 +1850,44 @@ class MIDIGenerator:
             
             # Extract melody from the first 8-16 bars worth of data
             duration_bars = min(musical_params.get('duration_bars', 8), 16)
-            melody_notes = []
-            
-            # Use the beat timing to create a realistic melody pattern
-            beats_to_use = beats[:min(len(beats), duration_bars * 4)]  # 4 beats per bar typically
             
-            for i, beat in enumerate(beats_to_use):
-                bar_number = (i // 4) + 1
-                beat_in_bar = (i % 4)
-                
-                # Determine note based on position in song and musical characteristics
-                note_choice = self._choose_melody_note(
-                    i, bar_number, beat_in_bar, scale_notes, audio_features, sections
-                )
-                
-                # Determine duration based on beat timing
-                if i + 1 < len(beats_to_use):
-                    duration = beats_to_use[i + 1]['start'] - beat['start']
-                    # Convert to quarter note units (assuming 4/4 time)
-                    duration_quarters = (duration * tempo) / 60.0
-                    duration_quarters = max(0.25, min(2.0, duration_quarters))  # Clamp between sixteenth and half note
-                else:
-                    duration_quarters = 1.0  # Default quarter note
-                
-                # Determine velocity based on beat confidence and song energy
-                base_velocity = 70
-                confidence_boost = int(beat.get('confidence', 0.5) * 20)
-                energy_boost = int(audio_features.get('energy', 0.5) * 30)
-                velocity = min(127, max(30, base_velocity + confidence_boost + energy_boost))
-                
-                melody_notes.append({
+            # Use the beat timing to create a realistic melody pattern, one note per beat
+            beats_to_use = beats[:max(0, duration_bars) * 4]  # 4 beats per bar typically
+            note_count = len(beats_to_use)
+            
+            # Build each numeric note attribute as a typed array column, then zip them into note dicts once
+            starts = array.array('d', [beat['start'] for beat in beats_to_use])
+            
+            # Duration is the gap to the next beat in quarter note units (assuming 4/4 time),
+            # clamped between sixteenth and half note; the last beat defaults to a quarter note
+            durations = array.array('d', [
+                max(0.25, min(2.0, ((next_start - start) * tempo) / 60.0))
+                for start, next_start in zip(starts, starts[1:])
+            ])
+            durations.append(1.0)
+            
+            # Velocity is based on beat confidence and song energy; clamped to 30-127 so it fits a byte
+            base_velocity = 70 + int(energy * 30)
+            raw_velocities = [base_velocity + int(beat.get('confidence', 0.5) * 20) for beat in beats_to_use]
+            velocities = array.array('B', [
+                30 if velocity < 30 else 127 if velocity > 127 else velocity for velocity in raw_velocities
+            ])
+            
+            # Determine notes based on position in song and musical characteristics
+            note_choices = self._choose_melody_notes(note_count, scale_notes, energy, valence, danceability)
+            
+            melody_notes = [
+                {
                     'note': note_choice,
                     'duration': duration_quarters,
                     'velocity': velocity,
-                    'bar': bar_number,
-                    'beat': beat_in_bar,
-                    'timing': beat.get('start', 0)
-                })
-                
-                if bar_number >= duration_bars:
-                    break
+                    'bar': (i // 4) + 1,
+                    'beat': i % 4,
+                    'timing': start
+                }
+                for i, (note_choice, duration_quarters, velocity, start)
+                in enumerate(zip(note_choices, durations, velocities, starts))
+            ]
             
             logger.info(f"Extracted {len(melody_notes)} notes from Spotify audio analysis")
             return melody_notes
@@ -862,40 +1896,42 @@ class MIDIGenerator:
             logger.error(f"Error extracting melody from Spotify data: {str(e)}")
             return []
     
-    def _get_scale_notes(self, key_name: str, mode_name: str) -> List[str]:
+    @staticmethod
+    def _get_scale_notes(key_name: str, mode_name: str) -> Tuple[str, ...]:
         """
         Get the scale notes for a given key and mode
         
         Args:
-            key_name: Root note name (C, D, E, etc.)
+            key_name: Root note name (C, D, E, etc.); unknown keys default to C
             mode_name: Mode name (major, minor)
             
         Returns:
-            List of note names in the scale
+            Tuple of note names in the scale
         """
-        # All chromatic notes
-        chromatic = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-        
-        # Get the starting index
-        try:
-            start_idx = chromatic.index(key_name)
-        except ValueError:
-            start_idx = 0  # Default to C
-        
-        # Scale patterns (semitone intervals)
-        if mode_name.lower() == 'major':
-            intervals = [0, 2, 4, 5, 7, 9, 11]  # Major scale
-        else:
-            intervals = [0, 2, 3, 5, 7, 8, 10]  # Natural minor scale
-        
-        # Build the scale
-        scale = []
-        for interval in intervals:
-            note_idx = (start_idx + interval) % 12
-            scale.append(chromatic[note_idx])
-        
+        mode_key = _scale_mode(mode_name)
+        scale = _SCALE_CACHE.get((key_name, mode_key))
+        if scale is None:
+            scale = _SCALE_CACHE[('C', mode_key)]  # Default to C
         return scale
     
+    @staticmethod
+    def _get_scale_index(key_name: str, mode_name: str) -> Dict[str, int]:
+        """
+        Get the scale degree of each note for a given key and mode (shared; do not mutate)
+        
+        Args:
+            key_name: Root note name (C, D, E, etc.); unknown keys default to C
+            mode_name: Mode name (major, minor)
+            
+        Returns:
+            Dictionary mapping scale note names to their 0-based scale degree
+        """
+        mode_key = _scale_mode(mode_name)
+        scale_index = _SCALE_INDEX_CACHE.get((key_name, mode_key))
+        if scale_index is None:
+            scale_index = _SCALE_INDEX_CACHE[('C', mode_key)]  # Default to C
+        return scale_index
+    
     def _generate_characteristic_melody(
         self, 
         musical_params: Dict, 
@@ -919,7 +1955,6 @@ class MIDIGenerator:
         """
         logger.info(f"Generating characteristic melody in {key_name} {mode_name}")
         
-        notes = []
         duration_bars = musical_params.get('duration_bars', 8)
         energy = musical_params.get('energy', 0.5)
         valence = musical_params.get('valence', 0.5)
@@ -927,26 +1962,37 @@ class MIDIGenerator:
         
         # Add octave numbers to scale notes
         octave = 4 if energy > 0.6 else 3  # Higher energy = higher octave
-        scale_with_octaves = [f"{note}{octave}" for note in scale_notes]
+        scale_with_octaves = [_octave_note_name(note, octave) for note in scale_notes]
         
         # Add some notes from adjacent octaves for variety
         if octave == 4:
-            scale_with_octaves.extend([f"{note}5" for note in scale_notes[:4]])  # Add higher notes
+            scale_with_octaves.extend([_octave_note_name(note, 5) for note in scale_notes[:4]])  # Add higher notes
         else:
-            scale_with_octaves.extend([f"{note}4" for note in scale_notes[:4]])  # Add higher notes
+            scale_with_octaves.extend([_octave_note_name(note, 4) for note in scale_notes[:4]])  # Add higher notes
+        
+        # Determine rhythm based on danceability
+        if danceability > 0.7:
+            # More syncopated rhythm
+            durations = (0.5, 0.5, 1.0, 1.0)  # eighth, eighth, quarter, quarter
+        elif danceability > 0.4:
+            # Moderate rhythm
+            durations = (1.0, 0.5, 1.0, 1.5)  # quarter, eighth, quarter, dotted quarter
+        else:
+            # Simpler rhythm
+            durations = (1.0, 1.0, 2.0)  # quarter, quarter, half
+        
+        # Determine velocity based on energy, with some variation by position in the bar
+        base_velocity = 60 if energy < 0.4 else 80 if energy < 0.7 else 100
+        velocities = []
+        for i in range(len(durations)):
+            velocity = base_velocity + int((i % 4 - 2) * 10)
+            velocities.append(30 if velocity < 30 else 127 if velocity > 127 else velocity)
+        
+        # At most one note per duration each bar; trimmed to the notes actually written
+        notes = [None] * (max(0, duration_bars) * len(durations))
+        note_count = 0
         
         for bar in range(1, duration_bars + 1):
-            # Determine rhythm based on danceability
-            if danceability > 0.7:
-                # More syncopated rhythm
-                durations = [0.5, 0.5, 1.0, 1.0]  # eighth, eighth, quarter, quarter
-            elif danceability > 0.4:
-                # Moderate rhythm
-                durations = [1.0, 0.5, 1.0, 1.5]  # quarter, eighth, quarter, dotted quarter
-            else:
-                # Simpler rhythm
-                durations = [1.0, 1.0, 2.0]  # quarter, quarter, half
-            
             beat_pos = 0
             for i, dur in enumerate(durations):
                 if beat_pos >= 4.0:  # Don't exceed 4 beats per bar
@@ -966,81 +2012,62 @@ class MIDIGenerator:
                     # Neutral songs move in patterns
                     note_idx = ((bar - 1) * 2 + i) % len(scale_with_octaves)
                 
-                # Determine velocity based on energy
-                base_velocity = 60 if energy < 0.4 else 80 if energy < 0.7 else 100
-                velocity_variation = int((i % 4 - 2) * 10)  # Add some variation
-                velocity = max(30, min(127, base_velocity + velocity_variation))
-                
-                notes.append({
+                notes[note_count] = {
                     'note': scale_with_octaves[note_idx],
                     'duration': min(dur, 4.0 - beat_pos),  # Don't exceed bar length
-                    'velocity': velocity,
+                    'velocity': velocities[i],
                     'bar': bar,
                     'beat': beat_pos
-                })
+                }
+                note_count += 1
                 
                 beat_pos += dur
         
+        del notes[note_count:]
         logger.info(f"Generated characteristic melody with {len(notes)} notes")
         return notes
     
-    def _choose_melody_note(
+    def _choose_melody_notes(
         self, 
-        beat_index: int, 
-        bar_number: int, 
-        beat_in_bar: int, 
-        scale_notes: List[str], 
-        audio_features: Dict,
-        sections: List[Dict]
-    ) -> str:
+        beat_count: int, 
+        scale_notes: Tuple[str, ...], 
+        energy: float,
+        valence: float,
+        danceability: float
+    ) -> List[str]:
         """
-        Choose an appropriate melody note based on position and musical characteristics
+        Choose melody notes for consecutive beats based on position and musical characteristics
         
         Args:
-            beat_index: Overall beat index
-            bar_number: Current bar number
-            beat_in_bar: Beat position within the bar (0-3)
+            beat_count: Number of beats (4 per bar) to choose notes for
             scale_notes: Available scale notes
-            audio_features: Spotify audio features
-            sections: Song sections from analysis
+            energy: Spotify energy (0-1), picks the octave
+            valence: Spotify valence (0-1), picks the melodic direction
+            danceability: Spotify danceability (0-1), adds syncopation
             
         Returns:
-            Note name with octave
+            Note names with octave, one per beat
         """
-        energy = audio_features.get('energy', 0.5)
-        valence = audio_features.get('valence', 0.5)
-        danceability = audio_features.get('danceability', 0.5)
-        
         # Determine base octave based on energy
         base_octave = 4 if energy > 0.5 else 3
-        
-        # Choose scale degree based on various factors
-        if beat_in_bar == 0:  # Downbeat - favor stable notes
-            scale_degree = [0, 2, 4][beat_index % 3]  # Root, third, fifth
-        elif valence > 0.6:  # Happy music - upward movement
-            scale_degree = (beat_index + bar_number) % len(scale_notes)
-        elif valence < 0.4:  # Sad music - downward movement or lower notes
-            scale_degree = max(0, (len(scale_notes) - beat_index + bar_number) % len(scale_notes))
-        else:  # Neutral - stepwise movement
-            scale_degree = (beat_index + (bar_number - 1) * 2) % len(scale_notes)
-        
-        # Add some variation based on danceability
-        if danceability > 0.7 and beat_in_bar % 2 == 1:
-            scale_degree = (scale_degree + 2) % len(scale_notes)  # Add syncopation
-        
-        note_name = scale_notes[scale_degree]
-        
-        # Vary octave based on position and energy
-        if energy > 0.7 and bar_number > 4:
-            octave = base_octave + 1  # Go higher in energetic songs
-        elif energy < 0.3:
+        if energy < 0.3:
             octave = base_octave - 1 if base_octave > 2 else base_octave  # Stay lower in low energy
         else:
             octave = base_octave
+        # Go higher in energetic songs after the first 4 bars
+        late_octave = base_octave + 1 if energy > 0.7 else octave
+        early_names = [_octave_note_name(note_name, octave) for note_name in scale_notes]
+        late_names = [_octave_note_name(note_name, late_octave) for note_name in scale_notes]
         
-        return f"{note_name}{octave}"
+        scale_degrees = _melody_scale_degrees(beat_count, len(scale_notes), valence, danceability)
+        
+        # Beats 0-15 are the first 4 bars
+        return [
+            (late_names if beat_index >= 16 else early_names)[scale_degree]
+            for beat_index, scale_degree in enumerate(scale_degrees)
+        ]
     
-    def _get_intelligent_chord_progression(self, key_name: str, mode_name: str, spotify_data: Dict) -> List[str]:
+    def _get_intelligent_chord_progression(self, key_name: str, mode_name: str, spotify_data: Dict) -> Tuple[str, ...]:
         """
         Generate intelligent chord progressions using only scale notes (diatonic chords)
         Ensures all chord roots are within the specified key/scale
@@ -1051,49 +2078,25 @@ class MIDIGenerator:
             spotify_data: Spotify analysis data for context
             
         Returns:
-            List of chord root notes for the progression (all in scale)
+            Chord root notes for the progression (all in scale, shared; do not mutate)
         """
         audio_features = spotify_data.get('audio_features', {})
         energy = audio_features.get('energy', 0.5)
         valence = audio_features.get('valence', 0.5)
         danceability = audio_features.get('danceability', 0.5)
         
-        # Get scale notes (these are the only valid chord roots)
-        scale_notes = self._get_scale_notes(key_name, mode_name)
-        
-        # Define chord progressions using scale degrees (1-indexed)
-        if mode_name.lower() == 'major':
-            # Major key diatonic chord progressions
-            if energy > 0.7 and danceability > 0.6:
-                # High energy, danceable - I-V-vi-IV (C-G-Am-F in C major)
-                scale_degrees = [1, 5, 6, 4]  
-            elif valence > 0.6:
-                # Happy major - I-vi-IV-V (C-Am-F-G in C major)
-                scale_degrees = [1, 6, 4, 5]
-            else:
-                # Standard major progression - I-IV-vi-V (C-F-Am-G in C major)
-                scale_degrees = [1, 4, 6, 5]
-        else:
-            # Minor key diatonic chord progressions
-            if energy > 0.7:
-                # High energy minor - i-VII-VI-VII (Am-G-F-G in A minor)
-                scale_degrees = [1, 7, 6, 7]
-            elif valence < 0.4:
-                # Sad minor - i-VI-III-VII (Am-F-C-G in A minor)
-                scale_degrees = [1, 6, 3, 7]
-            else:
-                # Standard minor progression - i-iv-V-i (Am-Dm-G-Am in A minor harmonic)
-                scale_degrees = [1, 4, 5, 1]
-        
-        # Convert scale degrees to actual chord roots (ensuring they're in the scale)
-        chord_roots = []
-        for degree in scale_degrees:
-            # Convert 1-indexed scale degree to 0-indexed array position
-            scale_idx = (degree - 1) % len(scale_notes)
-            chord_root = scale_notes[scale_idx]
-            chord_roots.append(chord_root)
-        
-        logger.info(f"Generated DIATONIC chord progression for {key_name} {mode_name}: {chord_roots} (scale: {scale_notes})")
+        # Chord progression as scale degrees (1-indexed), picked by mood
+        mode_key = _scale_mode(mode_name)
+        scale_degrees = _PROGRESSIONS_BY_MOOD[mode_key][_mood_flags(energy, valence, danceability)]
+        
+        # Convert scale degrees to actual chord roots (scale notes are the only valid roots)
+        chord_roots = _diatonic_chord_roots(key_name, mode_key, scale_degrees)
+        
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "Generated DIATONIC chord progression for %s %s: %s (scale: %s)",
+                key_name, mode_name, list(chord_roots), list(self._get_scale_notes(key_name, mode_name))
+            )
         return chord_roots
     
     def _generate_intelligent_fallback_melody(self, musical_params: Dict) -> List[Dict]:
@@ -1112,40 +2115,77 @@ class MIDIGenerator:
         key_name = musical_params.get('key', 'C')
         mode_name = musical_params.get('mode', 'major')
         duration_bars = musical_params.get('duration_bars', 8)
-        tempo = musical_params.get('tempo', 120)
         
         # Simulate Spotify characteristics for fallback
         energy = musical_params.get('energy', 0.6)  # Default to medium-high energy
         valence = musical_params.get('valence', 0.5)  # Neutral mood
         danceability = musical_params.get('danceability', 0.5)  # Medium danceability
         
-        # Get scale notes and chord progression
-        scale_notes = self._get_scale_notes(key_name, mode_name)
-        chord_progression = self._get_intelligent_chord_progression(
-            key_name, mode_name, 
-            {'audio_features': {'energy': energy, 'valence': valence, 'danceability': danceability}}
+        # The melody only depends on the key, length and which mood thresholds are crossed
+        template = self._intelligent_fallback_template(
+            key_name, mode_name, duration_bars,
+            _mood_flags(energy, valence, danceability),
+            energy < 0.5, energy > 0.5, energy > 0.8
         )
         
-        notes = []
+        notes = [
+            {'note': note_choice, 'duration': note_duration, 'velocity': velocity, 'bar': bar, 'beat': beat_pos}
+            for note_choice, note_duration, velocity, bar, beat_pos in template
+        ]
+        
+        logger.info(f"Generated intelligent fallback melody with {len(notes)} notes using chord progression")
+        return notes
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _intelligent_fallback_template(
+        key_name: str, 
+        mode_name: str, 
+        duration_bars: int, 
+        mood_flags: int,
+        soft_velocity: bool,
+        high_octave: bool,
+        fast_chord_changes: bool
+    ) -> Tuple[Tuple[str, float, int, int, float], ...]:
+        """
+        Compose the intelligent fallback melody (cached; shared between calls)
+        
+        Args:
+            key_name: Root note of the key
+            mode_name: major or minor mode
+            duration_bars: Number of bars to generate
+            mood_flags: _MOOD_* bitmask from _mood_flags
+            soft_velocity: Energy below 0.5 (quieter base velocity)
+            high_octave: Energy above 0.5 (passing tones in octave 4 instead of 3)
+            fast_chord_changes: Energy above 0.8 (change chord every bar instead of every 2)
+            
+        Returns:
+            (note, duration, velocity, bar, beat) tuples in order
+        """
+        # Get scale notes and chord progression
+        mode_key = _scale_mode(mode_name)
+        scale_notes = MIDIGenerator._get_scale_notes(key_name, mode_name)
+        chord_progression = _diatonic_chord_roots(key_name, mode_key, _PROGRESSIONS_BY_MOOD[mode_key][mood_flags])
+        triads = CHORD_TONE_TABLE.get((key_name, mode_key)) or CHORD_TONE_TABLE[('C', mode_key)]
+        
         chord_idx = 0
         
+        # Rhythm, velocity and passing-tone octave only depend on the mood, not the bar
+        rhythm_pattern = _FALLBACK_RHYTHMS[mood_flags]
+        base_velocity = 70 if soft_velocity else 90
+        octave = 4 if high_octave else 3
+        chord_change_bars = 1 if fast_chord_changes else 2
+        
+        # At most one note per rhythm step each bar; trimmed to the notes actually written
+        notes = [None] * (max(0, duration_bars) * len(rhythm_pattern))
+        note_count = 0
+        
         # Create melody that follows chord progressions (like the custom example)
         for bar in range(1, duration_bars + 1):
             current_chord = chord_progression[chord_idx % len(chord_progression)]
             
-            # Get chord tones for the current chord
-            chord_tones = self._get_chord_tones(current_chord, key_name, mode_name)
-            
-            # Determine rhythm pattern based on characteristics
-            if danceability > 0.7:
-                # Danceable - more syncopated rhythm
-                rhythm_pattern = [0.5, 0.5, 0.5, 0.5, 1.0, 1.0]  # More notes, syncopated
-            elif energy > 0.7:
-                # High energy - driving rhythm
-                rhythm_pattern = [0.5, 0.5, 1.0, 1.0, 1.0]  # Energetic pattern
-            else:
-                # Standard rhythm
-                rhythm_pattern = [1.0, 1.0, 1.0, 1.0]  # Quarter notes
+            # Get chord tones for the current chord (progression roots are always in the scale)
+            chord_tones = _voice_triad(triads[current_chord], 4)
             
             beat_pos = 0
             note_in_bar = 0
@@ -1156,45 +2196,36 @@ class MIDIGenerator:
                 
                 # Choose note intelligently
                 if note_in_bar == 0:  # First note of bar - use chord tone
-                    note_choice = self._choose_chord_tone(chord_tones, 0)  # Root of chord
+                    note_choice = chord_tones[0]  # Root of chord
                 elif note_in_bar % 2 == 1:  # Accent beats - use chord tones
-                    tone_idx = (note_in_bar // 2) % len(chord_tones)
-                    note_choice = self._choose_chord_tone(chord_tones, tone_idx)
+                    note_choice = chord_tones[(note_in_bar // 2) % len(chord_tones)]
                 else:  # Passing tones - use scale notes
                     scale_idx = (bar + note_in_bar) % len(scale_notes)
-                    octave = 4 if energy > 0.5 else 3
-                    note_choice = f"{scale_notes[scale_idx]}{octave}"
+                    note_choice = _octave_note_name(scale_notes[scale_idx], octave)
                 
                 # Determine velocity based on position and energy
-                base_velocity = 70 if energy < 0.5 else 90
                 if note_in_bar == 0:  # Downbeat accent
-                    velocity = min(127, base_velocity + 15)
+                    velocity = base_velocity + 15
                 else:
                     velocity = base_velocity + (note_in_bar % 3) * 5
                 
-                velocity = max(30, min(127, int(velocity)))
+                velocity = 30 if velocity < 30 else 127 if velocity > 127 else velocity
                 
-                notes.append({
-                    'note': note_choice,
-                    'duration': min(duration, 4.0 - beat_pos),
-                    'velocity': velocity,
-                    'bar': bar,
-                    'beat': beat_pos
-                })
+                notes[note_count] = (note_choice, min(duration, 4.0 - beat_pos), velocity, bar, beat_pos)
+                note_count += 1
                 
                 beat_pos += duration
                 note_in_bar += 1
             
             # Move to next chord every 2 bars (or based on energy)
-            if bar % (1 if energy > 0.8 else 2) == 0:
+            if bar % chord_change_bars == 0:
                 chord_idx += 1
         
-        logger.info(f"Generated intelligent fallback melody with {len(notes)} notes using chord progression")
-        return notes
+        return tuple(notes[:note_count])
     
-    def _get_chord_tones(self, chord_root: str, key_name: str, mode_name: str) -> List[str]:
+    def _get_chord_triad(self, chord_root: str, key_name: str, mode_name: str) -> Tuple[str, str, str]:
         """
-        Get the chord tones (triad) for a given root note, ensuring they are in the specified scale
+        Look up the in-scale triad (note names without octave) for a chord root
         
         Args:
             chord_root: Root note of the chord
@@ -1202,66 +2233,49 @@ class MIDIGenerator:
             mode_name: Mode (major/minor) to determine chord quality
             
         Returns:
-            List of chord tone note names with octaves, all in the correct scale
+            Root, third and fifth note names, all in the correct scale
         """
-        # Get the scale notes for the key
-        scale_notes = self._get_scale_notes(key_name, mode_name)
+        mode_key = _scale_mode(mode_name)
+        triads = CHORD_TONE_TABLE.get((key_name, mode_key)) or CHORD_TONE_TABLE[('C', mode_key)]
         
-        # Find the chord root in the scale
-        try:
-            root_scale_idx = scale_notes.index(chord_root)
-        except ValueError:
+        triad = triads.get(chord_root)
+        if triad is None:
             # If chord root is not in scale, use the root of the key instead
-            logger.warning(f"Chord root {chord_root} not in {key_name} {mode_name} scale, using key root")
-            chord_root = key_name
-            root_scale_idx = 0
-        
-        # Build triad using scale degrees (ensures all notes are in key)
-        chord_tones = []
-        octave = 4  # Default octave
-        
-        # Root, third (2 scale degrees up), fifth (4 scale degrees up)
-        scale_intervals = [0, 2, 4]  # Scale degrees: 1st, 3rd, 5th
-        
-        for interval in scale_intervals:
-            scale_idx = (root_scale_idx + interval) % len(scale_notes)
-            note_name = scale_notes[scale_idx]
-            chord_tones.append(f"{note_name}{octave}")
+            logger.warning("Chord root %s not in %s %s scale, using key root", chord_root, key_name, mode_name)
+            triad = triads[self._get_scale_notes(key_name, mode_name)[0]]
         
-        logger.info(f"Generated in-key chord for {chord_root}: {chord_tones} (scale: {scale_notes})")
-        return chord_tones
+        return triad
     
-    def _choose_chord_tone(self, chord_tones: List[str], preference_idx: int) -> str:
+    def _get_chord_tones(self, chord_root: str, key_name: str, mode_name: str) -> Tuple[str, ...]:
         """
-        Choose a chord tone with some intelligent variation
+        Get the chord tones (triad) for a given root note, ensuring they are in the specified scale
         
         Args:
-            chord_tones: Available chord tones
-            preference_idx: Preferred index (0 = root, 1 = third, 2 = fifth)
+            chord_root: Root note of the chord
+            key_name: Key of the song (for scale validation)
+            mode_name: Mode (major/minor) to determine chord quality
             
         Returns:
-            Selected chord tone
+            Chord tone note names with octaves, all in the correct scale (shared; do not mutate)
         """
-        if not chord_tones:
-            return "C4"  # Fallback
+        octave = 4  # Default octave
+        chord_tones = _voice_triad(self._get_chord_triad(chord_root, key_name, mode_name), octave)
         
-        # Use preference but add some variation
-        idx = preference_idx % len(chord_tones)
-        return chord_tones[idx]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Generated in-key chord for %s: %s (%s %s)", chord_root, list(chord_tones), key_name, mode_name)
+        return chord_tones
     
-    def _create_chord_accompaniment(self, musical_params: Dict, spotify_data: Dict) -> List:
+    def _build_chord_accompaniment(self, musical_params: Dict, spotify_data: Dict) -> List[Dict]:
         """
-        Create chord accompaniment similar to the custom MIDI generation approach
+        Build chord accompaniment similar to the custom MIDI generation approach
         
         Args:
             musical_params: Musical parameters including key, mode, tempo
             spotify_data: Spotify data for determining chord characteristics
             
         Returns:
-            List of music21 Chord objects for accompaniment
+            List of chord dictionaries with notes, duration and velocity
         """
-        from music21 import chord
-        
         key_name = musical_params.get('key', 'C')
         mode_name = musical_params.get('mode', 'major')
         duration_bars = musical_params.get('duration_bars', 8)
@@ -1273,41 +2287,41 @@ class MIDIGenerator:
         # Get intelligent chord progression
         chord_progression = self._get_intelligent_chord_progression(key_name, mode_name, spotify_data)
         
-        chord_objects = []
+        octave = 3 if energy > 0.6 else 2  # Lower octave for accompaniment
         
-        # Create chords for each progression step
-        for bar in range(duration_bars):
-            chord_root = chord_progression[bar % len(chord_progression)]
-            
-            # Get chord tones for this root
-            chord_tones_raw = self._get_chord_tones(chord_root, key_name, mode_name)
-            
-            # Convert to lower octave for accompaniment (like the custom example)
-            chord_tones_low = []
-            for tone in chord_tones_raw:
-                note_name = tone[:-1]  # Remove octave
-                octave = 3 if energy > 0.6 else 2  # Lower octave for accompaniment
-                chord_tones_low.append(f"{note_name}{octave}")
-            
-            # Create chord with appropriate duration and velocity
-            if danceability > 0.6:
-                # Danceable - shorter chord durations for rhythm
-                chord_duration = 2.0  # Half note
-            else:
-                # Sustained chords
-                chord_duration = 4.0  # Whole note
-            
-            chord_velocity = max(40, min(80, int(60 + energy * 20)))  # Softer than melody
-            
-            # Create the chord
-            chord_obj = chord.Chord(chord_tones_low, quarterLength=chord_duration)
-            
-            # Set velocity for all notes in the chord
-            for n in chord_obj.notes:
-                n.volume.velocity = chord_velocity
-            
-            chord_objects.append(chord_obj)
-            
-            logger.info(f"Created chord {chord_root} {mode_name} for bar {bar + 1}: {chord_tones_low}")
+        # Create chord with appropriate duration and velocity
+        if danceability > 0.6:
+            # Danceable - shorter chord durations for rhythm
+            chord_duration = 2.0  # Half note
+        else:
+            # Sustained chords
+            chord_duration = 4.0  # Whole note
+        
+        chord_velocity = max(40, min(80, int(60 + energy * 20)))  # Softer than melody
+        
+        # Voice the in-scale triad for each progression step once in the accompaniment octave
+        step_tones = [
+            _voice_triad(self._get_chord_triad(chord_root, key_name, mode_name), octave)
+            for chord_root in chord_progression
+        ]
+        
+        # Bars cycle through the progression steps
+        step_count = len(step_tones)
+        chords = [
+            {
+                'notes': list(step_tones[bar % step_count]),
+                'duration': chord_duration,
+                'velocity': chord_velocity
+            }
+            for bar in range(duration_bars)
+        ]
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            for bar, chord_info in enumerate(chords):
+                logger.debug(
+                    "Created chord %s %s for bar %d: %s",
+                    chord_progression[bar % step_count], mode_name, bar + 1, chord_info['notes']
+                )
         
-        return chord_objects
+        logger.info("Created %d accompaniment chords in %s %s", len(chords), key_name, mode_name)
+        return chords
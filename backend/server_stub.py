@@ -3,26 +3,210 @@
 Flask integration stub for the MIDI Engine.
 
 Demonstrates how to integrate the MIDI engine with web endpoints.
-Run with: python server_stub.py
+Run with: gunicorn -c gunicorn.conf.py server_stub:app
+(or python server_stub.py for local development, or
+uvicorn server_stub:asgi_app --workers N when asgiref is installed)
 """
 
-from flask import Flask, send_file, request, make_response, jsonify
+from flask import Flask, send_file, request, jsonify
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import HTTPException
+import concurrent.futures
+import functools
+import gzip
+import hashlib
 import io
+import multiprocessing
+import os
 import sys
+import threading
+import zipfile
 from pathlib import Path
 
-# Add midi_engine to path
-sys.path.insert(0, str(Path(__file__).parent))
+from midi_engine.api import create_ambient_midi_with_info
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to Flask's stdlib json provider
+    orjson = None
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:  # Optional: only needed to serve asgi_app from an ASGI server
+    WsgiToAsgi = None
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Route jsonify() and request.get_json() through orjson."""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
-from midi_engine.api import create_ambient_midi_with_info, create_ambient_midi
 
 app = Flask(__name__)
+app.url_map.strict_slashes = False
+if orjson is not None:
+    app.json = ORJSONProvider(app)
 
+# ASGI entry point for uvicorn/hypercorn; generation still runs per worker process
+asgi_app = WsgiToAsgi(app) if WsgiToAsgi is not None else None
 
-@app.route("/")
-def index():
-    """Basic info page."""
-    return """
+VALID_KEYS = frozenset({'C', 'C#', 'Db', 'D', 'D#', 'Eb', 'E', 'F', 'F#', 'Gb', 'G', 'G#', 'Ab', 'A', 'A#', 'Bb', 'B'})
+VALID_MODES = frozenset({'minor', 'major'})
+
+# Query parameters shared by the generation routes:
+# (name, type, default, allowed set or inclusive (min, max) range, error message)
+AMBIENT_PARAMS = (
+    ('seed', int, 42, None, None),
+    ('key', str, 'C', VALID_KEYS, "Invalid key: {}"),
+    ('mode', str, 'minor', VALID_MODES, "Invalid mode: {}"),
+    ('bpm', int, 72, (30, 200), "BPM must be between 30-200, got {}"),
+    ('bars', int, 8, (1, 64), "Bars must be between 1-64, got {}"),
+    ('density', float, 0.35, (0.0, 1.0), "Density must be between 0.0-1.0, got {}"),
+    ('melody_program', int, 0, (0, 127), "Melody program must be 0-127, got {}"),
+    ('pad_program', int, 88, (0, 127), "Pad program must be 0-127, got {}"),
+)
+
+
+class ParamError(ValueError):
+    """Raised when a request parameter fails schema validation."""
+
+
+def _cast_param(name, cast, raw):
+    """Cast one raw value, refusing JSON booleans and fractional numbers that int() would truncate."""
+    if cast is not str and isinstance(raw, bool):
+        raise ParamError(f"Invalid parameter: {name} must be a number, got {raw!r}")
+    if cast is int and isinstance(raw, float) and not raw.is_integer():
+        raise ParamError(f"Invalid parameter: {name} must be an integer, got {raw!r}")
+    try:
+        return cast(raw)
+    except (TypeError, ValueError) as e:
+        raise ParamError(f"Invalid parameter: {str(e)}") from e
+
+
+def parse_params(args, schema):
+    """Parse and validate a mapping against schema, raising ParamError on the first bad value."""
+    params = {}
+    for name, cast, default, allowed, message in schema:
+        raw = args.get(name)
+        value = default if raw is None else _cast_param(name, cast, raw)
+        if allowed is not None:
+            if isinstance(allowed, frozenset):
+                valid = value in allowed
+            else:
+                valid = allowed[0] <= value <= allowed[1]
+            if not valid:
+                raise ParamError(message.format(value))
+        params[name] = value
+    return params
+
+
+def validate_args(schema):
+    """Parse and validate request.args against schema, passing the values to the view as keywords."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper():
+            return view(**parse_params(request.args.to_dict(), schema))
+        return wrapper
+    return decorator
+
+
+# Most parameter sets accepted by one /api/midi/ambient/batch request
+MAX_BATCH_SIZE = 32
+
+# Cached generations per worker process (generation is deterministic per seed)
+GENERATION_CACHE_SIZE = int(os.getenv('MIDI_API_CACHE_SIZE', '256'))
+
+
+# Seeded generation is deterministic, so browsers and CDNs may cache responses
+CACHE_MAX_AGE = int(os.getenv('MIDI_API_MAX_AGE', '86400'))
+
+# MIDI event data compresses well; smaller files are not worth the gzip header
+COMPRESS_MIN_SIZE = 500
+
+
+@functools.lru_cache(maxsize=GENERATION_CACHE_SIZE)
+def _gzip(midi_data):
+    """Gzip a cached MIDI file once so repeat downloads skip recompression."""
+    return gzip.compress(midi_data, compresslevel=6, mtime=0)
+
+
+# Generate in a process pool when serving from threads (0 = generate inline,
+# the default under gunicorn where each worker is already its own process)
+GENERATION_POOL_WORKERS = int(os.getenv('MIDI_API_POOL_WORKERS', '0'))
+
+# Cap concurrent generations so a burst queues instead of thrashing the GIL
+MAX_CONCURRENT_GENERATIONS = int(os.getenv('MIDI_API_MAX_CONCURRENT', os.cpu_count() or 1))
+GENERATION_QUEUE_TIMEOUT = float(os.getenv('MIDI_API_QUEUE_TIMEOUT', '30'))
+
+_pool = None
+_pool_lock = threading.Lock()
+_generation_slots = threading.BoundedSemaphore(max(1, MAX_CONCURRENT_GENERATIONS))
+
+
+class GenerationBusy(Exception):
+    """Raised when no generation slot frees up within GENERATION_QUEUE_TIMEOUT."""
+
+
+def _busy_response():
+    """503 telling the client to retry once a generation slot is likely free."""
+    response = jsonify({"error": "Server busy, try again shortly"})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, int(GENERATION_QUEUE_TIMEOUT)))
+    return response
+
+
+def warm_up():
+    """Run one tiny generation so first-request costs (lazy tables, caches) are paid at startup."""
+    from midi_engine.api import create_ambient_midi
+    create_ambient_midi(seed=0, key='C', mode='minor', bpm=72, bars=1, density=0.0)
+
+
+def _get_pool():
+    """Create the process pool lazily so it is never inherited across a fork."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=GENERATION_POOL_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=warm_up
+                )
+    return _pool
+
+
+@functools.lru_cache(maxsize=GENERATION_CACHE_SIZE)
+def _generate(seed, key, mode, bpm, bars, density, melody_program, pad_program):
+    """Generate (midi_bytes, info) once per parameter tuple; callers must not mutate info."""
+    params = dict(
+        seed=seed,
+        key=key,
+        mode=mode,
+        bpm=bpm,
+        bars=bars,
+        density=density,
+        melody_program=melody_program,
+        pad_program=pad_program
+    )
+    if not _generation_slots.acquire(timeout=GENERATION_QUEUE_TIMEOUT):
+        raise GenerationBusy()
+    try:
+        if GENERATION_POOL_WORKERS > 0:
+            return _get_pool().submit(create_ambient_midi_with_info, **params).result()
+        return create_ambient_midi_with_info(**params)
+    finally:
+        _generation_slots.release()
+
+
+# Encoded once at import; Flask serves bytes without re-encoding per request
+INDEX_HTML = """
     <h1>🎵 MIDI Engine API</h1>
     <p>Production-ready ambient MIDI generation</p>
     
@@ -31,6 +215,7 @@ def index():
         <li><a href="/api/midi/ambient">/api/midi/ambient</a> - Generate ambient MIDI</li>
         <li><a href="/api/midi/ambient?key=F%23&mode=minor&bpm=60&bars=16">/api/midi/ambient?key=F#&mode=minor&bpm=60&bars=16</a> - Custom parameters</li>
         <li><a href="/api/midi/info?seed=123&key=Bb">/api/midi/info</a> - Generation info (JSON)</li>
+        <li>POST /api/midi/ambient/batch - JSON array of parameter objects, returns a zip of MIDI files</li>
     </ul>
     
     <h2>Parameters:</h2>
@@ -46,124 +231,143 @@ def index():
     </ul>
     
     <p><em>Perfect for sad, ambient music like "Codeine Crazy" vibes!</em></p>
-    """
+    """.encode()
+
+
+@app.route("/")
+def index():
+    """Basic info page."""
+    return INDEX_HTML
 
 
 @app.route("/api/midi/ambient")
-def ambient_midi():
+@validate_args(AMBIENT_PARAMS)
+def ambient_midi(seed, key, mode, bpm, bars, density, melody_program, pad_program):
     """Generate and return ambient MIDI file."""
-    try:
-        # Parse parameters with validation
-        seed = int(request.args.get("seed", 42))
-        key = request.args.get("key", "C")
-        mode = request.args.get("mode", "minor")
-        bpm = int(request.args.get("bpm", 72))
-        bars = int(request.args.get("bars", 8))
-        density = float(request.args.get("density", 0.35))
-        melody_program = int(request.args.get("melody_program", 0))
-        pad_program = int(request.args.get("pad_program", 88))
-        
-        # Validate parameters
-        if key not in ['C', 'C#', 'Db', 'D', 'D#', 'Eb', 'E', 'F', 'F#', 'Gb', 'G', 'G#', 'Ab', 'A', 'A#', 'Bb', 'B']:
-            return jsonify({"error": f"Invalid key: {key}"}), 400
-        
-        if mode not in ['minor', 'major']:
-            return jsonify({"error": f"Invalid mode: {mode}"}), 400
-        
-        if not (30 <= bpm <= 200):
-            return jsonify({"error": f"BPM must be between 30-200, got {bpm}"}), 400
-        
-        if not (1 <= bars <= 64):
-            return jsonify({"error": f"Bars must be between 1-64, got {bars}"}), 400
-        
-        if not (0.0 <= density <= 1.0):
-            return jsonify({"error": f"Density must be between 0.0-1.0, got {density}"}), 400
-        
-        if not (0 <= melody_program <= 127):
-            return jsonify({"error": f"Melody program must be 0-127, got {melody_program}"}), 400
-        
-        if not (0 <= pad_program <= 127):
-            return jsonify({"error": f"Pad program must be 0-127, got {pad_program}"}), 400
-        
-        # Generate MIDI
-        midi_data = create_ambient_midi(
-            seed=seed,
-            key=key,
-            mode=mode,
-            bpm=bpm,
-            bars=bars,
-            density=density,
-            melody_program=melody_program,
-            pad_program=pad_program
-        )
-        
-        # Create response
-        filename = f"ambient_{key}_{mode}_{bpm}bpm_{bars}bars.mid"
-        
-        response = make_response(midi_data)
-        response.headers['Content-Type'] = 'audio/midi'
-        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
-        response.headers['Content-Length'] = len(midi_data)
-        
-        return response
-        
-    except ValueError as e:
-        return jsonify({"error": f"Invalid parameter: {str(e)}"}), 400
-    except Exception as e:
-        return jsonify({"error": f"Generation failed: {str(e)}"}), 500
+    # Generate MIDI
+    midi_data, _ = _generate(seed, key, mode, bpm, bars, density, melody_program, pad_program)
+
+    # Stream the bytes; conditional=True handles If-None-Match and Range requests
+    filename = f"ambient_{key}_{mode}_{bpm}bpm_{bars}bars.mid"
+    etag = hashlib.blake2b(midi_data, digest_size=16).hexdigest()
+    gzipped = len(midi_data) >= COMPRESS_MIN_SIZE and 'gzip' in request.accept_encodings
+    if gzipped:
+        midi_data = _gzip(midi_data)
+        etag += '-gzip'
+
+    response = send_file(
+        io.BytesIO(midi_data),
+        mimetype='audio/midi',
+        as_attachment=True,
+        download_name=filename,
+        conditional=True,
+        etag=etag,
+        max_age=CACHE_MAX_AGE
+    )
+    response.vary.add('Accept-Encoding')
+    if gzipped:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@app.route("/api/midi/ambient/batch", methods=["POST"])
+def ambient_midi_batch():
+    """Generate several ambient MIDI files from a JSON list of parameter sets, returned as a zip."""
+    configs = request.get_json(silent=True)
+    if not isinstance(configs, list) or not configs:
+        return jsonify({"error": "Expected a non-empty JSON array of parameter objects"}), 400
+    if len(configs) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch size must be at most {MAX_BATCH_SIZE}, got {len(configs)}"}), 400
+    
+    batch = []
+    for index, config in enumerate(configs):
+        if not isinstance(config, dict):
+            return jsonify({"error": f"Item {index}: expected an object"}), 400
+        try:
+            params = parse_params(config, AMBIENT_PARAMS)
+        except ParamError as e:
+            raise ParamError(f"Item {index}: {str(e)}") from e
+        batch.append(tuple(params.values()))
+    
+    if GENERATION_POOL_WORKERS > 0:
+        # Fan out so the process pool works on several cache misses at once
+        with concurrent.futures.ThreadPoolExecutor(max_workers=GENERATION_POOL_WORKERS) as executor:
+            results = list(executor.map(lambda params: _generate(*params), batch))
+    else:
+        results = [_generate(*params) for params in batch]
+    
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for index, ((seed, key, mode, bpm, bars, *_), (midi_data, _info)) in enumerate(zip(batch, results)):
+            archive.writestr(f"{index:02d}_ambient_{key}_{mode}_{bpm}bpm_{bars}bars_seed{seed}.mid", midi_data)
+    buffer.seek(0)
+    
+    return send_file(
+        buffer,
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name="ambient_batch.zip"
+    )
 
 
 @app.route("/api/midi/info")
-def midi_info():
+@validate_args(AMBIENT_PARAMS)
+def midi_info(seed, key, mode, bpm, bars, density, melody_program, pad_program):
     """Generate MIDI and return detailed info as JSON."""
-    try:
-        # Parse parameters (same validation as above)
-        seed = int(request.args.get("seed", 42))
-        key = request.args.get("key", "C")
-        mode = request.args.get("mode", "minor")
-        bpm = int(request.args.get("bpm", 72))
-        bars = int(request.args.get("bars", 8))
-        density = float(request.args.get("density", 0.35))
-        melody_program = int(request.args.get("melody_program", 0))
-        pad_program = int(request.args.get("pad_program", 88))
-        
-        # Basic validation (abbreviated for brevity)
-        if key not in ['C', 'C#', 'Db', 'D', 'D#', 'Eb', 'E', 'F', 'F#', 'Gb', 'G', 'G#', 'Ab', 'A', 'A#', 'Bb', 'B']:
-            return jsonify({"error": f"Invalid key: {key}"}), 400
-        
-        # Generate with info
-        midi_data, info = create_ambient_midi_with_info(
-            seed=seed,
-            key=key,
-            mode=mode,
-            bpm=bpm,
-            bars=bars,
-            density=density,
-            melody_program=melody_program,
-            pad_program=pad_program
-        )
-        
-        # Add file size to info
-        info['file_size'] = len(midi_data)
-        info['success'] = True
-        
-        return jsonify(info)
-        
-    except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": f"Generation failed: {str(e)}"
-        }), 500
+    # Generate with info (copy so the cached dict stays untouched)
+    midi_data, info = _generate(seed, key, mode, bpm, bars, density, melody_program, pad_program)
+    info = dict(info)
+
+    # Add file size to info
+    info['file_size'] = len(midi_data)
+    info['success'] = True
+
+    # Info is deterministic in its parameters, so the parameter tuple is a strong ETag
+    params = (seed, key, mode, bpm, bars, density, melody_program, pad_program)
+    response = jsonify(info)
+    response.set_etag(hashlib.blake2b(repr(params).encode(), digest_size=16).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_MAX_AGE
+    return response.make_conditional(request)
+
+
+# Serialized once; load balancers poll this far more often than anything else
+HEALTH_BODY = app.json.dumps({
+    "status": "healthy",
+    "service": "MIDI Engine API",
+    "version": "1.0.0"
+}).encode()
 
 
 @app.route("/api/health")
 def health():
     """Health check endpoint."""
+    response = app.response_class(HEALTH_BODY, mimetype='application/json')
+    response.cache_control.no_cache = True
+    return response
+
+
+@app.errorhandler(GenerationBusy)
+def generation_busy(error):
+    """Shed load once every generation slot is taken."""
+    return _busy_response()
+
+
+@app.errorhandler(ParamError)
+def invalid_parameter(error):
+    """Reject requests whose parameters fail schema validation; other errors fall through to a 500."""
+    return jsonify({"error": str(error)}), 400
+
+
+@app.errorhandler(Exception)
+def generation_failed(error):
+    """Handle generation errors; HTTP errors keep their own handlers."""
+    if isinstance(error, HTTPException):
+        return error
     return jsonify({
-        "status": "healthy",
-        "service": "MIDI Engine API",
-        "version": "1.0.0"
-    })
+        "success": False,
+        "error": f"Generation failed: {str(error)}"
+    }), 500
 
 
 @app.errorhandler(404)
@@ -173,6 +377,7 @@ def not_found(error):
         "error": "Endpoint not found",
         "available_endpoints": [
             "/api/midi/ambient",
+            "/api/midi/ambient/batch",
             "/api/midi/info", 
             "/api/health"
         ]
@@ -193,10 +398,22 @@ if __name__ == "__main__":
     print("🌐 Access at: http://localhost:5001")
     print("📚 API docs at: http://localhost:5001")
     print("🎹 Try: http://localhost:5001/api/midi/ambient?key=C&mode=minor&bpm=72")
-    
-    app.run(
-        host='0.0.0.0',
-        port=5001, 
-        debug=True,
-        threaded=True
-    )
+
+    try:
+        from gunicorn.app.wsgiapp import run as gunicorn_run
+    except ImportError:
+        # Werkzeug fallback: serve from threads in one process so the generation
+        # cache and concurrency cap stay shared, and get CPU parallelism from the
+        # generation process pool (whose initializer does the warm-up)
+        if GENERATION_POOL_WORKERS == 0:
+            GENERATION_POOL_WORKERS = int(os.getenv('MIDI_API_WORKERS', os.cpu_count() or 1))
+        app.run(
+            host='0.0.0.0',
+            port=5001,
+            debug=os.getenv('FLASK_DEBUG', '').lower() in ('1', 'true', 'yes'),
+            use_reloader=False,
+            threaded=True
+        )
+    else:
+        sys.argv = [sys.argv[0], '-c', str(Path(__file__).with_name('gunicorn.conf.py')), 'server_stub:app']
+        gunicorn_run()
@@ -1,32 +1,635 @@
 import spotipy
+import hashlib
+import pickle
+from collections import OrderedDict
+from spotipy.exceptions import SpotifyException
 from spotipy.oauth2 import SpotifyClientCredentials
 import os
 import logging
+import functools
+import threading
 import time
+import zlib
+from random import Random
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from typing import Dict, List, Optional, Any
 
+try:
+    import orjson
+except ImportError:  # Optional: falls back to requests' stdlib json decoding
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
-class SpotifyClient:
+# Client-side throttle for Spotify Web API calls (requests per second, concurrent requests)
+SPOTIFY_RATE_LIMIT = float(os.getenv('SPOTIFY_RATE_LIMIT', '10'))
+SPOTIFY_MAX_CONCURRENCY = int(os.getenv('SPOTIFY_MAX_CONCURRENCY', '4'))
+
+# Most IDs Spotify accepts per multi-track request (/v1/tracks, /v1/audio-features)
+SPOTIFY_TRACKS_BATCH_SIZE = 50
+SPOTIFY_AUDIO_FEATURES_BATCH_SIZE = 100
+
+# Marks tracks whose audio features request failed, as opposed to Spotify returning None
+_FEATURES_UNAVAILABLE = object()
+
+# 429 handling: retries, first backoff step and backoff cap (seconds)
+SPOTIFY_MAX_RETRIES = 5
+SPOTIFY_BACKOFF_BASE = 1.0
+SPOTIFY_BACKOFF_CAP = 60.0
+_backoff_random = Random()
+
+# Opt-in cache warmup: after a track lookup, fetch the top track of this many related
+# artists in the background (0 disables it, since it spends API quota speculatively)
+SPOTIFY_PREFETCH_RELATED = int(os.getenv('SPOTIFY_PREFETCH_RELATED', '0'))
+
+# Memoized estimated audio features, keyed by (song, artist, popularity tier)
+SPOTIFY_ESTIMATE_CACHE_SIZE = 8192
+
+
+# Cached track lookups and searches: lifetime in seconds, in-memory entry cap, and
+# on-disk directory (set SPOTIFY_CACHE_DIR to empty to keep the cache in memory only)
+SPOTIFY_CACHE_TTL = float(os.getenv('SPOTIFY_CACHE_TTL', '3600'))
+SPOTIFY_CACHE_MAX_ENTRIES = 4096
+SPOTIFY_CACHE_DIR = os.getenv('SPOTIFY_CACHE_DIR', os.path.join('.cache', 'midigpt_spotify'))
+
+
+class SpotifyCache:
     """
-    Comprehensive Spotify API client for extracting detailed musical characteristics
+    Two-tier TTL cache for Spotify responses: an in-memory LRU in front of pickle files
+    
+    Entries expire after ttl seconds in both tiers, since Spotify metadata changes
+    over time. The memory tier keeps values pickled, which is several times smaller
+    than the nested dicts themselves, and every get() returns a fresh copy.
+    """
+    
+    def __init__(self, directory: Optional[str] = SPOTIFY_CACHE_DIR, ttl: float = SPOTIFY_CACHE_TTL,
+                 max_entries: int = SPOTIFY_CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _path(self, key: str) -> Optional[str]:
+        if not self.directory:
+            return None
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{digest}.pkl")
+    
+    def get(self, key: str) -> Any:
+        """Return the cached value for key, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return pickle.loads(entry[1])
+                del self._entries[key]
+        
+        path = self._path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable Spotify cache entry {path}: {str(e)}")
+            return None
+        if expires_at <= now:
+            return None
+        
+        self._remember(key, expires_at, pickle.dumps(value, protocol=5))
+        return value
+    
+    def set(self, key: str, value: Any) -> None:
+        """Store value under key in memory and on disk."""
+        expires_at = time.time() + self.ttl
+        try:
+            blob = pickle.dumps(value, protocol=5)
+        except pickle.PicklingError as e:
+            logger.warning(f"Not caching unpicklable Spotify value for {key}: {str(e)}")
+            return
+        self._remember(key, expires_at, blob)
+        
+        path = self._path(key)
+        if path is None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((expires_at, value), f, protocol=5)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write Spotify cache entry: {str(e)}")
+    
+    def _remember(self, key: str, expires_at: float, blob: bytes) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, blob)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class RateLimitedSpotify:
+    """
+    Wraps a spotipy client so every API call is throttled and retried on 429
+    
+    Calls are spaced out by a leaky bucket (SPOTIFY_RATE_LIMIT per second) and
+    at most SPOTIFY_MAX_CONCURRENCY run at once. A 429 response sleeps for the
+    larger of Retry-After and a jittered exponential backoff, capped at
+    SPOTIFY_BACKOFF_CAP, for up to SPOTIFY_MAX_RETRIES retries.
+    """
+    
+    def __init__(self, sp, rate: float = SPOTIFY_RATE_LIMIT, max_concurrency: int = SPOTIFY_MAX_CONCURRENCY):
+        self._sp = sp
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._bucket_lock = threading.Lock()
+        self._next_slot = 0.0
+    
+    def __getattr__(self, name):
+        attr = getattr(self._sp, name)
+        if not callable(attr):
+            return attr
+        
+        def call(*args, **kwargs):
+            return self._call(attr, *args, **kwargs)
+        return call
+    
+    def _wait_for_token(self) -> None:
+        """Block until the leaky bucket lets the next request through."""
+        if not self._interval:
+            return
+        with self._bucket_lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self._interval
+        if wait > 0:
+            time.sleep(wait)
+    
+    def _call(self, func, *args, **kwargs):
+        for attempt in range(SPOTIFY_MAX_RETRIES + 1):
+            with self._slots:
+                self._wait_for_token()
+                try:
+                    return func(*args, **kwargs)
+                except SpotifyException as e:
+                    if e.http_status != 429 or attempt == SPOTIFY_MAX_RETRIES:
+                        raise
+                    retry_after = (e.headers or {}).get('Retry-After')
+            
+            # Back off outside the concurrency slot so other calls are not held up
+            try:
+                retry_after = float(retry_after)
+            except (TypeError, ValueError):
+                retry_after = 0.0
+            # Jitter the backoff so calls throttled together don't all retry at the same instant
+            backoff = SPOTIFY_BACKOFF_BASE * 2 ** attempt
+            backoff = _backoff_random.uniform(backoff / 2, backoff)
+            delay = min(SPOTIFY_BACKOFF_CAP, max(retry_after, backoff))
+            logger.warning(f"Spotify rate limited (429), retrying in {delay:.1f}s ({attempt + 1}/{SPOTIFY_MAX_RETRIES})")
+            time.sleep(delay)
+
+
+def _decode_with_orjson(response, *args, **kwargs):
+    """requests response hook: make response.json() parse the body with orjson."""
+    response.json = lambda **_: orjson.loads(response.content)
+    return response
+
+
+class ORJSONSpotify(spotipy.Spotify):
+    """spotipy client whose HTTP session decodes responses with orjson (large audio_analysis payloads)."""
+    
+    def _build_session(self):
+        super()._build_session()
+        self._session.hooks['response'].append(_decode_with_orjson)
+
+
+# Database of well-known songs with accurate data
+_KNOWN_SONGS = MappingProxyType({
+    ('rather be', 'clean bandit'): {
+        'tempo': 121, 'key': 7, 'mode': 1,  # G major
+        'energy': 0.8, 'valence': 0.9, 'danceability': 0.85
+    },
+    ('billie jean', 'michael jackson'): {
+        'tempo': 117, 'key': 6, 'mode': 0,  # F# minor
+        'energy': 0.75, 'valence': 0.4, 'danceability': 0.75
+    },
+    ('sweet child o mine', 'guns n roses'): {
+        'tempo': 125, 'key': 2, 'mode': 1,  # D major
+        'energy': 0.95, 'valence': 0.6, 'danceability': 0.5
+    },
+    ('bohemian rhapsody', 'queen'): {
+        'tempo': 72, 'key': 10, 'mode': 1,  # Bb major
+        'energy': 0.6, 'valence': 0.5, 'danceability': 0.3
+    },
+    ('stayin alive', 'bee gees'): {
+        'tempo': 104, 'key': 10, 'mode': 0,  # Bb minor
+        'energy': 0.8, 'valence': 0.7, 'danceability': 0.9
+    },
+    ('imagine', 'john lennon'): {
+        'tempo': 76, 'key': 0, 'mode': 1,  # C major
+        'energy': 0.3, 'valence': 0.7, 'danceability': 0.2
+    },
+    ('hotel california', 'eagles'): {
+        'tempo': 75, 'key': 11, 'mode': 0,  # B minor
+        'energy': 0.6, 'valence': 0.4, 'danceability': 0.4
+    },
+    ('let it be', 'the beatles'): {
+        'tempo': 73, 'key': 0, 'mode': 1,  # C major
+        'energy': 0.4, 'valence': 0.8, 'danceability': 0.3
+    },
+    ('yesterday', 'the beatles'): {
+        'tempo': 98, 'key': 5, 'mode': 1,  # F major
+        'energy': 0.2, 'valence': 0.3, 'danceability': 0.2
+    },
+    ('dont stop believin', 'journey'): {
+        'tempo': 119, 'key': 4, 'mode': 1,  # E major
+        'energy': 0.8, 'valence': 0.9, 'danceability': 0.6
+    },
+    ('shape of you', 'ed sheeran'): {
+        'tempo': 96, 'key': 1, 'mode': 0,  # C# minor
+        'energy': 0.65, 'valence': 0.9, 'danceability': 0.83
+    },
+    ('someone like you', 'adele'): {
+        'tempo': 67, 'key': 9, 'mode': 1,  # A major
+        'energy': 0.3, 'valence': 0.2, 'danceability': 0.5
+    },
+    ('rolling in the deep', 'adele'): {
+        'tempo': 105, 'key': 1, 'mode': 0,  # C# minor
+        'energy': 0.8, 'valence': 0.2, 'danceability': 0.7
+    },
+    ('uptown funk', 'mark ronson'): {
+        'tempo': 115, 'key': 2, 'mode': 0,  # D minor
+        'energy': 0.8, 'valence': 0.95, 'danceability': 0.9
+    },
+    ('thinking out loud', 'ed sheeran'): {
+        'tempo': 79, 'key': 2, 'mode': 1,  # D major
+        'energy': 0.4, 'valence': 0.9, 'danceability': 0.8
+    }
+})
+
+# Standard fields added to every known-song estimate
+_KNOWN_SONG_DEFAULTS = {
+    'acousticness': 0.3, 'instrumentalness': 0.1, 'liveness': 0.2,
+    'speechiness': 0.1, 'loudness': -8.0, 'time_signature': 4
+}
+
+# Known-song estimates with the standard fields merged in, keyed by (song, artist);
+# the partial-match scan walks the items in declaration order
+_KNOWN_SONG_FEATURES = {
+    song: {**features, **_KNOWN_SONG_DEFAULTS}
+    for song, features in _KNOWN_SONGS.items()
+}
+_KNOWN_SONG_ITEMS = tuple(_KNOWN_SONG_FEATURES.items())
+
+
+# Song-title keywords and how they shift the estimated features, with weighted scoring
+_EMOTION_KEYWORDS = MappingProxyType({
+    # High valence (happy/positive)
+    'happy': {'valence': 0.25, 'danceability': 0.15, 'energy': 0.1},
+    'joy': {'valence': 0.3, 'danceability': 0.2, 'energy': 0.15},
+    'fun': {'valence': 0.2, 'danceability': 0.25, 'energy': 0.15},
+    'party': {'valence': 0.2, 'danceability': 0.3, 'energy': 0.25, 'tempo_add': 15},
+    'dance': {'valence': 0.1, 'danceability': 0.35, 'energy': 0.2, 'tempo_add': 20},
+    'celebrate': {'valence': 0.25, 'danceability': 0.2, 'energy': 0.15},
+    'love': {'valence': 0.3, 'danceability': 0.1, 'key_preference': 2},  # D major
+    'good': {'valence': 0.15, 'energy': 0.05},
+    'up': {'valence': 0.2, 'energy': 0.15, 'tempo_add': 10},
+    'high': {'valence': 0.15, 'energy': 0.2, 'tempo_add': 5},
+    'amazing': {'valence': 0.25, 'energy': 0.15},
+    'wonderful': {'valence': 0.3, 'energy': 0.1},
+    'beautiful': {'valence': 0.2, 'energy': 0.05, 'key_preference': 7},  # G major
+    'sunshine': {'valence': 0.35, 'energy': 0.2, 'key_preference': 2},
+    'bright': {'valence': 0.25, 'energy': 0.15},
+    
+    # Low valence (sad/negative)
+    'sad': {'valence': -0.3, 'energy': -0.15, 'mode_preference': 0},
+    'blue': {'valence': -0.25, 'energy': -0.1, 'mode_preference': 0},
+    'cry': {'valence': -0.35, 'energy': -0.2, 'danceability': -0.15, 'mode_preference': 0},
+    'tear': {'valence': -0.3, 'energy': -0.15, 'danceability': -0.1, 'mode_preference': 0},
+    'alone': {'valence': -0.25, 'energy': -0.2, 'danceability': -0.15, 'mode_preference': 0},
+    'lost': {'valence': -0.2, 'energy': -0.15, 'mode_preference': 0},
+    'hurt': {'valence': -0.25, 'energy': -0.1, 'mode_preference': 0},
+    'pain': {'valence': -0.3, 'energy': -0.15, 'mode_preference': 0},
+    'sorry': {'valence': -0.2, 'energy': -0.1, 'danceability': -0.1, 'mode_preference': 0},
+    'goodbye': {'valence': -0.25, 'energy': -0.15, 'danceability': -0.15, 'mode_preference': 0},
+    'break': {'valence': -0.2, 'energy': -0.1, 'mode_preference': 0},
+    'broken': {'valence': -0.3, 'energy': -0.2, 'mode_preference': 0},
+    'empty': {'valence': -0.25, 'energy': -0.25, 'danceability': -0.2, 'mode_preference': 0},
+    'dark': {'valence': -0.2, 'energy': -0.1, 'mode_preference': 0, 'key_preference': 10},
+    'cold': {'valence': -0.15, 'energy': -0.15, 'mode_preference': 0},
+    
+    # High energy
+    'rock': {'energy': 0.25, 'danceability': 0.1, 'tempo_add': 20},
+    'fast': {'energy': 0.2, 'tempo_add': 25},
+    'beat': {'energy': 0.15, 'danceability': 0.2},
+    'jump': {'energy': 0.3, 'danceability': 0.25, 'valence': 0.15, 'tempo_add': 15},
+    'pump': {'energy': 0.25, 'danceability': 0.2, 'tempo_add': 10},
+    'fire': {'energy': 0.35, 'danceability': 0.15, 'valence': 0.1, 'tempo_add': 20},
+    'crazy': {'energy': 0.3, 'danceability': 0.2, 'tempo_add': 15},
+    'wild': {'energy': 0.25, 'danceability': 0.15, 'tempo_add': 10},
+    'electric': {'energy': 0.3, 'danceability': 0.25, 'tempo_add': 15},
+    'power': {'energy': 0.2, 'valence': 0.1, 'tempo_add': 10},
+    
+    # Low energy/slow
+    'slow': {'energy': -0.25, 'tempo_add': -30, 'danceability': -0.15},
+    'ballad': {'energy': -0.2, 'tempo_add': -25, 'danceability': -0.2, 'valence': 0.1},
+    'soft': {'energy': -0.15, 'tempo_add': -15, 'danceability': -0.1},
+    'quiet': {'energy': -0.2, 'tempo_add': -20, 'danceability': -0.15},
+    'gentle': {'energy': -0.15, 'valence': 0.1, 'tempo_add': -15},
+    'calm': {'energy': -0.2, 'valence': 0.05, 'tempo_add': -20},
+    'peace': {'energy': -0.15, 'valence': 0.15, 'tempo_add': -15},
+    'still': {'energy': -0.25, 'tempo_add': -25, 'danceability': -0.2},
+    'whisper': {'energy': -0.2, 'tempo_add': -20, 'danceability': -0.15},
+    'dream': {'energy': -0.1, 'valence': 0.1, 'tempo_add': -10},
+})
+
+# Keyword adjustments flattened to (valence, danceability, energy, tempo_add,
+# key_preference, mode_preference); None means no preference
+_EMOTION_KEYWORD_DELTAS = {
+    word: (
+        adjustments.get('valence', 0),
+        adjustments.get('danceability', 0),
+        adjustments.get('energy', 0),
+        adjustments.get('tempo_add', 0),
+        adjustments.get('key_preference'),
+        adjustments.get('mode_preference'),
+    )
+    for word, adjustments in _EMOTION_KEYWORDS.items()
+}
+
+
+# Genre-based adjustments, matched by substring of the artist name in this order
+# (read-only, since _artist_genre_adjustments hands out the inner mappings)
+_ARTIST_PATTERNS = MappingProxyType({
+    'clean bandit': MappingProxyType({'tempo_offset': 1, 'energy_offset': 0.15, 'preferred_key': 7, 'preferred_mode': 1}),
+    'michael jackson': MappingProxyType({'tempo_offset': -3, 'energy_offset': 0.1, 'preferred_key': 6, 'preferred_mode': 0}),
+    'queen': MappingProxyType({'tempo_offset': -48, 'energy_offset': -0.05, 'preferred_key': 10, 'preferred_mode': 1}),
+    'beatles': MappingProxyType({'tempo_offset': -27, 'energy_offset': -0.25, 'preferred_key': 0, 'preferred_mode': 1}),
+    'adele': MappingProxyType({'tempo_offset': -15, 'energy_offset': -0.35, 'preferred_key': 9, 'preferred_mode': 1}),
+    'ed sheeran': MappingProxyType({'tempo_offset': -24, 'energy_offset': -0.25, 'preferred_key': 2, 'preferred_mode': 1}),
+    'eagles': MappingProxyType({'tempo_offset': -45, 'energy_offset': -0.05, 'preferred_key': 11, 'preferred_mode': 0})
+})
+
+
+@functools.lru_cache(maxsize=1024)
+def _artist_genre_adjustments(artist_name: str) -> Dict:
+    """Genre adjustments for the first pattern found in artist_name (shared; do not mutate)"""
+    for artist_pattern, adjustments in _ARTIST_PATTERNS.items():
+        if artist_pattern in artist_name:
+            return adjustments
+    return {}
+
+
+@functools.lru_cache(maxsize=1024)
+def _artist_tendencies(artist_name: str) -> tuple:
+    """Deterministic (valence, danceability, energy) tendencies derived from the artist name"""
+    # Generate artist "DNA" based on name
+    artist_hash = zlib.crc32(artist_name.encode()) % 1000
+    
+    # Create subtle tendencies based on artist name characteristics
+    return (
+        (artist_hash % 20 - 10) / 100,  # -0.1 to 0.1
+        ((artist_hash * 7) % 20 - 10) / 100,
+        ((artist_hash * 13) % 20 - 10) / 100,
+    )
+
+
+# Keys picked for estimated songs: emotionally resonant minor keys, common major keys
+_MINOR_KEY_CHOICES = (2, 6, 9, 1, 4)
+_MAJOR_KEY_CHOICES = (0, 2, 4, 7, 9)
+
+# Spotify key mapping (Pitch Class to Key Name)
+_KEY_NAMES = {
+    0: 'C', 1: 'C#', 2: 'D', 3: 'D#', 4: 'E', 5: 'F',
+    6: 'F#', 7: 'G', 8: 'G#', 9: 'A', 10: 'A#', 11: 'B'
+}
+
+# Mode mapping
+_MODE_NAMES = {0: 'minor', 1: 'major'}
+
+# (key_name, mode_name, "key mode") for every Spotify (key, mode) pair
+_KEY_SIGNATURES = {
+    (key_num, mode_num): (key_name, mode_name, f"{key_name} {mode_name}")
+    for key_num, key_name in _KEY_NAMES.items()
+    for mode_num, mode_name in _MODE_NAMES.items()
+}
+
+
+def _known_song_features(song_name: str, artist_name: str) -> Optional[Dict]:
+    """
+    Check database of known songs for accurate BPM/key data
+    """
+    # Try exact match first
+    data = _KNOWN_SONG_FEATURES.get((song_name, artist_name))
+    if data is not None:
+        return dict(data)
+    
+    # Try partial matches (song name contains key words)
+    for (known_song, known_artist), features in _KNOWN_SONG_ITEMS:
+        if known_song in song_name or song_name in known_song:
+            if known_artist in artist_name or artist_name in known_artist:
+                return dict(features)
+    
+    return None
+
+
+def _artist_characteristics(artist_name: str, random) -> Dict:
     """
+    Get characteristics tendencies for different types of artists
+    """
+    valence_tendency, danceability_tendency, energy_tendency = _artist_tendencies(artist_name)
     
-    # Spotify key mapping (Pitch Class to Key Name)
-    key_mapping = {
-        0: 'C', 1: 'C#', 2: 'D', 3: 'D#', 4: 'E', 5: 'F',
-        6: 'F#', 7: 'G', 8: 'G#', 9: 'A', 10: 'A#', 11: 'B'
+    # Add some additional randomness while keeping it consistent
+    return {
+        'valence_tendency': valence_tendency + random.uniform(-0.05, 0.05),
+        'danceability_tendency': danceability_tendency + random.uniform(-0.05, 0.05),
+        'energy_tendency': energy_tendency + random.uniform(-0.05, 0.05),
     }
+
+
+def _analyze_song_characteristics(name: str, artist_name: str, valence: float,
+                                  danceability: float, energy: float, tempo: float,
+                                  key: int, mode: int, random) -> tuple:
+    """
+    Advanced analysis of song characteristics to generate unique audio features
+    
+    Args:
+        name: Song name (lowercased)
+        artist_name: Artist name (lowercased)
+        valence, danceability, energy, tempo, key, mode: Current values
+        random: Seeded random object for consistency
+        
+    Returns:
+        Tuple of updated (valence, danceability, energy, tempo, key, mode)
+    """
+    
+    words = name.split()
+    
+    # Apply keyword-based modifications
+    for word in words:
+        adjustments = _EMOTION_KEYWORD_DELTAS.get(word)
+        if adjustments is not None:
+            d_valence, d_danceability, d_energy, d_tempo, key_preference, mode_preference = adjustments
+            valence += d_valence
+            danceability += d_danceability
+            energy += d_energy
+            tempo += d_tempo
+            
+            # Set preferred key or mode if specified
+            if key_preference is not None:
+                key = key_preference
+            if mode_preference is not None:
+                mode = mode_preference
+    
+    # Artist-specific character analysis
+    artist_characteristics = _artist_characteristics(artist_name, random)
+    valence += artist_characteristics.get('valence_tendency', 0)
+    danceability += artist_characteristics.get('danceability_tendency', 0)
+    energy += artist_characteristics.get('energy_tendency', 0)
+    
+    # Add variation based on song length (from name complexity)
+    name_complexity = len(name) + len(words)
+    if name_complexity > 15:  # Longer/complex names
+        valence += random.uniform(-0.1, 0.1)
+        energy += random.uniform(-0.05, 0.1)
+        danceability += random.uniform(-0.05, 0.05)
+    
+    # Add small random variation to ensure uniqueness, with more variation for danceability
+    danceability += random.uniform(-0.08, 0.08)  # Increased range for better variety
+    
+    # Add artist-name-based variation to danceability
+    name_hash = zlib.crc32((name + artist_name).encode()) % 100
+    danceability += (name_hash - 50) / 1000  # -0.05 to 0.05 variation
+    
+    # Musical key relationships for emotional coherence
+    if mode == 0:  # Minor mode gets different key preferences
+        key = _MINOR_KEY_CHOICES[int(random.random() * len(_MINOR_KEY_CHOICES))]
+    else:  # Major mode
+        key = _MAJOR_KEY_CHOICES[int(random.random() * len(_MAJOR_KEY_CHOICES))]
+    
+    # Fine-tune based on overall song character
+    if valence > 0.7:  # Very happy songs
+        danceability = max(danceability, 0.6)  # Ensure some danceability
+        tempo = max(tempo, 100)  # Not too slow
+    elif valence < 0.3:  # Sad songs
+        danceability = min(danceability, 0.5)  # Limit danceability
+        mode = 0  # Prefer minor
+    
+    return valence, danceability, energy, tempo, key, mode
+
+
+@functools.lru_cache(maxsize=SPOTIFY_ESTIMATE_CACHE_SIZE)
+def _estimated_features(name: str, artist_name: str, popularity_tier: int) -> Dict:
+    """
+    Estimate audio features for a normalized song/artist name and popularity tier
+    
+    Deterministic in its arguments, so results are memoized; callers must copy
+    the returned dictionary before modifying it.
+    """
+    # Check our known songs database first
+    estimated = _known_song_features(name, artist_name)
+    if estimated:
+        logger.info(f"Using known song data for {name} by {artist_name}")
+        return estimated
+    
+    # Create deterministic randomization based on song/artist combination
+    seed_string = f"{name}_{artist_name}"
+    seed_hash = zlib.crc32(seed_string.encode())
+    # Local generator: seeding the global one would race with other threads using it
+    random = Random(seed_hash)
+    
+    # Generate more varied base values using the seeded random
+    energy = 0.3 + (random.random() * 0.6)  # Range: 0.3 to 0.9
+    valence = 0.2 + (random.random() * 0.7)  # Range: 0.2 to 0.9
+    danceability = 0.2 + (random.random() * 0.7)  # Range: 0.2 to 0.9
+    tempo = 80 + (random.random() * 80)  # Range: 80 to 160 BPM
+    key = int(random.random() * 12)  # Random key
+    mode = 1 if random.random() < 0.5 else 0  # Random mode
+    
+    # Analyze artist genre patterns
+    artist_adjustments = _artist_genre_adjustments(artist_name)
+    tempo += artist_adjustments.get('tempo_offset', 0)
+    energy += artist_adjustments.get('energy_offset', 0)
+    key = artist_adjustments.get('preferred_key', key)
+    mode = artist_adjustments.get('preferred_mode', mode)
     
-    # Mode mapping
-    mode_mapping = {0: 'minor', 1: 'major'}
+    # Apply more sophisticated analysis based on song characteristics
+    valence, danceability, energy, tempo, key, mode = _analyze_song_characteristics(
+        name, artist_name, valence, danceability, energy, tempo, key, mode, random
+    )
+    
+    # Adjust based on popularity (more popular songs tend to be more danceable)
+    if popularity_tier > 0:
+        danceability += 0.1
+        energy += 0.05
+    elif popularity_tier < 0:
+        danceability -= 0.1
+        energy -= 0.05
+    
+    # Generate more varied keys based on track characteristics
+    if 'be' in name or 'me' in name:
+        key = 7  # G major/minor is common for emotional songs
+    elif 'you' in name or 'love' in name:
+        key = 2  # D major is common for love songs
+    elif 'night' in name or 'dark' in name:
+        key = 10  # Bb is common for darker songs
+    
+    # Clamp values
+    energy = max(0.1, min(0.9, energy))
+    valence = max(0.1, min(0.9, valence))
+    danceability = max(0.1, min(0.9, danceability))
+    tempo = max(70, min(180, int(tempo)))
+    
+    logger.info(f"Estimated features for {name} by {artist_name}: {tempo} BPM, {_KEY_NAMES[key]} {_MODE_NAMES[mode]}")
+    
+    # Create estimated audio features
+    return {
+        'tempo': tempo,
+        'energy': energy,
+        'valence': valence,
+        'danceability': danceability,
+        'key': key,
+        'mode': mode,
+        'acousticness': 0.3,
+        'instrumentalness': 0.1,
+        'liveness': 0.2,
+        'speechiness': 0.1,
+        'loudness': -8.0,
+        'time_signature': 4
+    }
+
+
+def _head(items: List, limit: int) -> List:
+    """First `limit` items, copying only when the list is actually longer."""
+    return items[:limit] if len(items) > limit else items
+
+
+class SpotifyClient:
+    """
+    Comprehensive Spotify API client for extracting detailed musical characteristics
+    """
+    
+    key_mapping = _KEY_NAMES
+    mode_mapping = _MODE_NAMES
     
     def __init__(self):
         """Initialize Spotify client with credentials"""
         self.client_id = os.getenv('SPOTIFY_CLIENT_ID')
         self.client_secret = os.getenv('SPOTIFY_CLIENT_SECRET')
+        self.cache = SpotifyCache()
+        self._prefetch_executor = None
+        self._prefetch_generation = 0
         
         if not self.client_id or not self.client_secret:
+            # Reported once here; the public methods only log at debug level when disabled
             logger.warning("Spotify credentials not found. Spotify features will be disabled.")
             self.sp = None
             return
@@ -37,7 +640,14 @@ class SpotifyClient:
                 client_id=self.client_id,
                 client_secret=self.client_secret
             )
-            self.sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
+            # 429s are left to RateLimitedSpotify so Retry-After drives the backoff
+            spotify_class = ORJSONSpotify if orjson is not None else spotipy.Spotify
+            self.sp = RateLimitedSpotify(spotify_class(
+                client_credentials_manager=client_credentials_manager,
+                status_forcelist=(500, 502, 503, 504)
+            ))
+            if SPOTIFY_PREFETCH_RELATED > 0:
+                self._prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='spotify-prefetch')
             logger.info("Spotify client initialized successfully")
             
         except Exception as e:
@@ -55,9 +665,15 @@ class SpotifyClient:
         Returns:
             List of track information dictionaries
         """
-        if not self.sp:
-            logger.warning("Spotify client not available")
+        if self.sp is None:
+            logger.debug("Spotify client not available")
             return []
+        
+        cache_key = f"search:{limit}:{query.lower().strip()}"
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Found {len(cached)} cached tracks for query: {query}")
+            return cached
             
         try:
             results = self.sp.search(q=query, type='track', limit=limit)
@@ -78,6 +694,8 @@ class SpotifyClient:
                 tracks.append(track_info)
                 
             logger.info(f"Found {len(tracks)} tracks for query: {query}")
+            if tracks:
+                self.cache.set(cache_key, tracks)
             return tracks
             
         except Exception as e:
@@ -94,39 +712,149 @@ class SpotifyClient:
         Returns:
             Dictionary with comprehensive track data
         """
-        if not self.sp:
-            logger.warning("Spotify client not available")
+        if self.sp is None:
+            logger.debug("Spotify client not available")
             return None
-            
+        
+        # A new lookup supersedes any related-artist prefetch still in progress
+        self._prefetch_generation += 1
+        track_data = self.get_tracks_by_ids([track_id])[0]
+        
+        if track_data is not None and self._prefetch_executor is not None:
+            artist_ids = track_data['track_info'].get('artist_ids')
+            if artist_ids:
+                self._prefetch_executor.submit(self._prefetch_related, artist_ids[0], self._prefetch_generation)
+        return track_data
+    
+    def _prefetch_related(self, artist_id: str, generation: int) -> None:
+        """
+        Warm the track cache with the top track of each related artist
+        
+        Runs on the prefetch thread and gives up as soon as a newer lookup
+        has started, so it never competes with the request the user is waiting on.
+        """
         try:
-            # Get basic track info
-            track = self.sp.track(track_id)
+            if generation != self._prefetch_generation:
+                return
+            related = self.sp.artist_related_artists(artist_id)['artists'][:SPOTIFY_PREFETCH_RELATED]
             
-            # Initialize with defaults in case of permission issues
-            audio_features = None
-            audio_analysis = None
+            track_ids = []
+            for artist in related:
+                if generation != self._prefetch_generation:
+                    return
+                top_tracks = self.sp.artist_top_tracks(artist['id'])['tracks']
+                if top_tracks:
+                    track_ids.append(top_tracks[0]['id'])
             
-            # Try to get audio features, but don't fail if we can't access them
-            try:
-                audio_features = self.sp.audio_features([track_id])[0]
-            except Exception as e:
-                logger.warning(f"Cannot access audio features (permission issue): {str(e)}")
-                # Create fake audio features with estimated values
-                audio_features = self._create_estimated_audio_features(track)
-            
-            # Try to get audio analysis, but don't fail if we can't access it
-            try:
-                audio_analysis = self.sp.audio_analysis(track_id)
-            except Exception as e:
-                logger.warning(f"Cannot access audio analysis (permission issue): {str(e)}")
-                # Create fake audio analysis with estimated values
-                audio_analysis = self._create_estimated_audio_analysis(track)
+            if track_ids and generation == self._prefetch_generation:
+                self.get_tracks_by_ids(track_ids)
+                logger.info(f"Prefetched {len(track_ids)} tracks by artists related to {artist_id}")
+        except Exception as e:
+            logger.warning(f"Error prefetching related artists: {str(e)}")
+    
+    def get_tracks_by_ids(self, track_ids: List[str]) -> List[Optional[Dict]]:
+        """
+        Get comprehensive track data for several Spotify track IDs at once
+        
+        Track info and audio features are fetched through Spotify's multi-ID
+        endpoints (50 and 100 IDs per request), audio analysis per track, with
+        all requests overlapped.
+        
+        Args:
+            track_ids: Spotify track IDs
             
-            return self._compile_comprehensive_data(track, audio_features, audio_analysis)
+        Returns:
+            Comprehensive track data in the same order as track_ids (None where
+            the track could not be fetched)
+        """
+        if self.sp is None:
+            logger.debug("Spotify client not available")
+            return [None] * len(track_ids)
+        
+        results = {}
+        missing = []
+        for track_id in track_ids:
+            if track_id in results:
+                continue
+            cached = self.cache.get(f"track:{track_id}")
+            results[track_id] = cached
+            if cached is None:
+                missing.append(track_id)
+        
+        if missing:
+            with ThreadPoolExecutor(max_workers=SPOTIFY_MAX_CONCURRENCY) as executor:
+                tracks_futures = [
+                    executor.submit(self.sp.tracks, missing[i:i + SPOTIFY_TRACKS_BATCH_SIZE])
+                    for i in range(0, len(missing), SPOTIFY_TRACKS_BATCH_SIZE)
+                ]
+                features_futures = [
+                    executor.submit(self.audio_features_bulk, missing[i:i + SPOTIFY_AUDIO_FEATURES_BATCH_SIZE])
+                    for i in range(0, len(missing), SPOTIFY_AUDIO_FEATURES_BATCH_SIZE)
+                ]
+                analysis_futures = [executor.submit(self.sp.audio_analysis, track_id) for track_id in missing]
+                
+                # Get basic track info
+                tracks = []
+                for i, future in enumerate(tracks_futures):
+                    chunk_size = len(missing[i * SPOTIFY_TRACKS_BATCH_SIZE:(i + 1) * SPOTIFY_TRACKS_BATCH_SIZE])
+                    try:
+                        tracks.extend(future.result()['tracks'])
+                    except Exception as e:
+                        logger.error(f"Error getting tracks by ID: {str(e)}")
+                        tracks.extend([None] * chunk_size)
+                
+                # Audio features may be unavailable (permission issues); estimate those later
+                features = []
+                for i, future in enumerate(features_futures):
+                    chunk_size = len(missing[i * SPOTIFY_AUDIO_FEATURES_BATCH_SIZE:(i + 1) * SPOTIFY_AUDIO_FEATURES_BATCH_SIZE])
+                    try:
+                        features.extend(future.result())
+                    except Exception as e:
+                        logger.warning(f"Cannot access audio features (permission issue): {str(e)}")
+                        features.extend([_FEATURES_UNAVAILABLE] * chunk_size)
+                
+                for track_id, track, audio_features, analysis_future in zip(missing, tracks, features, analysis_futures):
+                    if not track:
+                        logger.error(f"Error getting track by ID {track_id}: track not found")
+                        continue
+                    
+                    try:
+                        if audio_features is _FEATURES_UNAVAILABLE:
+                            # Create fake audio features with estimated values
+                            audio_features = self._create_estimated_audio_features(track)
+                        
+                        # Try to get audio analysis, but don't fail if we can't access it
+                        try:
+                            audio_analysis = analysis_future.result()
+                        except Exception as e:
+                            logger.warning(f"Cannot access audio analysis (permission issue): {str(e)}")
+                            # Create fake audio analysis with estimated values
+                            audio_analysis = self._create_estimated_audio_analysis(track)
+                        
+                        comprehensive_data = self._compile_comprehensive_data(track, audio_features, audio_analysis)
+                    except Exception as e:
+                        logger.error(f"Error getting track by ID {track_id}: {str(e)}")
+                        continue
+                    
+                    self.cache.set(f"track:{track_id}", comprehensive_data)
+                    results[track_id] = comprehensive_data
+        
+        return [results[track_id] for track_id in track_ids]
+    
+    def audio_features_bulk(self, track_ids: List[str]) -> List[Optional[Dict]]:
+        """
+        Get audio features for any number of tracks, 100 IDs per request
+        
+        Args:
+            track_ids: Spotify track IDs
             
-        except Exception as e:
-            logger.error(f"Error getting track by ID {track_id}: {str(e)}")
-            return None
+        Returns:
+            Audio features in the same order as track_ids (None for unknown tracks)
+        """
+        features = []
+        for i in range(0, len(track_ids), SPOTIFY_AUDIO_FEATURES_BATCH_SIZE):
+            features.extend(self.sp.audio_features(track_ids[i:i + SPOTIFY_AUDIO_FEATURES_BATCH_SIZE]))
+        return features
     
     def get_comprehensive_track_data(self, search_query: str) -> Optional[Dict]:
         """
@@ -138,8 +866,8 @@ class SpotifyClient:
         Returns:
             Dictionary with comprehensive track data for the best match
         """
-        if not self.sp:
-            logger.warning("Spotify client not available")
+        if self.sp is None:
+            logger.debug("Spotify client not available")
             return None
             
         try:
@@ -157,6 +885,38 @@ class SpotifyClient:
             logger.error(f"Error getting comprehensive track data: {str(e)}")
             return None
     
+    def get_many_comprehensive_track_data(self, search_queries: List[str]) -> List[Optional[Dict]]:
+        """
+        Get comprehensive track data for several search queries at once
+        
+        Searches run concurrently (bounded by SPOTIFY_MAX_CONCURRENCY and the
+        rate limiter), then all matches are resolved in one get_tracks_by_ids call.
+        
+        Args:
+            search_queries: Search queries, e.g. several reference songs
+            
+        Returns:
+            Comprehensive track data for each query's best match, in order
+            (None where nothing was found)
+        """
+        if self.sp is None:
+            logger.debug("Spotify client not available")
+            return [None] * len(search_queries)
+        
+        workers = max(1, min(SPOTIFY_MAX_CONCURRENCY, len(search_queries)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            search_results = list(executor.map(lambda query: self.search_tracks(query, limit=1), search_queries))
+        
+        track_ids = []
+        for search_query, results in zip(search_queries, search_results):
+            if results:
+                track_ids.append(results[0]['id'])
+            else:
+                logger.warning(f"No tracks found for query: {search_query}")
+        
+        tracks = iter(self.get_tracks_by_ids(track_ids))
+        return [next(tracks) if results else None for results in search_results]
+    
     def get_comprehensive_track_data_by_id(self, track_id: str) -> Optional[Dict]:
         """Get detailed analysis for a specific track ID"""
         return self.get_track_by_id(track_id)
@@ -172,85 +932,15 @@ class SpotifyClient:
         Returns:
             Estimated audio features dictionary
         """
-        import hashlib
-        import random
-        
         # Get track info
         name = track.get('name', '').lower().strip()
         popularity = track.get('popularity', 50)
         artists = track.get('artists', [])
         artist_name = artists[0].get('name', '').lower().strip() if artists else ''
         
-        # Check our known songs database first
-        estimated = self._check_known_songs_database(name, artist_name)
-        if estimated:
-            logger.info(f"Using known song data for {name} by {artist_name}")
-            return estimated
-        
-        # Create deterministic randomization based on song/artist combination
-        seed_string = f"{name}_{artist_name}"
-        seed_hash = int(hashlib.md5(seed_string.encode()).hexdigest()[:8], 16)
-        random.seed(seed_hash)
-        
-        # Generate more varied base values using the seeded random
-        energy = 0.3 + (random.random() * 0.6)  # Range: 0.3 to 0.9
-        valence = 0.2 + (random.random() * 0.7)  # Range: 0.2 to 0.9
-        danceability = 0.2 + (random.random() * 0.7)  # Range: 0.2 to 0.9
-        tempo = 80 + (random.random() * 80)  # Range: 80 to 160 BPM
-        key = random.randint(0, 11)  # Random key
-        mode = random.choice([0, 1])  # Random mode
-        
-        # Analyze artist genre patterns
-        artist_adjustments = self._get_artist_genre_adjustments(artist_name)
-        tempo += artist_adjustments.get('tempo_offset', 0)
-        energy += artist_adjustments.get('energy_offset', 0)
-        key = artist_adjustments.get('preferred_key', key)
-        mode = artist_adjustments.get('preferred_mode', mode)
-        
-        # Apply more sophisticated analysis based on song characteristics
-        valence, danceability, energy, tempo, key, mode = self._analyze_song_characteristics(
-            name, artist_name, valence, danceability, energy, tempo, key, mode, random
-        )
-        
-        # Adjust based on popularity (more popular songs tend to be more danceable)
-        if popularity > 70:
-            danceability += 0.1
-            energy += 0.05
-        elif popularity < 30:
-            danceability -= 0.1
-            energy -= 0.05
-        
-        # Generate more varied keys based on track characteristics
-        if 'be' in name or 'me' in name:
-            key = 7  # G major/minor is common for emotional songs
-        elif 'you' in name or 'love' in name:
-            key = 2  # D major is common for love songs
-        elif 'night' in name or 'dark' in name:
-            key = 10  # Bb is common for darker songs
-        
-        # Clamp values
-        energy = max(0.1, min(0.9, energy))
-        valence = max(0.1, min(0.9, valence))
-        danceability = max(0.1, min(0.9, danceability))
-        tempo = max(70, min(180, int(tempo)))
-        
-        logger.info(f"Estimated features for {name} by {artist_name}: {tempo} BPM, {self.key_mapping[key]} {self.mode_mapping[mode]}")
-        
-        # Create estimated audio features
-        return {
-            'tempo': tempo,
-            'energy': energy,
-            'valence': valence,
-            'danceability': danceability,
-            'key': key,
-            'mode': mode,
-            'acousticness': 0.3,
-            'instrumentalness': 0.1,
-            'liveness': 0.2,
-            'speechiness': 0.1,
-            'loudness': -8.0,
-            'time_signature': 4
-        }
+        # Popularity only matters above 70 or below 30, so three tiers give the same results
+        popularity_tier = 1 if popularity > 70 else -1 if popularity < 30 else 0
+        return dict(_estimated_features(name, artist_name, popularity_tier))
     
     def _create_estimated_audio_analysis(self, track: Dict) -> Dict:
         """
@@ -268,9 +958,8 @@ class SpotifyClient:
         
         # Estimate 4 sections of equal length
         section_duration = duration_sec / 4
-        sections = []
-        for i in range(4):
-            section = {
+        sections = [
+            {
                 'start': i * section_duration,
                 'duration': section_duration,
                 'confidence': 0.7,
@@ -284,31 +973,23 @@ class SpotifyClient:
                 'time_signature': 4,
                 'time_signature_confidence': 0.7
             }
-            sections.append(section)
+            for i in range(4)
+        ]
         
         # Estimate beats (around 120 BPM)
         beats_per_sec = 120 / 60
         total_beats = int(duration_sec * beats_per_sec)
-        beats = []
-        for i in range(min(100, total_beats)):  # Limit to 100 beats
-            beat_time = i / beats_per_sec
-            beat = {
-                'start': beat_time,
-                'duration': 0.5,
-                'confidence': 0.8
-            }
-            beats.append(beat)
+        beats = [
+            {'start': i / beats_per_sec, 'duration': 0.5, 'confidence': 0.8}
+            for i in range(min(100, total_beats))  # Limit to 100 beats
+        ]
         
         # Estimate bars (4 beats per bar)
-        bars = []
-        for i in range(min(25, total_beats // 4)):  # Limit to 25 bars
-            bar_time = i * 4 / beats_per_sec
-            bar = {
-                'start': bar_time,
-                'duration': 4 / beats_per_sec,
-                'confidence': 0.8
-            }
-            bars.append(bar)
+        bar_duration = 4 / beats_per_sec
+        bars = [
+            {'start': i * 4 / beats_per_sec, 'duration': bar_duration, 'confidence': 0.8}
+            for i in range(min(25, total_beats // 4))  # Limit to 25 bars
+        ]
         
         # Return estimated analysis
         return {
@@ -348,6 +1029,7 @@ class SpotifyClient:
                 'id': track['id'],
                 'name': track['name'],
                 'artists': [artist['name'] for artist in track['artists']],
+                'artist_ids': [artist['id'] for artist in track['artists']],
                 'album': track['album']['name'],
                 'duration_ms': track['duration_ms'],
                 'popularity': track['popularity'],
@@ -362,9 +1044,9 @@ class SpotifyClient:
                 'harmonic_content': harmonic_info,
                 'raw_analysis': {
                     'sections': audio_analysis.get('sections', []),
-                    'bars': audio_analysis.get('bars', [])[:16],  # First 16 bars
-                    'beats': audio_analysis.get('beats', [])[:64],  # First 64 beats
-                    'tatums': audio_analysis.get('tatums', [])[:32]  # First 32 tatums
+                    'bars': _head(audio_analysis.get('bars', []), 16),  # First 16 bars
+                    'beats': _head(audio_analysis.get('beats', []), 64),  # First 64 beats
+                    'tatums': _head(audio_analysis.get('tatums', []), 32)  # First 32 tatums
                 }
             },
             'musical_insights': self._generate_musical_insights(enhanced_features, structure_info)
@@ -390,11 +1072,12 @@ class SpotifyClient:
         # Add human-readable key and mode
         key_num = audio_features.get('key', 0)
         mode_num = audio_features.get('mode', 1)
+        names = self._key_signature_names(key_num, mode_num)
         
         enhanced.update({
-            'key_name': self.key_mapping.get(key_num, 'C'),
-            'mode_name': self.mode_mapping.get(mode_num, 'major'),
-            'key_signature': f"{self.key_mapping.get(key_num, 'C')} {self.mode_mapping.get(mode_num, 'major')}",
+            'key_name': names[0],
+            'mode_name': names[1],
+            'key_signature': names[2],
             
             # Computed characteristics
             'energy_level': self._classify_energy(audio_features.get('energy', 0.5)),
@@ -415,265 +1098,29 @@ class SpotifyClient:
         """
         Check database of known songs for accurate BPM/key data
         """
-        # Database of well-known songs with accurate data
-        known_songs = {
-            ('rather be', 'clean bandit'): {
-                'tempo': 121, 'key': 7, 'mode': 1,  # G major
-                'energy': 0.8, 'valence': 0.9, 'danceability': 0.85
-            },
-            ('billie jean', 'michael jackson'): {
-                'tempo': 117, 'key': 6, 'mode': 0,  # F# minor
-                'energy': 0.75, 'valence': 0.4, 'danceability': 0.75
-            },
-            ('sweet child o mine', 'guns n roses'): {
-                'tempo': 125, 'key': 2, 'mode': 1,  # D major
-                'energy': 0.95, 'valence': 0.6, 'danceability': 0.5
-            },
-            ('bohemian rhapsody', 'queen'): {
-                'tempo': 72, 'key': 10, 'mode': 1,  # Bb major
-                'energy': 0.6, 'valence': 0.5, 'danceability': 0.3
-            },
-            ('stayin alive', 'bee gees'): {
-                'tempo': 104, 'key': 10, 'mode': 0,  # Bb minor
-                'energy': 0.8, 'valence': 0.7, 'danceability': 0.9
-            },
-            ('imagine', 'john lennon'): {
-                'tempo': 76, 'key': 0, 'mode': 1,  # C major
-                'energy': 0.3, 'valence': 0.7, 'danceability': 0.2
-            },
-            ('hotel california', 'eagles'): {
-                'tempo': 75, 'key': 11, 'mode': 0,  # B minor
-                'energy': 0.6, 'valence': 0.4, 'danceability': 0.4
-            },
-            ('let it be', 'the beatles'): {
-                'tempo': 73, 'key': 0, 'mode': 1,  # C major
-                'energy': 0.4, 'valence': 0.8, 'danceability': 0.3
-            },
-            ('yesterday', 'the beatles'): {
-                'tempo': 98, 'key': 5, 'mode': 1,  # F major
-                'energy': 0.2, 'valence': 0.3, 'danceability': 0.2
-            },
-            ('dont stop believin', 'journey'): {
-                'tempo': 119, 'key': 4, 'mode': 1,  # E major
-                'energy': 0.8, 'valence': 0.9, 'danceability': 0.6
-            },
-            ('shape of you', 'ed sheeran'): {
-                'tempo': 96, 'key': 1, 'mode': 0,  # C# minor
-                'energy': 0.65, 'valence': 0.9, 'danceability': 0.83
-            },
-            ('someone like you', 'adele'): {
-                'tempo': 67, 'key': 9, 'mode': 1,  # A major
-                'energy': 0.3, 'valence': 0.2, 'danceability': 0.5
-            },
-            ('rolling in the deep', 'adele'): {
-                'tempo': 105, 'key': 1, 'mode': 0,  # C# minor
-                'energy': 0.8, 'valence': 0.2, 'danceability': 0.7
-            },
-            ('uptown funk', 'mark ronson'): {
-                'tempo': 115, 'key': 2, 'mode': 0,  # D minor
-                'energy': 0.8, 'valence': 0.95, 'danceability': 0.9
-            },
-            ('thinking out loud', 'ed sheeran'): {
-                'tempo': 79, 'key': 2, 'mode': 1,  # D major
-                'energy': 0.4, 'valence': 0.9, 'danceability': 0.8
-            }
-        }
-        
-        # Try exact match first
-        key = (song_name, artist_name)
-        if key in known_songs:
-            data = known_songs[key].copy()
-            # Add standard fields
-            data.update({
-                'acousticness': 0.3, 'instrumentalness': 0.1, 'liveness': 0.2,
-                'speechiness': 0.1, 'loudness': -8.0, 'time_signature': 4
-            })
-            return data
-        
-        # Try partial matches (song name contains key words)
-        for (known_song, known_artist), features in known_songs.items():
-            if known_song in song_name or song_name in known_song:
-                if known_artist in artist_name or artist_name in known_artist:
-                    data = features.copy()
-                    data.update({
-                        'acousticness': 0.3, 'instrumentalness': 0.1, 'liveness': 0.2,
-                        'speechiness': 0.1, 'loudness': -8.0, 'time_signature': 4
-                    })
-                    return data
-        
-        return None
+        return _known_song_features(song_name, artist_name)
     
     def _get_artist_genre_adjustments(self, artist_name: str) -> Dict:
         """
         Get genre-based adjustments for different artists
         """
-        artist_patterns = {
-            'clean bandit': {'tempo_offset': 1, 'energy_offset': 0.15, 'preferred_key': 7, 'preferred_mode': 1},
-            'michael jackson': {'tempo_offset': -3, 'energy_offset': 0.1, 'preferred_key': 6, 'preferred_mode': 0},
-            'queen': {'tempo_offset': -48, 'energy_offset': -0.05, 'preferred_key': 10, 'preferred_mode': 1},
-            'beatles': {'tempo_offset': -27, 'energy_offset': -0.25, 'preferred_key': 0, 'preferred_mode': 1},
-            'adele': {'tempo_offset': -15, 'energy_offset': -0.35, 'preferred_key': 9, 'preferred_mode': 1},
-            'ed sheeran': {'tempo_offset': -24, 'energy_offset': -0.25, 'preferred_key': 2, 'preferred_mode': 1},
-            'eagles': {'tempo_offset': -45, 'energy_offset': -0.05, 'preferred_key': 11, 'preferred_mode': 0}
-        }
-        
-        for artist_pattern, adjustments in artist_patterns.items():
-            if artist_pattern in artist_name:
-                return adjustments
-        
-        return {}
+        return _artist_genre_adjustments(artist_name)
     
     def _analyze_song_characteristics(self, name: str, artist_name: str, valence: float, 
                                      danceability: float, energy: float, tempo: float, 
                                      key: int, mode: int, random) -> tuple:
         """
         Advanced analysis of song characteristics to generate unique audio features
-        
-        Args:
-            name: Song name
-            artist_name: Artist name
-            valence, danceability, energy, tempo, key, mode: Current values
-            random: Seeded random object for consistency
-            
-        Returns:
-            Tuple of updated (valence, danceability, energy, tempo, key, mode)
-        """
-        
-        # Advanced keyword analysis with weighted scoring
-        emotion_keywords = {
-            # High valence (happy/positive)
-            'happy': {'valence': 0.25, 'danceability': 0.15, 'energy': 0.1},
-            'joy': {'valence': 0.3, 'danceability': 0.2, 'energy': 0.15},
-            'fun': {'valence': 0.2, 'danceability': 0.25, 'energy': 0.15},
-            'party': {'valence': 0.2, 'danceability': 0.3, 'energy': 0.25, 'tempo_add': 15},
-            'dance': {'valence': 0.1, 'danceability': 0.35, 'energy': 0.2, 'tempo_add': 20},
-            'celebrate': {'valence': 0.25, 'danceability': 0.2, 'energy': 0.15},
-            'love': {'valence': 0.3, 'danceability': 0.1, 'key_preference': 2},  # D major
-            'good': {'valence': 0.15, 'energy': 0.05},
-            'up': {'valence': 0.2, 'energy': 0.15, 'tempo_add': 10},
-            'high': {'valence': 0.15, 'energy': 0.2, 'tempo_add': 5},
-            'amazing': {'valence': 0.25, 'energy': 0.15},
-            'wonderful': {'valence': 0.3, 'energy': 0.1},
-            'beautiful': {'valence': 0.2, 'energy': 0.05, 'key_preference': 7},  # G major
-            'sunshine': {'valence': 0.35, 'energy': 0.2, 'key_preference': 2},
-            'bright': {'valence': 0.25, 'energy': 0.15},
-            
-            # Low valence (sad/negative)
-            'sad': {'valence': -0.3, 'energy': -0.15, 'mode_preference': 0},
-            'blue': {'valence': -0.25, 'energy': -0.1, 'mode_preference': 0},
-            'cry': {'valence': -0.35, 'energy': -0.2, 'danceability': -0.15, 'mode_preference': 0},
-            'tear': {'valence': -0.3, 'energy': -0.15, 'danceability': -0.1, 'mode_preference': 0},
-            'alone': {'valence': -0.25, 'energy': -0.2, 'danceability': -0.15, 'mode_preference': 0},
-            'lost': {'valence': -0.2, 'energy': -0.15, 'mode_preference': 0},
-            'hurt': {'valence': -0.25, 'energy': -0.1, 'mode_preference': 0},
-            'pain': {'valence': -0.3, 'energy': -0.15, 'mode_preference': 0},
-            'sorry': {'valence': -0.2, 'energy': -0.1, 'danceability': -0.1, 'mode_preference': 0},
-            'goodbye': {'valence': -0.25, 'energy': -0.15, 'danceability': -0.15, 'mode_preference': 0},
-            'break': {'valence': -0.2, 'energy': -0.1, 'mode_preference': 0},
-            'broken': {'valence': -0.3, 'energy': -0.2, 'mode_preference': 0},
-            'empty': {'valence': -0.25, 'energy': -0.25, 'danceability': -0.2, 'mode_preference': 0},
-            'dark': {'valence': -0.2, 'energy': -0.1, 'mode_preference': 0, 'key_preference': 10},
-            'cold': {'valence': -0.15, 'energy': -0.15, 'mode_preference': 0},
-            
-            # High energy
-            'rock': {'energy': 0.25, 'danceability': 0.1, 'tempo_add': 20},
-            'fast': {'energy': 0.2, 'tempo_add': 25},
-            'beat': {'energy': 0.15, 'danceability': 0.2},
-            'jump': {'energy': 0.3, 'danceability': 0.25, 'valence': 0.15, 'tempo_add': 15},
-            'pump': {'energy': 0.25, 'danceability': 0.2, 'tempo_add': 10},
-            'fire': {'energy': 0.35, 'danceability': 0.15, 'valence': 0.1, 'tempo_add': 20},
-            'crazy': {'energy': 0.3, 'danceability': 0.2, 'tempo_add': 15},
-            'wild': {'energy': 0.25, 'danceability': 0.15, 'tempo_add': 10},
-            'electric': {'energy': 0.3, 'danceability': 0.25, 'tempo_add': 15},
-            'power': {'energy': 0.2, 'valence': 0.1, 'tempo_add': 10},
-            
-            # Low energy/slow
-            'slow': {'energy': -0.25, 'tempo_add': -30, 'danceability': -0.15},
-            'ballad': {'energy': -0.2, 'tempo_add': -25, 'danceability': -0.2, 'valence': 0.1},
-            'soft': {'energy': -0.15, 'tempo_add': -15, 'danceability': -0.1},
-            'quiet': {'energy': -0.2, 'tempo_add': -20, 'danceability': -0.15},
-            'gentle': {'energy': -0.15, 'valence': 0.1, 'tempo_add': -15},
-            'calm': {'energy': -0.2, 'valence': 0.05, 'tempo_add': -20},
-            'peace': {'energy': -0.15, 'valence': 0.15, 'tempo_add': -15},
-            'still': {'energy': -0.25, 'tempo_add': -25, 'danceability': -0.2},
-            'whisper': {'energy': -0.2, 'tempo_add': -20, 'danceability': -0.15},
-            'dream': {'energy': -0.1, 'valence': 0.1, 'tempo_add': -10},
-        }
-        
-        # Apply keyword-based modifications
-        words = name.lower().split()
-        for word in words:
-            if word in emotion_keywords:
-                adjustments = emotion_keywords[word]
-                valence += adjustments.get('valence', 0)
-                danceability += adjustments.get('danceability', 0)
-                energy += adjustments.get('energy', 0)
-                tempo += adjustments.get('tempo_add', 0)
-                
-                # Set preferred key or mode if specified
-                if 'key_preference' in adjustments:
-                    key = adjustments['key_preference']
-                if 'mode_preference' in adjustments:
-                    mode = adjustments['mode_preference']
-        
-        # Artist-specific character analysis
-        artist_characteristics = self._get_artist_characteristics(artist_name, random)
-        valence += artist_characteristics.get('valence_tendency', 0)
-        danceability += artist_characteristics.get('danceability_tendency', 0)
-        energy += artist_characteristics.get('energy_tendency', 0)
-        
-        # Add variation based on song length (from name complexity)
-        name_complexity = len(name) + len(name.split())
-        if name_complexity > 15:  # Longer/complex names
-            valence += random.uniform(-0.1, 0.1)
-            energy += random.uniform(-0.05, 0.1)
-            danceability += random.uniform(-0.05, 0.05)
-        
-        # Add small random variation to ensure uniqueness, with more variation for danceability
-        danceability += random.uniform(-0.08, 0.08)  # Increased range for better variety
-        
-        # Add artist-name-based variation to danceability
-        name_hash = hash(name + artist_name) % 100
-        danceability += (name_hash - 50) / 1000  # -0.05 to 0.05 variation
-        
-        # Musical key relationships for emotional coherence
-        if mode == 0:  # Minor mode gets different key preferences
-            minor_keys = [2, 6, 9, 1, 4]  # Emotionally resonant minor keys
-            key = random.choice(minor_keys)
-        else:  # Major mode
-            major_keys = [0, 2, 4, 7, 9]  # Common major keys
-            key = random.choice(major_keys)
-        
-        # Fine-tune based on overall song character
-        if valence > 0.7:  # Very happy songs
-            danceability = max(danceability, 0.6)  # Ensure some danceability
-            tempo = max(tempo, 100)  # Not too slow
-        elif valence < 0.3:  # Sad songs
-            danceability = min(danceability, 0.5)  # Limit danceability
-            mode = 0  # Prefer minor
-        
-        return valence, danceability, energy, tempo, key, mode
+        """
+        return _analyze_song_characteristics(
+            name, artist_name, valence, danceability, energy, tempo, key, mode, random
+        )
     
     def _get_artist_characteristics(self, artist_name: str, random) -> Dict:
         """
         Get characteristics tendencies for different types of artists
         """
-        # Generate artist "DNA" based on name
-        artist_hash = hash(artist_name) % 1000
-        
-        # Create subtle tendencies based on artist name characteristics
-        characteristics = {
-            'valence_tendency': (artist_hash % 20 - 10) / 100,  # -0.1 to 0.1
-            'danceability_tendency': ((artist_hash * 7) % 20 - 10) / 100,
-            'energy_tendency': ((artist_hash * 13) % 20 - 10) / 100,
-        }
-        
-        # Add some additional randomness while keeping it consistent
-        characteristics['valence_tendency'] += random.uniform(-0.05, 0.05)
-        characteristics['danceability_tendency'] += random.uniform(-0.05, 0.05)
-        characteristics['energy_tendency'] += random.uniform(-0.05, 0.05)
-        
-        return characteristics
+        return _artist_characteristics(artist_name, random)
     
     def _extract_musical_structure(self, audio_analysis: Dict) -> Dict:
         """
@@ -700,29 +1147,28 @@ class SpotifyClient:
         
         if sections:
             # Analyze each section
+            section_analysis = structure['section_analysis']
             time_signatures = {}
             
-            for i, section in enumerate(sections):
-                section_info = {
-                    'section_number': i + 1,
+            for i, section in enumerate(sections, 1):
+                ts = section.get('time_signature', 4)
+                section_analysis.append({
+                    'section_number': i,
                     'start_time': section.get('start', 0),
                     'duration': section.get('duration', 0),
                     'confidence': section.get('confidence', 0),
                     'key': self.key_mapping.get(section.get('key', 0), 'C'),
                     'mode': self.mode_mapping.get(section.get('mode', 1), 'major'),
                     'tempo': section.get('tempo', 120),
-                    'time_signature': section.get('time_signature', 4),
+                    'time_signature': ts,
                     'loudness': section.get('loudness', -10)
-                }
-                structure['section_analysis'].append(section_info)
+                })
                 
                 # Track time signatures
-                ts = section.get('time_signature', 4)
                 time_signatures[ts] = time_signatures.get(ts, 0) + 1
             
             # Find most common time signature
-            if time_signatures:
-                structure['common_time_signature'] = max(time_signatures, key=time_signatures.get)
+            structure['common_time_signature'] = max(time_signatures, key=time_signatures.get)
             
             # Detect tempo and key changes
             structure['tempo_changes'] = self._detect_tempo_changes(sections)
@@ -756,22 +1202,23 @@ class SpotifyClient:
         
         if bars:
             # Analyze first 8 bars for patterns
-            for i, bar in enumerate(bars[:8]):
-                bar_info = {
-                    'bar_number': i + 1,
+            rhythmic_patterns['bar_analysis'] = [
+                {
+                    'bar_number': i,
                     'start_time': bar.get('start', 0),
                     'duration': bar.get('duration', 0),
                     'confidence': bar.get('confidence', 0)
                 }
-                rhythmic_patterns['bar_analysis'].append(bar_info)
+                for i, bar in enumerate(islice(bars, 8), 1)
+            ]
         
         if beats:
             # Analyze beat strengths for first 32 beats
             beat_confidences = [beat.get('confidence', 0) for beat in beats[:32]]
             rhythmic_patterns['beat_strength_pattern'] = beat_confidences
             
-            # Determine rhythmic complexity
-            avg_confidence = sum(beat_confidences) / len(beat_confidences) if beat_confidences else 0
+            # Determine rhythmic complexity (steadier beats read as simpler rhythms)
+            avg_confidence = sum(beat_confidences) / len(beat_confidences)
             if avg_confidence > 0.8:
                 rhythmic_patterns['rhythmic_complexity'] = 'simple'
             elif avg_confidence > 0.6:
@@ -805,9 +1252,10 @@ class SpotifyClient:
             modes = [section.get('mode', 1) for section in sections]
             
             # Analyze key stability
-            if len(set(keys)) > len(keys) * 0.5:
+            distinct_keys = len(set(keys))
+            if distinct_keys > len(keys) * 0.5:
                 harmonic_info['key_stability'] = 'unstable'
-            elif len(set(keys)) <= 2:
+            elif distinct_keys <= 2:
                 harmonic_info['key_stability'] = 'very_stable'
             
             # Analyze modal characteristics
@@ -823,6 +1271,15 @@ class SpotifyClient:
         
         return harmonic_info
     
+    def _key_signature_names(self, key_num: int, mode_num: int) -> tuple:
+        """(key name, mode name, "key mode") for a Spotify key/mode pair, defaulting to C major"""
+        names = _KEY_SIGNATURES.get((key_num, mode_num))
+        if names is None:
+            key_name = self.key_mapping.get(key_num, 'C')
+            mode_name = self.mode_mapping.get(mode_num, 'major')
+            names = (key_name, mode_name, f"{key_name} {mode_name}")
+        return names
+    
     def _detect_tempo_changes(self, sections: List[Dict]) -> List[Dict]:
         """Detect tempo changes throughout the track"""
         tempo_changes = []
@@ -830,19 +1287,21 @@ class SpotifyClient:
         if len(sections) < 2:
             return tempo_changes
         
-        for i in range(1, len(sections)):
-            prev_tempo = sections[i-1].get('tempo', 120)
-            curr_tempo = sections[i].get('tempo', 120)
+        # Carry the previous section's tempo forward so each section is read once
+        prev_tempo = sections[0].get('tempo', 120)
+        for section_number, section in enumerate(sections[1:], 2):
+            curr_tempo = section.get('tempo', 120)
             
             # Significant tempo change (more than 5 BPM difference)
             if abs(curr_tempo - prev_tempo) > 5:
                 tempo_changes.append({
-                    'section': i + 1,
-                    'time': sections[i].get('start', 0),
+                    'section': section_number,
+                    'time': section.get('start', 0),
                     'from_tempo': prev_tempo,
                     'to_tempo': curr_tempo,
                     'change_amount': curr_tempo - prev_tempo
                 })
+            prev_tempo = curr_tempo
         
         return tempo_changes
     
@@ -853,20 +1312,21 @@ class SpotifyClient:
         if len(sections) < 2:
             return key_changes
         
-        for i in range(1, len(sections)):
-            prev_key = sections[i-1].get('key', 0)
-            curr_key = sections[i].get('key', 0)
-            prev_mode = sections[i-1].get('mode', 1)
-            curr_mode = sections[i].get('mode', 1)
+        prev_key = sections[0].get('key', 0)
+        prev_mode = sections[0].get('mode', 1)
+        for section_number, section in enumerate(sections[1:], 2):
+            curr_key = section.get('key', 0)
+            curr_mode = section.get('mode', 1)
             
             # Key or mode change
             if prev_key != curr_key or prev_mode != curr_mode:
                 key_changes.append({
-                    'section': i + 1,
-                    'time': sections[i].get('start', 0),
-                    'from_key': f"{self.key_mapping.get(prev_key, 'C')} {self.mode_mapping.get(prev_mode, 'major')}",
-                    'to_key': f"{self.key_mapping.get(curr_key, 'C')} {self.mode_mapping.get(curr_mode, 'major')}"
+                    'section': section_number,
+                    'time': section.get('start', 0),
+                    'from_key': self._key_signature_names(prev_key, prev_mode)[2],
+                    'to_key': self._key_signature_names(curr_key, curr_mode)[2]
                 })
+            prev_key, prev_mode = curr_key, curr_mode
         
         return key_changes
     
@@ -964,12 +1424,13 @@ class SpotifyClient:
     def _identify_genre_indicators(self, features: Dict) -> List[str]:
         """Identify potential genre indicators"""
         indicators = []
+        energy = features.get('energy', 0)
         
         if features.get('acousticness', 0) > 0.7:
             indicators.append('folk_acoustic')
-        if features.get('energy', 0) > 0.8 and features.get('danceability', 0) > 0.7:
+        if energy > 0.8 and features.get('danceability', 0) > 0.7:
             indicators.append('electronic_dance')
-        if features.get('energy', 0) > 0.7 and features.get('valence', 0) < 0.4:
+        if energy > 0.7 and features.get('valence', 0) < 0.4:
             indicators.append('rock_alternative')
         if features.get('speechiness', 0) > 0.66:
             indicators.append('rap_hip_hop')
@@ -978,8 +1439,9 @@ class SpotifyClient:
     
     def _analyze_production_style(self, features: Dict) -> Dict:
         """Analyze production style characteristics"""
+        loudness = features.get('loudness', -10)
         return {
-            'loudness_level': 'loud' if features.get('loudness', -10) > -6 else 'moderate',
-            'dynamic_processing': 'heavy' if features.get('loudness', -10) > -4 else 'light',
+            'loudness_level': 'loud' if loudness > -6 else 'moderate',
+            'dynamic_processing': 'heavy' if loudness > -4 else 'light',
             'spatial_characteristics': 'wide' if features.get('liveness', 0) > 0.6 else 'intimate'
         }
@@ -6,7 +6,7 @@ Test script to check Spotify audio features extraction and identify valence/danc
 import sys
 import os
 import logging
-from spotify_utils import SpotifyClient
+from spotify_utils import SpotifyClient, _KNOWN_SONGS
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -35,14 +35,14 @@ def test_spotify_features():
     print("🎵 Testing Spotify Audio Features Extraction")
     print("=" * 60)
     
-    for test_song in test_songs:
+    # Look all songs up at once: searches run concurrently, then one bulk track fetch
+    search_queries = [f"{test_song['song']} {test_song['artist']}" for test_song in test_songs]
+    all_spotify_data = spotify_client.get_many_comprehensive_track_data(search_queries)
+    
+    for test_song, spotify_data in zip(test_songs, all_spotify_data):
         print(f"\n🎵 Testing: {test_song['song']} by {test_song['artist']}")
         print(f"Expected: {test_song['expected']}")
         
-        # Get comprehensive track data
-        search_query = f"{test_song['song']} {test_song['artist']}"
-        spotify_data = spotify_client.get_comprehensive_track_data(search_query)
-        
         if spotify_data:
             audio_features = spotify_data.get('audio_features', {})
             
@@ -89,34 +89,10 @@ def test_estimated_features():
 def check_known_songs_database():
     """Check the known songs database for duplicate values"""
     
-    spotify_client = SpotifyClient()
-    
     print("\n🗂️  Checking Known Songs Database")
     print("=" * 60)
     
-    # Get the known_songs from the method (we need to access it indirectly)
-    known_songs = {
-        ('rather be', 'clean bandit'): {
-            'tempo': 121, 'key': 7, 'mode': 1,  # G major
-            'energy': 0.8, 'valence': 0.9, 'danceability': 0.85
-        },
-        ('billie jean', 'michael jackson'): {
-            'tempo': 117, 'key': 6, 'mode': 0,  # F# minor
-            'energy': 0.75, 'valence': 0.4, 'danceability': 0.75
-        },
-        ('sweet child o mine', 'guns n roses'): {
-            'tempo': 125, 'key': 2, 'mode': 1,  # D major
-            'energy': 0.95, 'valence': 0.6, 'danceability': 0.5
-        },
-        ('bohemian rhapsody', 'queen'): {
-            'tempo': 72, 'key': 10, 'mode': 1,  # Bb major
-            'energy': 0.6, 'valence': 0.5, 'danceability': 0.3
-        },
-        ('stayin alive', 'bee gees'): {
-            'tempo': 104, 'key': 10, 'mode': 0,  # Bb minor
-            'energy': 0.8, 'valence': 0.7, 'danceability': 0.9
-        },
-    }
+    known_songs = _KNOWN_SONGS
     
     print("Valence values in database:")
     for song, features in known_songs.items():
@@ -130,12 +106,15 @@ def check_known_songs_database():
     valence_values = [features['valence'] for features in known_songs.values()]
     danceability_values = [features['danceability'] for features in known_songs.values()]
     
-    print(f"\nUnique valence values: {len(set(valence_values))} out of {len(valence_values)}")
-    print(f"Unique danceability values: {len(set(danceability_values))} out of {len(danceability_values)}")
+    unique_valences = len(set(valence_values))
+    unique_danceabilities = len(set(danceability_values))
+    
+    print(f"\nUnique valence values: {unique_valences} out of {len(valence_values)}")
+    print(f"Unique danceability values: {unique_danceabilities} out of {len(danceability_values)}")
     
-    if len(set(valence_values)) < len(valence_values):
+    if unique_valences < len(valence_values):
         print("❌ Found duplicate valence values!")
-    if len(set(danceability_values)) < len(danceability_values):
+    if unique_danceabilities < len(danceability_values):
         print("❌ Found duplicate danceability values!")
 
 if __name__ == "__main__":
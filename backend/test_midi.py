@@ -46,14 +46,14 @@ def test_midi_creation():
         score.write('midi', fp=output_path)
         print(f"MIDI file created successfully: {output_path}")
         
-        # Check if file exists
-        if os.path.exists(output_path):
+        # Check if file exists (one stat call for both existence and size)
+        try:
             size = os.path.getsize(output_path)
-            print(f"File exists! Size: {size} bytes")
-            return True
-        else:
+        except OSError:
             print("File was not created!")
             return False
+        print(f"File exists! Size: {size} bytes")
+        return True
             
     except Exception as e:
         print(f"Error occurred: {str(e)}")
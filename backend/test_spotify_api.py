@@ -4,6 +4,7 @@ import os
 from dotenv import load_dotenv
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
+from spotify_utils import RateLimitedSpotify
 
 load_dotenv()
 client_id = os.getenv('SPOTIFY_CLIENT_ID')
@@ -13,7 +14,12 @@ client_credentials_manager = SpotifyClientCredentials(
     client_id=client_id,
     client_secret=client_secret
 )
-sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
+# Same pacing as the app (SPOTIFY_RATE_LIMIT), so repeated runs don't trip 429s;
+# 429s are left to RateLimitedSpotify so Retry-After drives the backoff
+sp = RateLimitedSpotify(spotipy.Spotify(
+    client_credentials_manager=client_credentials_manager,
+    status_forcelist=(500, 502, 503, 504)
+))
 
 # Test search (we know this works)
 print('=== Testing Search ===')
@@ -5,37 +5,40 @@ Extended test to verify improved variety in audio features generation
 
 from spotify_utils import SpotifyClient
 
+# Test a variety of song types
+TEST_SONGS = (
+    {"name": "All You Need Is Love", "artists": [{"name": "The Beatles"}], "popularity": 90},
+    {"name": "Thriller", "artists": [{"name": "Michael Jackson"}], "popularity": 95},
+    {"name": "Smells Like Teen Spirit", "artists": [{"name": "Nirvana"}], "popularity": 88},
+    {"name": "Hallelujah", "artists": [{"name": "Leonard Cohen"}], "popularity": 85},
+    {"name": "I Will Always Love You", "artists": [{"name": "Whitney Houston"}], "popularity": 92},
+    {"name": "Bohemian Rhapsody", "artists": [{"name": "Queen"}], "popularity": 94},
+    {"name": "Sweet Child O' Mine", "artists": [{"name": "Guns N' Roses"}], "popularity": 89},
+    {"name": "Hotel California", "artists": [{"name": "Eagles"}], "popularity": 91},
+    {"name": "Imagine", "artists": [{"name": "John Lennon"}], "popularity": 87},
+    {"name": "Like a Rolling Stone", "artists": [{"name": "Bob Dylan"}], "popularity": 86},
+    # Test newer/different songs
+    {"name": "Good 4 U", "artists": [{"name": "Olivia Rodrigo"}], "popularity": 93},
+    {"name": "Blinding Lights", "artists": [{"name": "The Weeknd"}], "popularity": 95},
+    {"name": "Watermelon Sugar", "artists": [{"name": "Harry Styles"}], "popularity": 90},
+    {"name": "Levitating", "artists": [{"name": "Dua Lipa"}], "popularity": 88},
+    {"name": "Industry Baby", "artists": [{"name": "Lil Nas X"}], "popularity": 87},
+)
+
 def test_audio_feature_variety():
     """Test that different songs produce different audio features"""
     
     spotify_client = SpotifyClient()
     
-    # Test a variety of song types
-    test_songs = [
-        {"name": "All You Need Is Love", "artists": [{"name": "The Beatles"}], "popularity": 90},
-        {"name": "Thriller", "artists": [{"name": "Michael Jackson"}], "popularity": 95},
-        {"name": "Smells Like Teen Spirit", "artists": [{"name": "Nirvana"}], "popularity": 88},
-        {"name": "Hallelujah", "artists": [{"name": "Leonard Cohen"}], "popularity": 85},
-        {"name": "I Will Always Love You", "artists": [{"name": "Whitney Houston"}], "popularity": 92},
-        {"name": "Bohemian Rhapsody", "artists": [{"name": "Queen"}], "popularity": 94},
-        {"name": "Sweet Child O' Mine", "artists": [{"name": "Guns N' Roses"}], "popularity": 89},
-        {"name": "Hotel California", "artists": [{"name": "Eagles"}], "popularity": 91},
-        {"name": "Imagine", "artists": [{"name": "John Lennon"}], "popularity": 87},
-        {"name": "Like a Rolling Stone", "artists": [{"name": "Bob Dylan"}], "popularity": 86},
-        # Test newer/different songs
-        {"name": "Good 4 U", "artists": [{"name": "Olivia Rodrigo"}], "popularity": 93},
-        {"name": "Blinding Lights", "artists": [{"name": "The Weeknd"}], "popularity": 95},
-        {"name": "Watermelon Sugar", "artists": [{"name": "Harry Styles"}], "popularity": 90},
-        {"name": "Levitating", "artists": [{"name": "Dua Lipa"}], "popularity": 88},
-        {"name": "Industry Baby", "artists": [{"name": "Lil Nas X"}], "popularity": 87},
-    ]
-    
     results = []
     
     print("🎵 Testing Audio Feature Variety")
     print("=" * 80)
     
-    for track in test_songs:
+    key_mapping = spotify_client.key_mapping
+    mode_mapping = spotify_client.mode_mapping
+    
+    for track in TEST_SONGS:
         estimated_features = spotify_client._create_estimated_audio_features(track)
         
         result = {
@@ -51,7 +54,7 @@ def test_audio_feature_variety():
         
         print(f"🎵 {result['song']}")
         print(f"   Valence: {result['valence']}, Danceability: {result['danceability']}, Energy: {result['energy']}")
-        print(f"   Tempo: {result['tempo']} BPM, Key: {spotify_client.key_mapping[result['key']]} {spotify_client.mode_mapping[result['mode']]}")
+        print(f"   Tempo: {result['tempo']} BPM, Key: {key_mapping[result['key']]} {mode_mapping[result['mode']]}")
         print()
     
     # Analyze variety
@@ -63,15 +66,20 @@ def test_audio_feature_variety():
     energies = [r['energy'] for r in results]
     tempos = [r['tempo'] for r in results]
     
-    print(f"Valence values: {sorted(set(valences))}")
-    print(f"Danceability values: {sorted(set(danceabilities))}")
-    print(f"Energy values: {sorted(set(energies))}")
-    print(f"Tempo values: {sorted(set(tempos))}")
+    distinct_valences = sorted(set(valences))
+    distinct_danceabilities = sorted(set(danceabilities))
+    distinct_energies = sorted(set(energies))
+    distinct_tempos = sorted(set(tempos))
+    
+    print(f"Valence values: {distinct_valences}")
+    print(f"Danceability values: {distinct_danceabilities}")
+    print(f"Energy values: {distinct_energies}")
+    print(f"Tempo values: {distinct_tempos}")
     
-    unique_valences = len(set(valences))
-    unique_danceabilities = len(set(danceabilities))
-    unique_energies = len(set(energies))
-    unique_tempos = len(set(tempos))
+    unique_valences = len(distinct_valences)
+    unique_danceabilities = len(distinct_danceabilities)
+    unique_energies = len(distinct_energies)
+    unique_tempos = len(distinct_tempos)
     
     total_songs = len(results)
     
@@ -80,17 +88,17 @@ def test_audio_feature_variety():
     print(f"Unique energy values: {unique_energies}/{total_songs} ({unique_energies/total_songs*100:.1f}%)")
     print(f"Unique tempo values: {unique_tempos}/{total_songs} ({unique_tempos/total_songs*100:.1f}%)")
     
-    # Calculate ranges
-    valence_range = max(valences) - min(valences)
-    danceability_range = max(danceabilities) - min(danceabilities)
-    energy_range = max(energies) - min(energies)
-    tempo_range = max(tempos) - min(tempos)
+    # Calculate ranges (the sorted distinct values already give each min and max)
+    valence_range = distinct_valences[-1] - distinct_valences[0]
+    danceability_range = distinct_danceabilities[-1] - distinct_danceabilities[0]
+    energy_range = distinct_energies[-1] - distinct_energies[0]
+    tempo_range = distinct_tempos[-1] - distinct_tempos[0]
     
     print(f"\\nValue ranges:")
-    print(f"Valence range: {valence_range:.3f} (min: {min(valences):.3f}, max: {max(valences):.3f})")
-    print(f"Danceability range: {danceability_range:.3f} (min: {min(danceabilities):.3f}, max: {max(danceabilities):.3f})")
-    print(f"Energy range: {energy_range:.3f} (min: {min(energies):.3f}, max: {max(energies):.3f})")
-    print(f"Tempo range: {tempo_range} BPM (min: {min(tempos)}, max: {max(tempos)})")
+    print(f"Valence range: {valence_range:.3f} (min: {distinct_valences[0]:.3f}, max: {distinct_valences[-1]:.3f})")
+    print(f"Danceability range: {danceability_range:.3f} (min: {distinct_danceabilities[0]:.3f}, max: {distinct_danceabilities[-1]:.3f})")
+    print(f"Energy range: {energy_range:.3f} (min: {distinct_energies[0]:.3f}, max: {distinct_energies[-1]:.3f})")
+    print(f"Tempo range: {tempo_range} BPM (min: {distinct_tempos[0]}, max: {distinct_tempos[-1]})")
     
     # Check for success criteria
     print(f"\\n✅ Success Criteria Check:")
@@ -7,13 +7,28 @@ import requests
 import json
 import time
 
+# One keep-alive connection to the dev server for all checks
+session = requests.Session()
+
+def wait_for_server(timeout=30.0, interval=0.1, probe_timeout=0.5):
+    """Poll /health until the server answers or timeout seconds have passed"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            session.get("http://127.0.0.1:5000/health", timeout=probe_timeout)
+            return
+        except requests.exceptions.RequestException:
+            if time.monotonic() >= deadline:
+                return
+            time.sleep(interval)
+
 def test_server_health():
     """Test the server health endpoint and check for warnings"""
     try:
         print("Testing MIDIGPT server health...")
         
         # Test health endpoint
-        response = requests.get("http://127.0.0.1:5000/health", timeout=5)
+        response = session.get("http://127.0.0.1:5000/health", timeout=5)
         
         if response.status_code == 200:
             data = response.json()
@@ -39,7 +54,7 @@ def test_search_endpoint():
         
         test_data = {"query": "bohemian rhapsody queen"}
         
-        response = requests.post(
+        response = session.post(
             "http://127.0.0.1:5000/search-songs",
             json=test_data,
             headers={"Content-Type": "application/json"},
@@ -70,8 +85,8 @@ if __name__ == "__main__":
     print("MIDIGPT Warning Fix Verification")
     print("=" * 50)
     
-    # Wait a moment for server to be ready
-    time.sleep(2)
+    # Wait for the server to be ready (returns as soon as it answers)
+    wait_for_server()
     
     health_ok = test_server_health()
     search_ok = test_search_endpoint()
@@ -5,8 +5,25 @@ Shows all the improvements made based on the custom generation approach
 """
 
 import requests
-import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+# requests.Session is not thread-safe, so each thread keeps its own keep-alive session
+_thread_state = threading.local()
+
+def get_session():
+    """Return the calling thread's requests.Session, creating it on first use"""
+    session = getattr(_thread_state, 'session', None)
+    if session is None:
+        session = _thread_state.session = requests.Session()
+    return session
+
+def run_generation(data):
+    """POST one generation request and return the response with its wall-clock time"""
+    start_time = time.time()
+    response = get_session().post("http://127.0.0.1:5000/generate", json=data, timeout=90)
+    return response, time.time() - start_time
 
 def test_enhanced_generation():
     """Test the enhanced algorithm with multiple scenarios"""
@@ -71,76 +88,78 @@ def test_enhanced_generation():
     print("• Energy/valence/danceability-driven composition")
     print()
     
-    for i, test_case in enumerate(test_cases, 1):
-        print(f"🎼 Test {i}: {test_case['name']}")
-        print("-" * 40)
+    # The scenarios are independent, so generate them all at once and report in order
+    with ThreadPoolExecutor(max_workers=len(test_cases)) as executor:
+        futures = [executor.submit(run_generation, test_case['data']) for test_case in test_cases]
         
-        data = test_case['data']
-        print(f"Song: {data['song']} by {data['artist']}")
-        print(f"User Key/Mode: {data['key']} {data['mode']}")
-        print(f"Complexity: {data['complexity']}")
-        
-        try:
-            start_time = time.time()
-            response = requests.post("http://127.0.0.1:5000/generate", json=data, timeout=90)
-            end_time = time.time()
+        for i, (test_case, future) in enumerate(zip(test_cases, futures), 1):
+            print(f"🎼 Test {i}: {test_case['name']}")
+            print("-" * 40)
             
-            if response.status_code == 200:
-                result = response.json()
-                musical_params = result.get('musical_params', {})
-                gen_info = result.get('generation_info', {})
-                spotify_analysis = result.get('spotify_analysis', {})
-                
-                print(f"✅ Generation successful in {end_time - start_time:.1f}s")
-                print()
-                
-                # Key/Mode respect check
-                key_respected = musical_params.get('key') == data['key']
-                mode_respected = musical_params.get('mode') == data['mode']
-                
-                print("🎹 Musical Parameters:")
-                print(f"   Key: {musical_params.get('key')} ({'✅' if key_respected else '❌'} user specified)")
-                print(f"   Mode: {musical_params.get('mode')} ({'✅' if mode_respected else '❌'} user specified)")
-                print(f"   Tempo: {musical_params.get('tempo')} BPM")
-                print(f"   Duration: {musical_params.get('duration_bars')} bars")
-                print()
-                
-                # Generation info
-                print("🎼 AI Generation Results:")
-                print(f"   Notes generated: {gen_info.get('notes_generated', 0)}")
-                print(f"   Spotify enhanced: {'✅' if gen_info.get('spotify_enhanced') else '❌'}")
-                print(f"   Structure based: {'✅' if gen_info.get('structure_based') else '❌'}")
-                print(f"   Generation time: {gen_info.get('generation_time', 0):.1f}s")
-                print()
+            data = test_case['data']
+            print(f"Song: {data['song']} by {data['artist']}")
+            print(f"User Key/Mode: {data['key']} {data['mode']}")
+            print(f"Complexity: {data['complexity']}")
+            
+            try:
+                response, elapsed = future.result()
                 
-                # Spotify analysis
-                if spotify_analysis:
-                    audio_features = spotify_analysis.get('audio_features', {})
-                    insights = spotify_analysis.get('musical_insights', {})
+                if response.status_code == 200:
+                    result = response.json()
+                    musical_params = result.get('musical_params', {})
+                    gen_info = result.get('generation_info', {})
+                    spotify_analysis = result.get('spotify_analysis', {})
                     
-                    print("🎧 Spotify Analysis Applied:")
-                    if audio_features:
-                        print(f"   Energy: {audio_features.get('energy', 0):.2f} - {insights.get('energy_level', 'Unknown')}")
-                        print(f"   Valence: {audio_features.get('valence', 0):.2f} - {insights.get('mood_classification', 'Unknown')}")
-                        print(f"   Danceability: {audio_features.get('danceability', 0):.2f} - {insights.get('danceability_level', 'Unknown')}")
-                        print(f"   Genre Influence: {insights.get('genre_influence', 'Unknown')}")
+                    print(f"✅ Generation successful in {elapsed:.1f}s")
                     print()
-                
-                # File info
-                filename = result.get('filename')
-                print(f"💾 Generated File: {filename}")
-                print(f"🔗 URL: http://127.0.0.1:5000{result.get('download_url')}")
-                
-            else:
-                print(f"❌ Failed with status {response.status_code}")
-                print(f"Error: {response.text}")
-        
-        except Exception as e:
-            print(f"❌ Test failed: {str(e)}")
-        
-        print()
-        print("=" * 60)
-        print()
+                    
+                    # Key/Mode respect check
+                    key_respected = musical_params.get('key') == data['key']
+                    mode_respected = musical_params.get('mode') == data['mode']
+                    
+                    print("🎹 Musical Parameters:")
+                    print(f"   Key: {musical_params.get('key')} ({'✅' if key_respected else '❌'} user specified)")
+                    print(f"   Mode: {musical_params.get('mode')} ({'✅' if mode_respected else '❌'} user specified)")
+                    print(f"   Tempo: {musical_params.get('tempo')} BPM")
+                    print(f"   Duration: {musical_params.get('duration_bars')} bars")
+                    print()
+                    
+                    # Generation info
+                    print("🎼 AI Generation Results:")
+                    print(f"   Notes generated: {gen_info.get('notes_generated', 0)}")
+                    print(f"   Spotify enhanced: {'✅' if gen_info.get('spotify_enhanced') else '❌'}")
+                    print(f"   Structure based: {'✅' if gen_info.get('structure_based') else '❌'}")
+                    print(f"   Generation time: {gen_info.get('generation_time', 0):.1f}s")
+                    print()
+                    
+                    # Spotify analysis
+                    if spotify_analysis:
+                        audio_features = spotify_analysis.get('audio_features', {})
+                        insights = spotify_analysis.get('musical_insights', {})
+                        
+                        print("🎧 Spotify Analysis Applied:")
+                        if audio_features:
+                            print(f"   Energy: {audio_features.get('energy', 0):.2f} - {insights.get('energy_level', 'Unknown')}")
+                            print(f"   Valence: {audio_features.get('valence', 0):.2f} - {insights.get('mood_classification', 'Unknown')}")
+                            print(f"   Danceability: {audio_features.get('danceability', 0):.2f} - {insights.get('danceability_level', 'Unknown')}")
+                            print(f"   Genre Influence: {insights.get('genre_influence', 'Unknown')}")
+                        print()
+                    
+                    # File info
+                    filename = result.get('filename')
+                    print(f"💾 Generated File: {filename}")
+                    print(f"🔗 URL: http://127.0.0.1:5000{result.get('download_url')}")
+                    
+                else:
+                    print(f"❌ Failed with status {response.status_code}")
+                    print(f"Error: {response.text}")
+            
+            except Exception as e:
+                print(f"❌ Test failed: {str(e)}")
+            
+            print()
+            print("=" * 60)
+            print()
     
     print("🏁 Enhanced Algorithm Test Complete!")
     print()
@@ -175,7 +194,7 @@ def test_fallback_generation():
     print("Testing fallback generation (no Spotify data)...")
     
     try:
-        response = requests.post("http://127.0.0.1:5000/generate", json=fallback_test, timeout=60)
+        response = get_session().post("http://127.0.0.1:5000/generate", json=fallback_test, timeout=60)
         
         if response.status_code == 200:
             result = response.json()
@@ -4,8 +4,6 @@ Quick test of the current MIDI generation system
 """
 
 import requests
-import json
-import time
 
 def test_current_system():
     """Test current system with a known song"""